@@ -0,0 +1,12 @@
+"""Benchmarks for the hot paths of the Warmwassersteuerung.
+
+The benchmarks run under CPython on top of the :mod:`sim` stand-ins and
+measure operations per second and bytes allocated per call (``tracemalloc``
+peak) for the template renderer, config accessors, LCD printing (including
+I2C bytes per print), form parsing, HTTP requests and one regulation cycle.
+
+Example::
+
+    python -m bench --output bench_baseline.json
+    python -m bench --compare bench_baseline.json
+"""
@@ -0,0 +1,66 @@
+"""Command line entry point: ``python -m bench``."""
+
+import argparse
+import sys
+
+import sim
+from bench import cases  # noqa: F401  (registers the benchmarks)
+from bench.harness import BENCHMARKS, compare, measure, save
+
+
+async def run_all(names, min_time):
+    from src.lcd import lcd
+    from src.startup import initialize_devices
+
+    await initialize_devices()
+    await lcd.initialize()
+
+    results = {}
+    for name in names:
+        setup, description = BENCHMARKS[name]
+        func, counter = await setup()
+        results[name] = await measure(func, counter, min_time=min_time)
+        result = results[name]
+        extra = f"  {result['counter_per_op']} /op" if "counter_per_op" in result else ""
+        print(
+            f"{name:20s} {result['ops_per_sec']:>12.1f} ops/s "
+            f"{result['us_per_op']:>10.2f} us/op {result['alloc_bytes']:>8d} B/op{extra}"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Warmwassersteuerung hot paths")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--list", action="store_true", help="list benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per benchmark")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare with a stored JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative regression threshold")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (_, description) in BENCHMARKS.items():
+            print(f"{name:20s} {description}")
+        return 0
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    loop, _, _ = sim.prepare(overrides={"boot_normal": 0})
+    results = loop.run_until_complete(run_all(names, args.min_time))
+    loop.close()
+
+    if args.output:
+        save(args.output, results)
+    if args.compare:
+        lines, regressed = compare(args.compare, results, args.threshold)
+        print("\n".join(lines))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
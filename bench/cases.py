@@ -0,0 +1,178 @@
+"""Benchmark cases. Project modules are imported lazily after ``sim.prepare()``."""
+
+from bench.harness import benchmark
+from sim import loopback
+from sim.world import world
+
+# Body of the /config/save form as sent by index.html
+CONFIG_FORM = (
+    "nominal_min_temp=45.0&nominal_max_temp=57.0&delay_before_start_1=660"
+    "&init_relay_time=5000&delay_before_start_2=450&relay_time=1200&update_time=120"
+    "&temp_update_interval=5&lcd_i2c_backlight=true&buttons_activated=false"
+    "&log_level=OFF&interval=930&temp_sampling_interval=5000"
+    "&temp_change_high_threshold_temp=1.0"
+    "&temp_change_high_threshold_relay_time_multiplier=2.0"
+    "&temp_change_high_threshold_update_time_multiplier=0.4"
+    "&wifi_max_attempts=10&manual_relay_time=1200"
+)
+
+
+def i2c_bytes():
+    return world.lcd.bytes_written
+
+
+@benchmark("render_index", "generate_index_html() into a loopback writer")
+async def render_index():
+    from webserver import generate_index_html
+
+    async def run():
+        await generate_index_html(loopback.LoopbackWriter())
+
+    return run, None
+
+
+@benchmark("http_get_index", "GET / through handle_client()")
+async def http_get_index():
+    from webserver import handle_client
+
+    loopback.servers[80] = handle_client
+
+    async def run():
+        await loopback.request("GET", "/")
+
+    return run, None
+
+
+@benchmark("parse_form_data", "parse_form_data() of the /config/save form")
+async def parse_form():
+    from webserver import parse_form_data
+
+    async def run():
+        parse_form_data(CONFIG_FORM)
+
+    return run, None
+
+
+@benchmark("config_get", "Config.get()")
+async def config_get():
+    from src.config import config
+
+    async def run():
+        await config.get("temp_change_category")
+
+    return run, None
+
+
+@benchmark("config_get_int", "Config.get_int()")
+async def config_get_int():
+    from src.config import config
+
+    async def run():
+        await config.get_int("update_time")
+
+    return run, None
+
+
+@benchmark("config_get_float", "Config.get_float()")
+async def config_get_float():
+    from src.config import config
+
+    async def run():
+        await config.get_float("current_temp", -127.0)
+
+    return run, None
+
+
+@benchmark("config_get_bool", "Config.get_bool()")
+async def config_get_bool():
+    from src.config import config
+
+    async def run():
+        await config.get_bool("temp_increasing")
+
+    return run, None
+
+
+@benchmark("rlock_uncontended", "async with Rlock() without contention, the cost per locked call")
+async def rlock_uncontended():
+    from src.rlock import Rlock
+
+    lock = Rlock()
+
+    async def run():
+        async with lock:
+            pass
+
+    return run, None
+
+
+@benchmark("relay_switch", "Relay.activate() and Relay.deactivate()")
+async def relay_switch():
+    from src.relay import relay_open
+
+    async def run():
+        await relay_open.activate()
+        await relay_open.deactivate()
+
+    return run, None
+
+
+@benchmark("lcd_print_line", "LCD.print() of a full line, counter = I2C bytes")
+async def lcd_print_line():
+    from src.lcd import lcd
+
+    async def run():
+        await lcd.print(3, 0, "Soll Temp erreicht !")
+
+    return run, i2c_bytes
+
+
+@benchmark("lcd_print_timer", "LCD.print() of the timer, counter = I2C bytes")
+async def lcd_print_timer():
+    from src.lcd import lcd
+
+    async def run():
+        await lcd.print(3, 13, "01m 59s")
+
+    return run, i2c_bytes
+
+
+@benchmark("lcd_print_char", "LCD.print_char() arrow, counter = I2C bytes")
+async def lcd_print_char():
+    from src.lcd import lcd
+
+    async def run():
+        await lcd.print_char(2, 11, 0)
+
+    return run, i2c_bytes
+
+
+@benchmark("timer_tick", "one second of the main loop: update_timer(), counter = I2C bytes")
+async def timer_tick():
+    from src.config import config
+    from src.functions import update_timer
+
+    async def run():
+        await config.set("stop_timer", -1)
+        await update_timer(119)
+
+    return run, i2c_bytes
+
+
+@benchmark("regulation_cycle", "update temps, adjust times and open_relays()")
+async def regulation_cycle():
+    from src.functions import (
+        adjust_relay_time_based_on_temp_category,
+        adjust_update_time_based_on_temp_category,
+        open_relays,
+        update_temp,
+    )
+
+    async def run():
+        await update_temp()
+        await update_temp(2)
+        relay_time = await adjust_relay_time_based_on_temp_category()
+        await adjust_update_time_based_on_temp_category()
+        await open_relays(relay_time)
+
+    return run, i2c_bytes
@@ -0,0 +1,124 @@
+"""Timing, allocation measurement and baseline comparison."""
+
+import json
+import platform
+import time
+import tracemalloc
+
+# Registered benchmarks: name -> (setup coroutine function, description)
+BENCHMARKS = {}
+
+
+def benchmark(name, description=""):
+    """Register ``setup`` as benchmark ``name``.
+
+    ``setup`` is a coroutine function returning the coroutine function to
+    measure and optionally a function returning extra counters per call,
+    e.g. I2C bytes written.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = (setup, description)
+        return setup
+
+    return register
+
+
+async def measure(func, counter=None, min_time=0.5, alloc_calls=20):
+    """Measure ``func`` and return its result dictionary.
+
+    Args:
+        func: Coroutine function without arguments.
+        counter (callable, optional): Returns a cumulative counter; its
+            increase per call is reported as ``counter_per_op``.
+        min_time (float): Minimum wall-clock seconds to run.
+        alloc_calls (int): Calls used to measure allocations.
+
+    Returns:
+        dict: ``ops_per_sec``, ``us_per_op``, ``alloc_bytes`` and optionally
+        ``counter_per_op``.
+    """
+
+    # Warm up
+    await func()
+
+    # Time, doubling the batch until min_time is reached
+    iterations = 1
+    while True:
+        count = counter() if counter else 0
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        elapsed = time.perf_counter() - start
+        counted = (counter() - count) if counter else 0
+        if elapsed >= min_time:
+            break
+        iterations *= 2
+
+    # Allocations: mean peak growth of the traced heap per call
+    tracemalloc.start()
+    total = 0
+    for _ in range(alloc_calls):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await func()
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    result = {
+        "ops_per_sec": round(iterations / elapsed, 1),
+        "us_per_op": round(elapsed / iterations * 1000000, 2),
+        "alloc_bytes": round(total / alloc_calls),
+    }
+    if counter:
+        result["counter_per_op"] = round(counted / iterations, 2)
+    return result
+
+
+def environment():
+    """Describe the interpreter the results were measured with."""
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+    }
+
+
+def save(path, results):
+    with open(path, "w") as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=2)
+
+
+def compare(baseline_path, results, threshold=0.1):
+    """Compare ``results`` with a stored baseline.
+
+    A benchmark regresses when its throughput drops or its allocations or
+    counters grow by more than ``threshold`` (relative).
+
+    Returns:
+        list: Lines of the comparison report and a bool telling whether any
+        benchmark regressed.
+    """
+
+    with open(baseline_path) as file:
+        baseline = json.load(file)["results"]
+
+    lines = []
+    regressed = False
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            lines.append(f"{name:28s} new")
+            continue
+
+        speed = result["ops_per_sec"] / old["ops_per_sec"] if old["ops_per_sec"] else 1.0
+        flags = []
+        if speed < 1.0 - threshold:
+            flags.append("SLOWER")
+        for key in ("alloc_bytes", "counter_per_op"):
+            if key in result and key in old and result[key] > old[key] * (1.0 + threshold) + 1:
+                flags.append(f"{key} {old[key]} -> {result[key]}")
+        regressed = regressed or bool(flags)
+        lines.append(f"{name:28s} {speed:6.2f}x  {' '.join(flags) or 'ok'}")
+    return lines, regressed
@@ -14,22 +14,39 @@
 #
 import gc  # https://docs.micropython.org/en/latest/library/gc.html
 import time  # https://docs.micropython.org/en/latest/library/time.html
+from utils.boot_profile import boot_profile  # record import times
 import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
 from machine import (
     reset,
 )  # https://docs.micropython.org/en/latest/library/machine.html#machine.reset
 
-from webserver import webserver
-from utils.log import log  # logging function
+boot_profile.mark("uasyncio, machine")
+
+from utils.log import log, enabled, ERROR, VERBOSE  # logging function
 from utils.log_level import log_level
-from utils.error_logger import append_log
+from utils.error_logger import error_log, SOURCE_MAIN, CODE_EXCEPTION
+from utils.metrics import metrics, COUNTER, GAUGE
+from utils.gc_manager import gc_manager  # GcManager() instance
+from utils.supervisor import supervisor  # Supervisor() instance
+from utils.loop_profiler import (
+    loop_profiler,
+    PHASE_UPDATE_TEMP,
+    PHASE_CATEGORIZE,
+    PHASE_UPDATE_TIMER,
+    PHASE_OPEN_RELAYS,
+    PHASE_GC,
+)
+
+boot_profile.mark("utils")
+
 from src.config import config  # Config() instance
-from src.lcd import lcd  # LCD() instance
-from src.led import led  # LED() instance
 from src.relay import relay_open, relay_close
-from src.temp import temp_sensor, temp_sensor_2
+from src.startup import initialize_devices
+from src.checkpoint import checkpoint  # Checkpoint() instance
+from src.actuator import actuator, SOURCE_AUTOMATIC  # Actuator() instance
+from src.schedule import schedule  # Schedule() instance
+from src.sampler import sampler  # Sampler() instance
 
-# from src.button import button, button_2
 from src.functions import (
     categorize_temp_change,
     adjust_relay_time_based_on_temp_category,
@@ -37,11 +54,34 @@ from src.functions import (
     update_temp,
     print_nominal_temp,
     open_relays,
-    # check_buttons,
+    handle_buttons,
     update_timer,
     wait_start,
+    CONTROL_TASK,
 )
 
+boot_profile.mark("src")
+
+from webserver import webserver
+
+boot_profile.mark("webserver")
+
+# Main loop ticks, the interval branch is expected to run once per second
+LOOP_TICKS = metrics.register("loop_ticks_total", COUNTER, "Main loop ticks")
+LOOP_TICK_PERIOD = metrics.register(
+    "loop_tick_period_ms", GAUGE, "Time between the last two ticks"
+)
+LOOP_TICK_JITTER = metrics.register(
+    "loop_tick_jitter_ms", GAUGE, "Difference between the last two tick periods"
+)
+LOOP_TICK_JITTER_MAX = metrics.register(
+    "loop_tick_jitter_max_ms", GAUGE, "Largest difference between two tick periods"
+)
+
+# Timing parameters re-read by the main loop after a change on the web interface
+TIMING_KEYS = ("interval", "update_time")
+timing_changed = asyncio.Event()
+
 
 async def main():
     try:
@@ -51,56 +91,50 @@ async def main():
 
         # Initialize LogLevel
         level = await config.get("log_level", "OFF")
-        log_level.initialize(level)
-
-        # Initialize LED
-        await led.initialize()
-
-        # Initialize LCD
-        await lcd.initialize()
-
-        # Initialize relays
-        open_relay_pin = await config.get_int("RELAY_OPEN_PIN")
-        close_relay_pin = await config.get_int("RELAY_CLOSE_PIN")
-        await relay_open.initialize(open_relay_pin)
-        await relay_close.initialize(close_relay_pin)
-
-        # Initialize temp sensor 1
-        temp_sensor_pin = await config.get_int("TEMP_SENSOR_PIN")
-        temp_sensor_type = await config.get("TEMP_SENSOR_TYPE")
-        temp_sensor_resolution = await config.get_int("TEMP_SENSOR_RESOLUTION_BIT")
-        await temp_sensor.initialize(
-            temp_sensor_pin,
-            resolution=temp_sensor_resolution,
-            type=temp_sensor_type,
-        )
+        log_level.initialize(level, await config.get("log_buffer_level", "WARN"))
 
-        # Initialize temp sensor 2
-        temp_sensor_2_pin = await config.get_int("TEMP_SENSOR_2_PIN")
-        temp_sensor_2_type = await config.get("TEMP_SENSOR_2_TYPE")
-        temp_sensor_resolution = await config.get_int("TEMP_SENSOR_2_RESOLUTION_BIT")
-        await temp_sensor_2.initialize(
-            temp_sensor_2_pin,
-            resolution=temp_sensor_resolution,
-            type=temp_sensor_2_type,
+        # Reset the device by the watchdog when a task stops beating
+        asyncio.create_task(
+            supervisor.run(await config.get_int("watchdog_timeout", 8) * 1000)
         )
-
-        # Initialize buttons
-        # button_pin = await config.get_int("BUTTON_TEMP_UP_PIN")
-        # button_2_pin = await config.get_int("BUTTON_TEMP_DOWN_PIN")
-        # await button.initialize(button_pin)
-        # await button_2.initialize(button_2_pin)
-
-        # Update temp
-        await update_temp()
-        await update_temp(2)
+        supervisor.beat(CONTROL_TASK)
+
+        # Run the relay pulses of all sources one at a time
+        asyncio.create_task(actuator.run())
+
+        # Initialize devices concurrently, LCD, LED and temp sensor 2 finish in the background
+        if not await initialize_devices():
+            log("ERROR", "Main.initialize_devices(): not all required devices initialized")
+
+        # Initialize buttons, their events are handled in a separate task
+        if await config.get_bool("buttons_activated", False):
+            # Imported lazily, most devices run without buttons
+            from src.button import button, button_2  # Button() instance
+
+            button_pin = await config.get_int("BUTTON_TEMP_UP_PIN")
+            button_2_pin = await config.get_int("BUTTON_TEMP_DOWN_PIN")
+            await button.initialize(button_pin)
+            await button_2.initialize(button_2_pin)
+            asyncio.create_task(handle_buttons(button_pin, button_2_pin))
+
+        # Update temp of both sensors concurrently
+        await asyncio.gather(update_temp(), update_temp(2))
+        boot_profile.mark("first temp")
+        boot_profile.report()
         temp_last_measurement = await config.get_float("current_temp", -127.0)
         await config.set("temp_last_measurement", temp_last_measurement)
 
+        # Resume the countdown of a recent checkpoint after a watchdog or exception reset
+        update_time = await checkpoint.restore()
+        resumed = update_time is not None
+
         # Print nominal temp
         await print_nominal_temp()
 
-        if await config.get_bool("boot_normal", True):
+        # Switch the setpoint band by the weekly schedule
+        asyncio.create_task(schedule.run())
+
+        if not resumed and await config.get_bool("boot_normal", True):
 
             # Wait start 1
             delay_before_start_1 = await config.get_int("delay_before_start_1")
@@ -109,16 +143,18 @@ async def main():
 
             # Open relay initial
             init_relay_time = await config.get_int("init_relay_time")
-            await relay_open.toggle(init_relay_time)
+            actuator.request(relay_open, init_relay_time, SOURCE_AUTOMATIC)
 
             # Wait start 2
             delay_before_start_2 = await config.get_int("delay_before_start_2")
             log("INFO", f"Main.wait_start(2/2: {delay_before_start_2})")
             await wait_start(delay_before_start_2, "Start 2/2:")
 
-        # Open relay
-        relay_time = await config.get_int("relay_time", 1800)
-        await open_relays(relay_time)
+        if not resumed:
+            # Open relay
+            relay_time = await config.get_int("relay_time", 1800)
+            await open_relays(relay_time)
+            update_time = await config.get_int("update_time", 120)
 
         # Set normal boot to True
         await config.set("boot_normal", 1)
@@ -126,8 +162,15 @@ async def main():
         # Init time values
         previous_millis = 0
         interval = await config.get_int("interval", 930)
-        update_time = await config.get_int("update_time", 120)
-        temp_update_interval = await config.get_int("temp_update_interval", 5)
+        checkpoint_interval = await config.get_int("checkpoint_interval", 60) * 1000
+        checkpoint_millis = time.ticks_ms()
+        config.subscribe(TIMING_KEYS, lambda keys: timing_changed.set())
+
+        # Sample the temperatures at an interval following slope and band distance
+        await sampler.initialize()
+
+        # Schedule garbage collections from now on
+        gc_manager.initialize()
 
         # ==================================================
         # Main loop
@@ -137,64 +180,87 @@ async def main():
         log("INFO", "--------------------------")
 
         while True:
+            supervisor.beat(CONTROL_TASK)
             current_millis = time.ticks_ms()
 
             # Adjust temp category
-            if time.ticks_diff(
-                current_millis, await config.get_int("temp_last_measurement_time")
-            ) >= await config.get_int("temp_sampling_interval"):
+            if sampler.due(current_millis):
 
-                # Update temp
+                # Update temp, sensor 2 is only displayed and cross-checks sensor 1
+                start = loop_profiler.start()
                 await update_temp()
-                # await update_temp(2)  # temp_sensor >= 2 not used for adjustments
-                temp_change = await config.get_float(
-                    "current_temp", -127.0
-                ) - await config.get_float("temp_last_measurement")
+                await update_temp(2)
+                loop_profiler.stop(PHASE_UPDATE_TEMP, start)
+                current_temp = await config.get_float("current_temp", -127.0)
+                await sampler.update(current_temp, current_millis)
+                temp_change = current_temp - await config.get_float("temp_last_measurement")
+
+                # Change per temp_sampling_interval, steady samples are further apart
+                elapsed = time.ticks_diff(
+                    current_millis, await config.get_int("temp_last_measurement_time")
+                )
+                if elapsed > sampler.min_ms:
+                    temp_change = temp_change * sampler.min_ms / elapsed
 
                 # Categorize temp change
+                start = loop_profiler.start()
                 _ = await categorize_temp_change(temp_change)
+                loop_profiler.stop(PHASE_CATEGORIZE, start)
 
                 # Update last measurement temp
-                await config.set(
-                    "temp_last_measurement",
-                    await config.get_float("current_temp", -127.0),
-                )
+                await config.set("temp_last_measurement", current_temp)
 
                 # Update last measurement temp time
                 await config.set("temp_last_measurement_time", current_millis)
 
-                # Release memory
-                log("VERBOSE", "Main.gc.collect()")
-                gc.collect()
+                # Release memory in the next idle window
+                gc_manager.request()
+
+            # Pick up timing parameters changed on the web interface
+            if timing_changed.is_set():
+                timing_changed.clear()
+                interval = await config.get_int("interval", 930)
+                # Shorten a running countdown, a longer one applies next cycle
+                update_time = min(update_time, await config.get_int("update_time", 120))
+                log(
+                    "INFO",
+                    f"Main.timing(interval={interval}, update_time={update_time})",
+                )
 
             # Main
             if time.ticks_diff(current_millis, previous_millis) > interval:
 
+                # Measure tick period and jitter
+                if previous_millis:
+                    period = time.ticks_diff(current_millis, previous_millis)
+                    last_period = metrics.get(LOOP_TICK_PERIOD)
+                    if last_period:
+                        jitter = abs(period - last_period)
+                        metrics.set(LOOP_TICK_JITTER, jitter)
+                        metrics.set_max(LOOP_TICK_JITTER_MAX, jitter)
+                    metrics.set(LOOP_TICK_PERIOD, period)
+                metrics.inc(LOOP_TICKS)
+                loop_profiler.tick(current_millis)
+
                 if update_time > 0:
                     # Update timer
+                    start = loop_profiler.start()
                     await update_timer(update_time)
-
-                    # Update temp on temp update interval
-                    if update_time % temp_update_interval == 0:
-                        await update_temp()
-                        await update_temp(2)
+                    loop_profiler.stop(PHASE_UPDATE_TIMER, start)
 
                     update_time -= 1
 
-                    # # Check buttons
-                    # await check_buttons()
-
                     # Print mem alloc
-                    log(
-                        "VERBOSE",
-                        "Main.gc.mem_alloc(): {} Bytes".format(gc.mem_alloc()),
-                    )
+                    if enabled(VERBOSE):
+                        log(VERBOSE, "Main.gc.mem_alloc(): {} Bytes", gc.mem_alloc())
 
                 else:
 
                     # Update temp
+                    start = loop_profiler.start()
                     await update_temp()
                     await update_temp(2)
+                    loop_profiler.stop(PHASE_UPDATE_TEMP, start)
 
                     # Set and adjust relay_time based on temp category
                     relay_time = await adjust_relay_time_based_on_temp_category()
@@ -203,18 +269,30 @@ async def main():
                     update_time = await adjust_update_time_based_on_temp_category()
 
                     # Open relays
+                    start = loop_profiler.start()
                     await open_relays(relay_time)
+                    loop_profiler.stop(PHASE_OPEN_RELAYS, start)
 
                     # Print allocated memory
-                    log(
-                        "VERBOSE",
-                        "Main.gc.mem_alloc(): {} Bytes".format(gc.mem_alloc()),
-                    )
+                    if enabled(VERBOSE):
+                        log(VERBOSE, "Main.gc.mem_alloc(): {} Bytes", gc.mem_alloc())
 
                 # Update previous millis
                 previous_millis = current_millis
                 await config.set("previous_millis", previous_millis)
 
+                # Write a checkpoint at low frequency to spare the flash
+                if checkpoint_interval > 0 and time.ticks_diff(
+                    current_millis, checkpoint_millis
+                ) >= checkpoint_interval:
+                    await checkpoint.save(update_time)
+                    checkpoint_millis = current_millis
+
+            # Release memory if there is time left before the next tick
+            start = loop_profiler.start()
+            if gc_manager.collect_if_idle(time.ticks_add(previous_millis, interval)):
+                loop_profiler.stop(PHASE_GC, start)
+
             await asyncio.sleep(0.1)
 
     except Exception as e:
@@ -223,8 +301,11 @@ async def main():
         message = f"ERROR: main.py: {str(e)}\n"
         print(message)
 
-        # Append error message to log file
-        append_log(message, "/main_error.log")
+        # Append error to the error log
+        error_log.append(ERROR, SOURCE_MAIN, CODE_EXCEPTION, str(e))
+
+        # Never leave a relay energized while saving
+        await actuator.stop()
 
         # Set normal boot to False
         await config.set("boot_normal", 0)
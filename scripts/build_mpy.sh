@@ -0,0 +1,44 @@
+#!/bin/zsh
+# build_mpy.sh [/dev/cu.usbmodem11301]
+#
+# Precompiles all modules to .mpy bytecode (pip install mpy-cross) into ./build.
+# The Pico then skips parsing and compiling the sources at boot, which saves
+# time and heap. main.py stays a .py file as MicroPython only runs main.py.
+# When a PORT is given the build is copied to the Pico.
+
+PORT=$1
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" && pwd)"
+PROJECT_DIR="$(dirname "$SCRIPT_DIR")"
+BUILD_DIR="$PROJECT_DIR/build"
+
+cd "$PROJECT_DIR" || exit 1
+
+echo "building .mpy files..."
+rm -rf "$BUILD_DIR"
+mkdir -p "$BUILD_DIR/utils" "$BUILD_DIR/src" "$BUILD_DIR/web"
+
+cp main.py "$BUILD_DIR/main.py"
+[ -f config.json ] && cp config.json "$BUILD_DIR/config.json"
+cp web/index.html web/styles.css web/wifi.html "$BUILD_DIR/web/"
+
+mpy-cross -o "$BUILD_DIR/webserver.mpy" webserver.py || exit 1
+for file in utils/*.py src/*.py; do
+    echo "  mpy-cross $file"
+    mpy-cross -o "$BUILD_DIR/${file%.py}.mpy" "$file" || exit 1
+done
+echo "building .mpy files... DONE"
+
+[ -z "$PORT" ] && exit 0
+
+echo "copying build..."
+ampy --port $PORT rm webserver.py 2>/dev/null
+ampy --port $PORT rmdir utils 2>/dev/null
+ampy --port $PORT rmdir src 2>/dev/null
+ampy --port $PORT rmdir web 2>/dev/null
+for file in $(cd "$BUILD_DIR" && find . -type f | sed 's|^\./||'); do
+    dir=$(dirname "$file")
+    [ "$dir" != "." ] && ampy --port $PORT mkdir "$dir" 2>/dev/null
+    ampy --port $PORT put "$BUILD_DIR/$file" "$file" 2>/dev/null
+done
+echo "copying build... DONE"
+ampy --port $PORT ls 2>/dev/null
@@ -20,6 +20,13 @@ function RemoveProjectFiles {
     python -m mpremote connect $port rm :main_error.log
     python -m mpremote connect $port rm :web_error.log
 
+    python -m mpremote connect $port rm :utils/boot_profile.py
+    python -m mpremote connect $port rm :utils/log_buffer.py
+    python -m mpremote connect $port rm :utils/metrics.py
+    python -m mpremote connect $port rm :utils/loop_profiler.py
+    python -m mpremote connect $port rm :utils/gc_manager.py
+    python -m mpremote connect $port rm :utils/supervisor.py
+    python -m mpremote connect $port rm :utils/error_logger.py
     python -m mpremote connect $port rm :utils/get_bool.py
     python -m mpremote connect $port rm :utils/get_float.py
     python -m mpremote connect $port rm :utils/get_int.py
@@ -27,21 +34,31 @@ function RemoveProjectFiles {
     python -m mpremote connect $port rm :utils/log.py
     python -m mpremote connect $port rmdir :utils
 
+    python -m mpremote connect $port rm :src/actuator.py
     python -m mpremote connect $port rm :src/button.py
+    python -m mpremote connect $port rm :src/captive_portal.py
+    python -m mpremote connect $port rm :src/checkpoint.py
     python -m mpremote connect $port rm :src/config.py
+    python -m mpremote connect $port rm :src/filter.py
     python -m mpremote connect $port rm :src/functions.py
     python -m mpremote connect $port rm :src/lcd_api.py
     python -m mpremote connect $port rm :src/lcd.py
     python -m mpremote connect $port rm :src/led.py
     python -m mpremote connect $port rm :src/machine_i2c_lcd.py
+    python -m mpremote connect $port rm :src/mqtt.py
     python -m mpremote connect $port rm :src/relay.py
     python -m mpremote connect $port rm :src/rlock.py
+    python -m mpremote connect $port rm :src/sampler.py
+    python -m mpremote connect $port rm :src/schedule.py
+    python -m mpremote connect $port rm :src/startup.py
     python -m mpremote connect $port rm :src/temp.py
+    python -m mpremote connect $port rm :src/validator.py
     python -m mpremote connect $port rm :src/wifi.py
     python -m mpremote connect $port rmdir :src
 
     python -m mpremote connect $port rm :web/index.html
     python -m mpremote connect $port rm :web/styles.css
+    python -m mpremote connect $port rm :web/wifi.html
     python -m mpremote connect $port rmdir :web
     Write-Host "Projektdateien entfernt"
 }
@@ -55,11 +72,16 @@ function CopyProjectFiles {
         Write-Host "Kopiere config.json"
         python -m mpremote connect $port cp ./config.json :config.json
     }
-    python -m mpremote connect $port cp ./main_error.log :main_error.log
-    python -m mpremote connect $port cp ./web_error.log :web_error.log
 
     Write-Host "  Erstelle utils..."
     python -m mpremote connect $port mkdir utils
+    python -m mpremote connect $port cp ./utils/boot_profile.py :utils/boot_profile.py
+    python -m mpremote connect $port cp ./utils/log_buffer.py :utils/log_buffer.py
+    python -m mpremote connect $port cp ./utils/metrics.py :utils/metrics.py
+    python -m mpremote connect $port cp ./utils/loop_profiler.py :utils/loop_profiler.py
+    python -m mpremote connect $port cp ./utils/gc_manager.py :utils/gc_manager.py
+    python -m mpremote connect $port cp ./utils/supervisor.py :utils/supervisor.py
+    python -m mpremote connect $port cp ./utils/error_logger.py :utils/error_logger.py
     python -m mpremote connect $port cp ./utils/get_bool.py :utils/get_bool.py
     python -m mpremote connect $port cp ./utils/get_float.py :utils/get_float.py
     python -m mpremote connect $port cp ./utils/get_int.py :utils/get_int.py
@@ -68,22 +90,32 @@ function CopyProjectFiles {
 
     Write-Host "  Erstelle src..."
     python -m mpremote connect $port mkdir src
+    python -m mpremote connect $port cp ./src/actuator.py :src/actuator.py
     python -m mpremote connect $port cp ./src/button.py :src/button.py
+    python -m mpremote connect $port cp ./src/captive_portal.py :src/captive_portal.py
+    python -m mpremote connect $port cp ./src/checkpoint.py :src/checkpoint.py
     python -m mpremote connect $port cp ./src/config.py :src/config.py
+    python -m mpremote connect $port cp ./src/filter.py :src/filter.py
     python -m mpremote connect $port cp ./src/functions.py :src/functions.py
     python -m mpremote connect $port cp ./src/lcd_api.py :src/lcd_api.py
     python -m mpremote connect $port cp ./src/lcd.py :src/lcd.py
     python -m mpremote connect $port cp ./src/led.py :src/led.py
     python -m mpremote connect $port cp ./src/machine_i2c_lcd.py :src/machine_i2c_lcd.py
+    python -m mpremote connect $port cp ./src/mqtt.py :src/mqtt.py
     python -m mpremote connect $port cp ./src/relay.py :src/relay.py
     python -m mpremote connect $port cp ./src/rlock.py :src/rlock.py
+    python -m mpremote connect $port cp ./src/sampler.py :src/sampler.py
+    python -m mpremote connect $port cp ./src/schedule.py :src/schedule.py
+    python -m mpremote connect $port cp ./src/startup.py :src/startup.py
     python -m mpremote connect $port cp ./src/temp.py :src/temp.py
+    python -m mpremote connect $port cp ./src/validator.py :src/validator.py
     python -m mpremote connect $port cp ./src/wifi.py :src/wifi.py
 
      Write-Host "  Erstelle web..."
     python -m mpremote connect $port mkdir web
     python -m mpremote connect $port cp ./web/index.html :web/index.html
     python -m mpremote connect $port cp ./web/styles.css :web/styles.css
+    python -m mpremote connect $port cp ./web/wifi.html :web/wifi.html
     Write-Host "Projektdateien kopiert"
 }
 
@@ -29,11 +29,16 @@ echo copying files...
 ampy --port %PORT% put main.py main.py 2>NUL
 ampy --port %PORT% put config.json config.json 2>NUL
 ampy --port %PORT% put webserver.py webserver.py 2>NUL
-ampy --port %PORT% put main_error.log main_error.log 2>NUL
-ampy --port %PORT% put web_error.log web_error.log 2>NUL
 
 echo   mkdir utils...
 ampy --port %PORT% mkdir utils 2>NUL
+ampy --port %PORT% put utils/boot_profile.py utils/boot_profile.py 2>NUL
+ampy --port %PORT% put utils/log_buffer.py utils/log_buffer.py 2>NUL
+ampy --port %PORT% put utils/metrics.py utils/metrics.py 2>NUL
+ampy --port %PORT% put utils/loop_profiler.py utils/loop_profiler.py 2>NUL
+ampy --port %PORT% put utils/gc_manager.py utils/gc_manager.py 2>NUL
+ampy --port %PORT% put utils/supervisor.py utils/supervisor.py 2>NUL
+ampy --port %PORT% put utils/error_logger.py utils/error_logger.py 2>NUL
 ampy --port %PORT% put utils/get_bool.py utils/get_bool.py 2>NUL
 ampy --port %PORT% put utils/get_float.py utils/get_float.py 2>NUL
 ampy --port %PORT% put utils/get_int.py utils/get_int.py 2>NUL
@@ -42,22 +47,32 @@ ampy --port %PORT% put utils/log_level.py utils/log_level.py 2>NUL
 
 echo   mkdir src...
 ampy --port %PORT% mkdir src 2>NUL
+ampy --port %PORT% put src/actuator.py src/actuator.py 2>NUL
 ampy --port %PORT% put src/button.py src/button.py 2>NUL
+ampy --port %PORT% put src/captive_portal.py src/captive_portal.py 2>NUL
+ampy --port %PORT% put src/checkpoint.py src/checkpoint.py 2>NUL
 ampy --port %PORT% put src/config.py src/config.py 2>NUL
+ampy --port %PORT% put src/filter.py src/filter.py 2>NUL
 ampy --port %PORT% put src/functions.py src/functions.py 2>NUL
 ampy --port %PORT% put src/lcd_api.py src/lcd_api.py 2>NUL
 ampy --port %PORT% put src/lcd.py src/lcd.py 2>NUL
 ampy --port %PORT% put src/led.py src/led.py 2>NUL
 ampy --port %PORT% put src/machine_i2c_lcd.py src/machine_i2c_lcd.py 2>NUL
+ampy --port %PORT% put src/mqtt.py src/mqtt.py 2>NUL
 ampy --port %PORT% put src/relay.py src/relay.py 2>NUL
 ampy --port %PORT% put src/rlock.py src/rlock.py 2>NUL
+ampy --port %PORT% put src/sampler.py src/sampler.py 2>NUL
+ampy --port %PORT% put src/schedule.py src/schedule.py 2>NUL
+ampy --port %PORT% put src/startup.py src/startup.py 2>NUL
 ampy --port %PORT% put src/temp.py src/temp.py 2>NUL
+ampy --port %PORT% put src/validator.py src/validator.py 2>NUL
 ampy --port %PORT% put src/wifi.py src/wifi.py 2>NUL
 
 echo   mkdir web...
 ampy --port %PORT% mkdir web 2>NUL
 ampy --port %PORT% put web/index.html web/index.html 2>NUL
 ampy --port %PORT% put web/styles.css web/styles.css 2>NUL
+ampy --port %PORT% put web/wifi.html web/wifi.html 2>NUL
 
 echo copying files... DONE
 ampy --port %PORT% ls 2>NUL
@@ -0,0 +1,171 @@
+"""Host-side simulation of the Warmwassersteuerung hardware.
+
+The package provides CPython stand-ins for the MicroPython modules the
+project imports (``machine``, ``onewire``, ``ds18x20``, ``dht``, ``network``,
+``ntptime``, ``uasyncio``, ``ujson``, ``time`` and ``gc``).  They are wired to
+a shared :data:`sim.world.world`: relay pins drive a boiler model, the
+DS18X20 probes read its temperatures, LCD writes are decoded by a recording
+HD44780 and the webserver listens on an in-memory loopback.  Time is virtual, so an hour on
+the device runs in seconds.
+
+Example::
+
+    python -m sim --duration 3600
+
+    from sim import run
+    world = run(duration=3600)
+    print(world.lcd.lines())
+
+The project modules are singletons, so each process can run one simulation.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from sim.boiler import BoilerModel  # noqa: F401
+from sim.clock import VirtualEventLoop
+from sim.world import world
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_installed = False
+
+
+def install():
+    """Register the stand-in modules in ``sys.modules``.
+
+    Must be called before any project module is imported.
+    """
+
+    global _installed
+    if _installed:
+        return
+
+    from sim import dht, ds18x20, gc, loopback, machine, network, ntptime, onewire  # noqa
+    from sim import time, uasyncio  # noqa
+
+    sys.modules.update(
+        {
+            "machine": machine,
+            "onewire": onewire,
+            "ds18x20": ds18x20,
+            "dht": dht,
+            "network": network,
+            "ntptime": ntptime,
+            "uasyncio": uasyncio,
+            "ujson": json,
+            "time": time,
+            "utime": time,
+            "gc": gc,
+        }
+    )
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    _installed = True
+
+
+def prepare(config_path=None, overrides=None, boiler=None, seed=0):
+    """Create the simulated device filesystem and import the project.
+
+    Args:
+        config_path (str, optional): Configuration to start with. Defaults to
+            ``config.example.json``.
+        overrides (dict, optional): Values replacing entries of the
+            configuration, e.g. ``{"boot_normal": 0}``.
+        boiler (BoilerModel, optional): Boiler model to simulate.
+        seed (int): Seed for sensor noise.
+
+    Returns:
+        tuple: ``(loop, main_module, webserver_module)``
+    """
+
+    install()
+
+    with open(config_path or os.path.join(PROJECT_DIR, "config.example.json")) as file:
+        config_data = json.load(file)
+    config_data.update(overrides or {})
+
+    # Device filesystem in a temporary directory
+    root = tempfile.mkdtemp(prefix="sim-")
+    with open(os.path.join(root, "config.json"), "w") as file:
+        json.dump(config_data, file)
+    shutil.copytree(os.path.join(PROJECT_DIR, "web"), os.path.join(root, "web"))
+
+    world.reset(boiler=boiler, seed=seed)
+    world.configure(config_data)
+    world.root = root
+
+    loop = VirtualEventLoop(world.clock)
+    asyncio.set_event_loop(loop)
+
+    import main as main_module
+    import webserver as webserver_module
+    from src.config import config
+    from utils.error_logger import error_log
+    from src.checkpoint import checkpoint
+
+    config.root_path = root + "/"
+    config.file_path = config.root_path + config.file_name
+    webserver_module.WEB_PATH = root + "/web/"
+    error_log.path = root + error_log.path
+    error_log.opened = False
+    checkpoint.path = root + checkpoint.path
+    checkpoint.opened = False
+
+    return loop, main_module, webserver_module
+
+
+async def _supervise(task, duration, callback, interval):
+    """Run until ``task`` ends or ``duration`` virtual seconds have passed."""
+
+    from sim.machine import ResetError
+
+    end = world.clock.now + duration
+    while not task.done() and world.clock.now < end:
+        await asyncio.wait([task], timeout=min(interval, end - world.clock.now))
+        if world.wdt is not None and world.wdt.expired():
+            raise ResetError("WDT timeout")
+        if callback is not None:
+            result = callback(world)
+            if asyncio.iscoroutine(result):
+                await result
+    if task.done():
+        task.result()
+
+
+def run(duration=3600.0, webserver=True, callback=None, interval=1.0, **kwargs):
+    """Run ``main()`` (and ``webserver()``) for ``duration`` virtual seconds.
+
+    Args:
+        duration (float): Virtual seconds to simulate.
+        webserver (bool): Also start ``webserver()``.
+        callback (callable, optional): ``callback(world)`` called every
+            ``interval`` virtual seconds; may be a coroutine function.
+        interval (float): Virtual seconds between callbacks.
+        **kwargs: Passed to :func:`prepare`.
+
+    Returns:
+        World: The simulated world after the run.
+
+    Raises:
+        machine.ResetError: If the device called ``machine.reset()`` or the
+            watchdog was not fed in time.
+    """
+
+    loop, main_module, webserver_module = prepare(**kwargs)
+    try:
+        if webserver:
+            loop.create_task(webserver_module.webserver())
+        task = loop.create_task(main_module.main())
+        loop.run_until_complete(_supervise(task, duration, callback, interval))
+    finally:
+        for pending in asyncio.all_tasks(loop):
+            pending.cancel()
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+        world.update()
+    return world
@@ -0,0 +1,64 @@
+"""Command line entry point: ``python -m sim``."""
+
+import argparse
+
+import sim
+from sim import loopback
+from sim.broker import broker
+
+
+def print_state(world):
+    """Print the virtual time, boiler state and decoded LCD lines."""
+
+    boiler = world.boiler
+    print(
+        f"--- t={world.clock.now:.1f}s outlet={boiler.outlet_temp:.1f}°C "
+        f"valve={boiler.valve_position:.2f}"
+    )
+    for line in world.lcd.lines() if world.lcd else []:
+        print(f"|{line}|")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the Warmwassersteuerung")
+    parser.add_argument("--duration", type=float, default=3600.0, help="virtual seconds")
+    parser.add_argument("--config", help="config.json to start with")
+    parser.add_argument("--fast-boot", action="store_true", help="skip both start phases")
+    parser.add_argument("--valve", type=float, default=0.3, help="initial valve position")
+    parser.add_argument("--interval", type=float, default=0.0, help="print state every x virtual seconds")
+    parser.add_argument("--request", metavar="PATH", help="GET PATH at the end and print the response")
+    parser.add_argument("--mqtt", action="store_true", help="publish to a broker stand-in and print the messages")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.fast_boot:
+        overrides["boot_normal"] = 0
+    if args.mqtt:
+        broker.start()
+        overrides["mqtt_broker"] = "sim"
+
+    async def callback(world):
+        if args.interval > 0 and world.clock.now < args.duration:
+            print_state(world)
+        elif args.request and world.clock.now >= args.duration:
+            response = await loopback.request("GET", args.request)
+            print(response.decode("utf-8", "replace"))
+
+    world = sim.run(
+        duration=args.duration,
+        config_path=args.config,
+        overrides=overrides,
+        boiler=sim.BoilerModel(valve_position=args.valve),
+        callback=callback,
+        interval=args.interval or args.duration,
+    )
+
+    print_state(world)
+    for time, topic, payload, retain in broker.messages:
+        print(f"mqtt t={time:.1f}s {topic}: {payload.decode('utf-8', 'replace')}")
+    for pin, switches in world.relay_switches.items():
+        print(f"relay pin {pin}: {switches} switches, {world.relay_on_time[pin]:.1f} s on")
+
+
+if __name__ == "__main__":
+    main()
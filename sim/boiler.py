@@ -0,0 +1,141 @@
+"""Thermal model of the hot water boiler and its cold water mixing valve."""
+
+import math
+
+
+class BoilerModel:
+    """Outlet temperature of a boiler with a motorized cold water mixing valve.
+
+    The valve position ranges from ``0.0`` (cold water closed) to ``1.0``
+    (cold water fully open).  While the *open* relay is energized the valve
+    moves towards ``1.0``, while the *close* relay is energized towards
+    ``0.0``, both at a constant speed given by ``valve_travel_time``.
+
+    The outlet temperature follows the mixing temperature of hot and cold
+    water with a first order lag (``time_constant``) after a transport delay
+    (``dead_time``).  ``disturbance`` is an optional function of the
+    simulation time returning an offset in °C for the hot water temperature,
+    e.g. to model a tap draw or the heater switching on.
+
+    Args:
+        hot_temp (float): Hot water temperature in °C.
+        cold_temp (float): Cold water temperature in °C.
+        valve_position (float): Initial valve position.
+        valve_travel_time (float): Seconds for a full valve stroke.
+        time_constant (float): Seconds of the first order lag.
+        dead_time (float): Seconds until a mixing change reaches the sensor.
+        outlet_temp (float, optional): Initial outlet temperature. Defaults to
+            the steady state of ``valve_position``.
+        disturbance (callable, optional): ``disturbance(t) -> °C`` offset.
+        step (float): Maximum integration step in seconds.
+    """
+
+    def __init__(
+        self,
+        hot_temp=65.0,
+        cold_temp=12.0,
+        valve_position=0.3,
+        valve_travel_time=120.0,
+        time_constant=90.0,
+        dead_time=10.0,
+        outlet_temp=None,
+        disturbance=None,
+        step=0.5,
+    ):
+        self.hot_temp = float(hot_temp)
+        self.cold_temp = float(cold_temp)
+        self.valve_position = min(1.0, max(0.0, float(valve_position)))
+        self.valve_travel_time = float(valve_travel_time)
+        self.time_constant = float(time_constant)
+        self.dead_time = float(dead_time)
+        self.disturbance = disturbance
+        self.step = float(step)
+        self.time = 0.0
+        mix_temp = self.mix_temp(self.valve_position, 0.0)
+        self.outlet_temp = mix_temp if outlet_temp is None else float(outlet_temp)
+
+        # Ring of delayed mixing temperatures, one slot per integration step
+        self._delay = [mix_temp] * max(1, int(math.ceil(self.dead_time / self.step)))
+        self._delay_index = 0
+
+    def supply_temp(self, t=None):
+        """Return the hot water temperature at time ``t`` in °C."""
+
+        t = self.time if t is None else t
+        return self.hot_temp + (self.disturbance(t) if self.disturbance else 0.0)
+
+    def mix_temp(self, valve_position, t):
+        """Return the mixing temperature for ``valve_position`` at time ``t``."""
+
+        supply_temp = self.supply_temp(t)
+        return supply_temp + (self.cold_temp - supply_temp) * valve_position
+
+    def advance(self, seconds, opening=False, closing=False):
+        """Integrate the model ``seconds`` forward with constant relay states.
+
+        Args:
+            seconds (float): Duration to integrate.
+            opening (bool): ``True`` while the open relay is energized.
+            closing (bool): ``True`` while the close relay is energized.
+        """
+
+        # Both relays energized block the valve motor
+        speed = 0.0
+        if opening != closing and self.valve_travel_time > 0:
+            speed = (1.0 if opening else -1.0) / self.valve_travel_time
+
+        while seconds > 1e-9:
+            dt = min(self.step, seconds)
+            seconds -= dt
+            self.time += dt
+
+            # Move valve
+            self.valve_position = min(1.0, max(0.0, self.valve_position + speed * dt))
+
+            # Transport delay of the mixed water
+            if self.dead_time > 0:
+                delayed_temp = self._delay[self._delay_index]
+                self._delay[self._delay_index] = self.mix_temp(self.valve_position, self.time)
+                self._delay_index = (self._delay_index + 1) % len(self._delay)
+            else:
+                delayed_temp = self.mix_temp(self.valve_position, self.time)
+
+            # First order lag towards the delayed mixing temperature
+            if self.time_constant > 0:
+                alpha = 1.0 - math.exp(-dt / self.time_constant)
+            else:
+                alpha = 1.0
+            self.outlet_temp += (delayed_temp - self.outlet_temp) * alpha
+
+
+class Disturbance:
+    """Periodic disturbances of the hot water temperature.
+
+    ``heater_amplitude`` swings the supply temperature sinusoidally with
+    ``heater_period`` seconds (heater cycling). Every ``draw_interval``
+    seconds a tap draw lowers it by ``draw_drop`` °C for ``draw_duration``
+    seconds. Instances are picklable so they can be sent to worker processes.
+    """
+
+    def __init__(
+        self,
+        heater_amplitude=0.0,
+        heater_period=3600.0,
+        draw_drop=0.0,
+        draw_interval=5400.0,
+        draw_duration=600.0,
+    ):
+        self.heater_amplitude = heater_amplitude
+        self.heater_period = heater_period
+        self.draw_drop = draw_drop
+        self.draw_interval = draw_interval
+        self.draw_duration = draw_duration
+
+    def __call__(self, t):
+        offset = 0.0
+        if self.heater_amplitude and self.heater_period > 0:
+            offset += self.heater_amplitude * math.sin(2 * math.pi * t / self.heater_period)
+        if self.draw_drop and self.draw_interval > 0:
+            if t % self.draw_interval < self.draw_duration:
+                offset -= self.draw_drop
+        return offset
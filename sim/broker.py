@@ -0,0 +1,158 @@
+"""Minimal MQTT 3.1.1 broker on the in-memory loopback (QoS 0 only)."""
+
+from sim import loopback
+
+# Control packet types (upper nibble of the fixed header)
+CONNECT = 0x10
+PUBLISH = 0x30
+SUBSCRIBE = 0x80
+PINGREQ = 0xC0
+DISCONNECT = 0xE0
+
+
+def _packet(header, body):
+    length = bytearray()
+    remaining = len(body)
+    while True:
+        byte = remaining & 0x7F
+        remaining >>= 7
+        length.append(byte | 0x80 if remaining else byte)
+        if not remaining:
+            return bytes((header,)) + bytes(length) + body
+
+
+def _string(data, offset):
+    length = int.from_bytes(data[offset : offset + 2], "big")
+    return data[offset + 2 : offset + 2 + length], offset + 2 + length
+
+
+def _matches(topic_filter, topic):
+    if topic_filter.endswith("#"):
+        return topic.startswith(topic_filter[:-1])
+    return topic_filter == topic
+
+
+class Client:
+    """Session of one connected client."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.client_id = None
+        self.subscriptions = []
+        self.will = None
+
+
+class MqttBroker:
+    """Broker stand-in for the MQTT client of the device.
+
+    Every message published by a client is appended to :attr:`messages` as
+    ``(virtual time, topic, payload, retain)``.  :meth:`publish` sends a
+    message to the subscribed clients, :meth:`stop` drops all connections to
+    simulate a broker outage.
+
+    Example::
+
+        from sim.broker import broker
+        broker.start()
+        sim.run(600, overrides={"mqtt_broker": "sim"})
+        print(broker.messages)
+    """
+
+    def __init__(self):
+        self.port = None
+        self.clients = []
+        self.messages = []
+        self.retained = {}
+
+    def start(self, port=1883):
+        """Listen on the loopback ``port``."""
+
+        self.port = port
+        loopback.servers[port] = self.handle
+
+    def stop(self):
+        """Stop listening and drop all connections without a DISCONNECT."""
+
+        loopback.servers.pop(self.port, None)
+        for client in list(self.clients):
+            client.writer.close()
+
+    def publish(self, topic, payload, retain=False):
+        """Send ``payload`` to all clients subscribed to ``topic``."""
+
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if retain:
+            self.retained[topic] = payload
+        body = len(topic).to_bytes(2, "big") + topic.encode("utf-8") + payload
+        for client in self.clients:
+            if any(_matches(f, topic) for f in client.subscriptions):
+                client.writer.write(_packet(PUBLISH | int(retain), body))
+
+    def _record(self, topic, payload, retain):
+        from sim.world import world
+
+        self.messages.append((world.clock.now, topic, payload, retain))
+        self.publish(topic, payload, retain)
+
+    async def handle(self, reader, writer):
+        client = Client(writer)
+        self.clients.append(client)
+        try:
+            while True:
+                header = (await reader.readexactly(1))[0]
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b""
+                packet_type = header & 0xF0
+
+                if packet_type == CONNECT:
+                    _, offset = _string(body, 0)
+                    flags = body[offset + 1]
+                    client_id, offset = _string(body, offset + 4)
+                    client.client_id = client_id.decode()
+                    if flags & 0x04:
+                        will_topic, offset = _string(body, offset)
+                        will_payload, offset = _string(body, offset)
+                        client.will = (will_topic.decode(), will_payload, bool(flags & 0x20))
+                    writer.write(b"\x20\x02\x00\x00")
+
+                elif packet_type == SUBSCRIBE:
+                    offset = 2
+                    codes = bytearray()
+                    while offset < len(body):
+                        topic_filter, offset = _string(body, offset)
+                        client.subscriptions.append(topic_filter.decode())
+                        codes.append(body[offset])
+                        offset += 1
+                    writer.write(_packet(0x90, body[:2] + bytes(codes)))
+
+                elif packet_type == PUBLISH:
+                    topic, offset = _string(body, 0)
+                    if header & 0x06:
+                        offset += 2
+                    self._record(topic.decode(), body[offset:], bool(header & 0x01))
+
+                elif packet_type == PINGREQ:
+                    writer.write(b"\xd0\x00")
+
+                elif packet_type == DISCONNECT:
+                    client.will = None
+                    break
+
+        except Exception:
+            pass
+
+        finally:
+            self.clients.remove(client)
+            writer.close()
+            if client.will:
+                self._record(*client.will)
+
+
+broker = MqttBroker()
@@ -0,0 +1,84 @@
+"""Virtual clock and asyncio event loop running in accelerated time."""
+
+import asyncio
+import selectors
+
+# MicroPython ticks wrap around at 2**30
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+def ticks_diff(ticks1, ticks2):
+    """Signed difference of two tick values, respecting the wrap around."""
+
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def ticks_add(ticks, delta):
+    """Offset a tick value by ``delta``, respecting the wrap around."""
+
+    return (ticks + delta) & TICKS_MAX
+
+
+class VirtualClock:
+    """Monotonic simulation time in seconds.
+
+    The clock only moves when :meth:`advance` is called, either by the event
+    loop jumping to the next timer or by blocking calls like ``sleep_ms``.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def advance(self, seconds):
+        """Move the clock forward by ``seconds``."""
+
+        if seconds > 0:
+            self.now += seconds
+
+    def ticks_ms(self):
+        """Return the current time as MicroPython ``ticks_ms`` value."""
+
+        return int(self.now * 1000) & TICKS_MAX
+
+    def ticks_us(self):
+        """Return the current time as MicroPython ``ticks_us`` value."""
+
+        return int(self.now * 1000000) & TICKS_MAX
+
+
+class VirtualSelector:
+    """Selector that advances the virtual clock instead of blocking.
+
+    The event loop passes the time until the next scheduled timer as
+    ``timeout``.  Instead of waiting, the clock jumps forward and the real
+    selector is polled without blocking.
+    """
+
+    def __init__(self, selector, clock):
+        self._selector = selector
+        self._clock = clock
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events:
+            return events
+        if timeout is None:
+            raise RuntimeError("simulation deadlock: no timers and no ready tasks")
+        self._clock.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose ``time()`` is the virtual clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        super().__init__(VirtualSelector(selectors.DefaultSelector(), clock))
+
+    def time(self):
+        return self.clock.now
@@ -0,0 +1,23 @@
+"""Stand-in for MicroPython's ``dht`` driver reading the simulated world."""
+
+from sim.world import world
+
+
+class DHT11:
+    """DHT11 sensor on a simulated pin."""
+
+    def __init__(self, pin):
+        self.pin = pin
+        self._temperature = 0.0
+
+    def measure(self):
+        self._temperature = round(world.read_sensor(self.pin.id))
+
+    def temperature(self):
+        return self._temperature
+
+    def humidity(self):
+        return 50
+
+
+DHT22 = DHT11
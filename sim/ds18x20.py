@@ -0,0 +1,35 @@
+"""Stand-in for MicroPython's ``ds18x20`` driver reading the simulated world."""
+
+from sim.world import world
+
+# Resolution bits in the configuration register of the scratchpad
+RESOLUTIONS = {0x1F: 9, 0x3F: 10, 0x5F: 11, 0x7F: 12}
+
+
+class DS18X20:
+    """DS18B20 probes on a simulated 1-Wire bus."""
+
+    def __init__(self, onewire):
+        self.ow = onewire
+
+    def _sensor(self):
+        sensor = world.sensors.get(self.ow.pin.id)
+        if sensor is None or sensor.fault == "missing":
+            return None
+        return sensor
+
+    def scan(self):
+        if self._sensor() is None:
+            return []
+        return [bytearray(b"\x28\x00\x00\x00\x00\x00\x00") + bytearray([self.ow.pin.id])]
+
+    def convert_temp(self):
+        pass
+
+    def write_scratch(self, rom, buf):
+        sensor = self._sensor()
+        if sensor is not None:
+            sensor.resolution = RESOLUTIONS.get(buf[2], 12)
+
+    def read_temp(self, rom):
+        return world.read_sensor(self.ow.pin.id)
@@ -0,0 +1,42 @@
+"""Stand-in for MicroPython's ``gc`` module.
+
+Collections only run CPython's cheap generation 0 pass and are counted, so a
+simulation is not dominated by full collections.  Heap figures are taken from
+``tracemalloc`` when it is tracing, otherwise they are fixed.
+"""
+
+import gc as _gc
+import tracemalloc
+
+# Heap size of a Raspberry Pi Pico W running MicroPython
+HEAP_SIZE = 192 * 1024
+
+collections = 0
+_threshold = -1
+
+
+def __getattr__(name):
+    return getattr(_gc, name)
+
+
+def collect():
+    global collections
+    collections += 1
+    _gc.collect(0)
+
+
+def mem_alloc():
+    if tracemalloc.is_tracing():
+        return min(HEAP_SIZE, tracemalloc.get_traced_memory()[0])
+    return HEAP_SIZE // 4
+
+
+def mem_free():
+    return HEAP_SIZE - mem_alloc()
+
+
+def threshold(amount=None):
+    global _threshold
+    if amount is None:
+        return _threshold
+    _threshold = amount
@@ -0,0 +1,101 @@
+"""HD44780 character LCD behind a PCF8574 I2C expander, decoded from the bus."""
+
+MASK_RS = 0x01
+MASK_E = 0x04
+MASK_BACKLIGHT = 0x08
+
+# Readable replacements for the HD44780A00 ROM and the custom arrow glyphs
+CHARACTERS = {0: "↑", 1: "↓", 0o342: "ß", 0o337: "°", 0o341: "ä", 0o357: "ö", 0o365: "ü"}
+
+
+class RecordingLcd:
+    """Decode the I2C bytes written by ``I2cLcd`` into display memory.
+
+    Every byte written to the expander is counted in ``bytes_written``.  A
+    nibble is latched on the falling edge of the enable line, exactly like the
+    real controller, so the decoded ``lines()`` reflect what a person would
+    see on the display.
+
+    Args:
+        cols (int): Number of display columns.
+        rows (int): Number of display rows.
+    """
+
+    def __init__(self, cols=20, rows=4):
+        self.cols = cols
+        self.rows = rows
+        self.ddram = bytearray(b" " * 0x80)
+        self.address = 0
+        self.cgram = False
+        self.four_bit = False
+        self.high_nibble = None
+        self.last_byte = 0
+        self.backlight = False
+        self.bytes_written = 0
+        self.commands = 0
+        self.characters = 0
+
+    def write(self, data):
+        """Process bytes written to the expander."""
+
+        for byte in data:
+            self.bytes_written += 1
+            self.backlight = bool(byte & MASK_BACKLIGHT)
+
+            # Latch on falling edge of E
+            if self.last_byte & MASK_E and not byte & MASK_E:
+                self._nibble(byte >> 4, byte & MASK_RS)
+            self.last_byte = byte
+
+    def _nibble(self, nibble, rs):
+        # 8-bit mode during initialization: every nibble is a full command
+        if not self.four_bit:
+            command = nibble << 4
+            if command & 0xF0 == 0x20:
+                self.four_bit = True
+            return
+
+        if self.high_nibble is None:
+            self.high_nibble = nibble
+            return
+
+        value = (self.high_nibble << 4) | nibble
+        self.high_nibble = None
+        if rs:
+            self._data(value)
+        else:
+            self._command(value)
+
+    def _command(self, command):
+        self.commands += 1
+        if command & 0x80:
+            self.address = command & 0x7F
+            self.cgram = False
+        elif command & 0x40:
+            self.cgram = True
+        elif command == 0x01:
+            self.ddram[:] = b" " * 0x80
+            self.address = 0
+        elif command == 0x02:
+            self.address = 0
+
+    def _data(self, value):
+        if self.cgram:
+            return
+        self.characters += 1
+        self.ddram[self.address & 0x7F] = value
+        self.address = (self.address + 1) & 0x7F
+
+    def line(self, row):
+        """Return the decoded text of display line ``row``."""
+
+        address = (0x40 if row & 1 else 0) + (self.cols if row & 2 else 0)
+        return "".join(
+            CHARACTERS.get(code, chr(code))
+            for code in self.ddram[address : address + self.cols]
+        )
+
+    def lines(self):
+        """Return the decoded text of all display lines."""
+
+        return [self.line(row) for row in range(self.rows)]
@@ -0,0 +1,125 @@
+"""In-memory replacement for ``uasyncio.start_server`` and ``open_connection``."""
+
+import asyncio
+
+# Port -> client handler registered by start_server()
+servers = {}
+
+
+class LoopbackServer:
+    """Handle returned by the simulated ``start_server``."""
+
+    def __init__(self, port):
+        self.port = port
+
+    def close(self):
+        servers.pop(self.port, None)
+
+    async def wait_closed(self):
+        pass
+
+
+class LoopbackWriter:
+    """Collect everything a client handler writes."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def awrite(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        self.closed = True
+
+    def get_extra_info(self, name, default=None):
+        return ("127.0.0.1", 50000) if name == "peername" else default
+
+
+class PipeWriter(LoopbackWriter):
+    """Writer that feeds everything written into the reader of the peer."""
+
+    def __init__(self, peer):
+        super().__init__()
+        self.peer = peer
+
+    def write(self, data):
+        if self.closed:
+            raise OSError("connection closed")
+        self.peer.feed_data(bytes(data))
+
+    async def awrite(self, data):
+        self.write(data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.peer.feed_eof()
+
+    async def wait_closed(self):
+        self.close()
+
+
+async def start_server(handler, host, port, backlog=5):
+    servers[port] = handler
+    return LoopbackServer(port)
+
+
+async def open_connection(host, port):
+    """Connect to the handler listening on ``port``, the host is ignored.
+
+    Returns:
+        tuple: ``(reader, writer)`` of the client side.
+
+    Raises:
+        ConnectionRefusedError: If no server listens on ``port``.
+    """
+
+    handler = servers.get(port)
+    if handler is None:
+        raise ConnectionRefusedError(port)
+
+    client_reader = asyncio.StreamReader()
+    server_reader = asyncio.StreamReader()
+    client_writer = PipeWriter(server_reader)
+    server_writer = PipeWriter(client_reader)
+    asyncio.get_event_loop().create_task(handler(server_reader, server_writer))
+    return client_reader, client_writer
+
+
+async def request(method="GET", path="/", body="", port=80, headers=None):
+    """Send an HTTP request to the handler listening on ``port``.
+
+    Returns:
+        bytes: The raw response written by the handler.
+
+    Raises:
+        ConnectionRefusedError: If no server listens on ``port``.
+    """
+
+    handler = servers.get(port)
+    if handler is None:
+        raise ConnectionRefusedError(port)
+
+    body = body.encode("utf-8") if isinstance(body, str) else body
+    lines = [f"{method} {path} HTTP/1.1", "Host: sim"]
+    for key, value in (headers or {}).items():
+        lines.append(f"{key}: {value}")
+    if body:
+        lines.append(f"Content-Length: {len(body)}")
+
+    reader = asyncio.StreamReader()
+    reader.feed_data(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + body)
+    reader.feed_eof()
+    writer = LoopbackWriter()
+    await handler(reader, writer)
+    return bytes(writer.data)
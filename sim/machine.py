@@ -0,0 +1,122 @@
+"""Stand-in for MicroPython's ``machine`` module."""
+
+from sim.world import world
+
+
+# Reset causes (values of the ESP32 port)
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+
+class ResetError(Exception):
+    """Raised by :func:`reset` to end the simulation like a device reset."""
+
+
+def reset():
+    raise ResetError("machine.reset()")
+
+
+def soft_reset():
+    raise ResetError("machine.soft_reset()")
+
+
+class WDT:
+    """Watchdog on the virtual clock, checked by :func:`sim.run`."""
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout / 1000
+        self.fed_at = world.clock.now
+        world.wdt = self
+
+    def feed(self):
+        self.fed_at = world.clock.now
+
+    def expired(self):
+        return world.clock.now - self.fed_at > self.timeout
+
+
+def reset_cause():
+    return world.reset_cause
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x23\x5a\x2c"
+
+
+def freq(hz=None):
+    return 125000000
+
+
+class Pin:
+    """GPIO pin connected to the simulated world."""
+
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self.handler = None
+        self.trigger = 0
+        world.pins[id] = self
+        if id not in world.pin_values:
+            world.pin_values[id] = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return world.pin_values.get(self.id, 0)
+        world.pin_changed(self.id, 1 if value else 0)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(not self.value())
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self.handler = handler
+        self.trigger = trigger
+
+    def edge(self, old_value, new_value):
+        """Call the IRQ handler for a level change from ``world.set_input``."""
+
+        if self.handler is None:
+            return
+        if (new_value and self.trigger & Pin.IRQ_RISING) or (
+            not new_value and self.trigger & Pin.IRQ_FALLING
+        ):
+            self.handler(self)
+
+
+class I2C:
+    """I2C bus delivering writes to devices registered in the world."""
+
+    def __init__(self, id, sda=None, scl=None, freq=400000):
+        self.id = id
+        self.sda = sda
+        self.scl = scl
+        self.freq = freq
+
+    def scan(self):
+        return sorted(world.i2c_devices)
+
+    def writeto(self, addr, buf, stop=True):
+        world.i2c_write(addr, bytes(buf))
+        return len(buf)
@@ -0,0 +1,86 @@
+"""Stand-in for MicroPython's ``network`` module backed by ``world.network``."""
+
+from sim.world import world
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+_country = "XX"
+
+
+def country(code=None):
+    global _country
+    if code is None:
+        return _country
+    _country = code
+
+
+class WLAN:
+    """Station or access point interface of the simulated device."""
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self.ssid = None
+        self.connected_at = None
+        self.settings = {}
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+        if not self._active:
+            self.connected_at = None
+
+    def connect(self, ssid=None, password=None):
+        if not self._active:
+            raise OSError("WLAN not active")
+        self.ssid = ssid
+        self.connected_at = world.clock.now + world.network.connect_delay
+
+    def disconnect(self):
+        self.connected_at = None
+
+    def isconnected(self):
+        if self.interface == AP_IF:
+            return self._active
+        network = world.network
+        return (
+            self._active
+            and self.connected_at is not None
+            and world.clock.now >= self.connected_at
+            and network.available
+            and (network.ssid is None or network.ssid == self.ssid)
+        )
+
+    def status(self, param=None):
+        if param == "rssi":
+            return world.network.rssi if self.isconnected() else 0
+        if self.isconnected():
+            return STAT_GOT_IP
+        if self.connected_at is not None and world.network.available:
+            return STAT_CONNECTING
+        return STAT_NO_AP_FOUND if self.connected_at is not None else STAT_IDLE
+
+    def ifconfig(self, config=None):
+        if self.interface == AP_IF:
+            return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "192.168.4.1")
+        return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self.settings.get(args[0])
+        self.settings.update(kwargs)
+
+    def scan(self):
+        if not world.network.available:
+            return []
+        ssid = (world.network.ssid or "sim").encode()
+        return [(ssid, b"\x00\x11\x22\x33\x44\x55", 6, world.network.rssi, 3, 0)]
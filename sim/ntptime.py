@@ -0,0 +1,15 @@
+"""Stand-in for MicroPython's ``ntptime`` module.
+
+The simulated RTC already runs on the virtual clock, so :func:`settime`
+only fails like the real module when the network is not available.
+"""
+
+from sim.world import world
+
+host = "pool.ntp.org"
+timeout = 1
+
+
+def settime():
+    if not world.network.available:
+        raise OSError("ETIMEDOUT")
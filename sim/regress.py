@@ -0,0 +1,190 @@
+"""Regression scenarios run against the boiler model.
+
+Every scenario runs the real ``main()`` in its own worker process (the
+project modules are singletons) and checks the device state every few
+virtual seconds:
+
+- ``end_stop``: a supply of 40 °C below the band keeps the valve at its
+  closed end stop for 4 h.  The constant reading must not count as a
+  faulted sensor, ``current_temp`` never reads -127 and the LCD never
+  shows "Temp Fehler".
+- ``stuck_sensor``: the outlet probe freezes at 44.5 °C, close enough below
+  the band for the full resolution, while the valve still moves.  The
+  ``sensor_stuck`` gauge is set, the sensor is not faulted.
+- ``spikes``: every ``SPIKE_EVERY``-th read of the outlet probe is 20 °C
+  too hot.  The filter is updated with the accepted samples only (its last
+  update is the last accepted sample) and ``current_temp`` never shows a
+  spike.
+
+Example::
+
+    python -m sim.regress
+    python -m sim.regress end_stop
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+
+# The start phases run, they move the valve to a known position
+BASE_OVERRIDES = {"log_level": "OFF"}
+
+# Outlet probe of the simulated world
+OUTLET_PIN = 6
+
+# Reads between two injected spikes
+SPIKE_EVERY = 7
+
+
+class Check:
+    """Collect the failures of one scenario from periodic samples of the world."""
+
+    def __init__(self, warmup=0.0):
+        self.warmup = warmup
+        self.failures = []
+
+    def fail(self, world, message):
+        if len(self.failures) < 5:
+            self.failures.append(f"t={world.clock.now:.0f}s: {message}")
+
+    def sample(self, world):
+        from src.config import config
+
+        if world.clock.now < self.warmup:
+            return
+        if config.config.get("current_temp") == -127.0:
+            self.fail(world, "current_temp = -127.0")
+        if any("Temp Fehler" in line for line in world.lcd.lines()):
+            self.fail(world, "LCD shows Temp Fehler")
+
+
+class StuckCheck(Check):
+    """Freeze the outlet probe at ``temp`` from ``start`` and expect the stuck flag."""
+
+    def __init__(self, start, temp, warmup=0.0):
+        super().__init__(warmup)
+        self.start = start
+        self.temp = temp
+        self.flagged = False
+
+    def sample(self, world):
+        from utils.metrics import metrics
+        from src.temp import temp_sensor
+
+        if world.clock.now >= self.start:
+            world.sensors[OUTLET_PIN].fault = self.temp
+        super().sample(world)
+        self.flagged = self.flagged or bool(metrics.get(temp_sensor.stuck_metric))
+
+
+class SpikeCheck(Check):
+    """Add ``spike`` °C to every ``SPIKE_EVERY``-th read and check the filter around them."""
+
+    def __init__(self, spike, warmup=0.0):
+        super().__init__(warmup)
+        self.spike = spike
+        self.reads = 0
+        self.spikes = 0
+        self.installed = False
+
+    def read(self, world):
+        self.reads += 1
+        if self.reads % SPIKE_EVERY == 0:
+            self.spikes += 1
+            return world.boiler.outlet_temp + self.spike
+        return world.boiler.outlet_temp
+
+    def sample(self, world):
+        from src.config import config
+        from src.temp import temp_sensor
+
+        if not self.installed:
+            world.sensors[OUTLET_PIN].read = lambda: self.read(world)
+            self.installed = True
+        super().sample(world)
+        if world.clock.now < self.warmup:
+            return
+
+        validator, filter = temp_sensor.validator, temp_sensor.filter
+        if validator.last is not None and filter.last_ms != validator.last_ms:
+            self.fail(world, "filter not updated with exactly the accepted samples")
+        current_temp = config.config.get("current_temp")
+        if current_temp is not None and current_temp - world.boiler.outlet_temp > self.spike / 2:
+            self.fail(world, f"current_temp = {current_temp} shows a spike")
+
+
+def end_stop():
+    from sim.boiler import BoilerModel
+
+    return 4 * 3600, BoilerModel(hot_temp=40, valve_position=0.0), Check(warmup=600)
+
+
+def stuck_sensor():
+    from sim.boiler import BoilerModel
+
+    return 3 * 3600, BoilerModel(), StuckCheck(start=5400, temp=44.5, warmup=600)
+
+
+def spikes():
+    from sim.boiler import BoilerModel
+
+    return 3 * 3600, BoilerModel(), SpikeCheck(spike=20.0, warmup=600)
+
+
+SCENARIOS = {"end_stop": end_stop, "stuck_sensor": stuck_sensor, "spikes": spikes}
+
+
+def simulate(name):
+    """Run the scenario ``name``; executed in a fresh worker process."""
+
+    import sim
+
+    duration, boiler, check = SCENARIOS[name]()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim.run(
+                duration=duration,
+                webserver=False,
+                callback=check.sample,
+                interval=5.0,
+                overrides=BASE_OVERRIDES,
+                boiler=boiler,
+            )
+        if isinstance(check, StuckCheck) and not check.flagged:
+            check.failures.append("sensor_stuck never set")
+        if isinstance(check, SpikeCheck) and not check.spikes:
+            check.failures.append("no spike injected")
+    except Exception as e:
+        check.failures.append(repr(e))
+    return name, check.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the regression scenarios in simulation")
+    parser.add_argument("scenario", nargs="*", help=f"scenarios to run: {', '.join(SCENARIOS)} (default all)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}")
+
+    # A fresh process per scenario, the project modules keep global state
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers, maxtasksperchild=1) as pool:
+        results = pool.map(simulate, names)
+
+    failed = 0
+    for name, failures in results:
+        print(f"{name}: {'FAILED' if failures else 'ok'}")
+        for failure in failures:
+            print(f"    {failure}")
+        failed += bool(failures)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
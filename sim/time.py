@@ -0,0 +1,59 @@
+"""Stand-in for MicroPython's ``time`` module running on the virtual clock.
+
+Everything not defined here is taken from CPython's ``time`` module.
+"""
+
+import time as _time
+
+from sim.clock import ticks_add, ticks_diff  # noqa: F401
+from sim.world import world
+
+# Wall clock of the simulation start (2024-01-01 00:00:00 UTC)
+EPOCH_START = 1704067200
+
+
+def __getattr__(name):
+    return getattr(_time, name)
+
+
+def ticks_ms():
+    return world.clock.ticks_ms()
+
+
+def ticks_us():
+    return world.clock.ticks_us()
+
+
+def ticks_cpu():
+    return world.clock.ticks_us()
+
+
+def sleep_ms(ms):
+    world.clock.advance(ms / 1000)
+
+
+def sleep_us(us):
+    world.clock.advance(us / 1000000)
+
+
+def sleep(seconds):
+    world.clock.advance(seconds)
+
+
+def time():
+    return EPOCH_START + int(world.clock.now)
+
+
+def time_ns():
+    return int((EPOCH_START + world.clock.now) * 1000000000)
+
+
+def gmtime(secs=None):
+    return _time.gmtime(time() if secs is None else secs)[:8]
+
+
+localtime = gmtime
+
+
+def mktime(tuple):
+    return int(_time.mktime(tuple[:8] + (0,)) - _time.timezone)
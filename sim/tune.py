@@ -0,0 +1,196 @@
+"""Batch simulation for tuning the regulation parameters.
+
+Every combination of the given configuration and boiler parameters runs the
+real ``main()`` against the boiler model in its own worker process (the
+project modules are singletons) and is scored by:
+
+- ``in_band``: share of time the outlet temperature is inside
+  ``nominal_min_temp`` .. ``nominal_max_temp``
+- ``overshoot``: largest distance above or below the band in °C
+- ``error``: mean distance outside the band in °C
+- ``actuations_h``: relay switches per hour
+- ``relay_s_h``: relay on-time per hour in seconds
+
+Example::
+
+    python -m sim.tune --duration 21600 \\
+        --param relay_time=800,1200,1600 --param update_time=60,120 \\
+        --boiler time_constant=60,120 --heater 3 --draw 8
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+
+# Default tuning configuration: skip both start phases
+BASE_OVERRIDES = {"boot_normal": 0, "log_level": "OFF"}
+
+
+def parse_values(text):
+    """Parse ``a,b,c`` into a list of ints, floats or strings."""
+
+    values = []
+    for item in text.split(","):
+        for convert in (int, float):
+            try:
+                values.append(convert(item))
+                break
+            except ValueError:
+                pass
+        else:
+            values.append(item)
+    return values
+
+
+def grid(specs):
+    """Expand ``["key=a,b", ...]`` to a list of dicts with all combinations."""
+
+    keys = []
+    choices = []
+    for spec in specs or []:
+        key, _, text = spec.partition("=")
+        keys.append(key.strip())
+        choices.append(parse_values(text))
+    return [dict(zip(keys, combination)) for combination in itertools.product(*choices)]
+
+
+class Metrics:
+    """Accumulate band metrics from periodic samples of the world."""
+
+    def __init__(self, min_temp, max_temp, warmup=0.0):
+        self.min_temp = min_temp
+        self.max_temp = max_temp
+        self.warmup = warmup
+        self.samples = 0
+        self.in_band = 0
+        self.overshoot = 0.0
+        self.error = 0.0
+        self.switches_start = None
+        self.on_time_start = None
+
+    def sample(self, world):
+        if world.clock.now < self.warmup:
+            return
+        world.update()
+        if self.switches_start is None:
+            self.switches_start = sum(world.relay_switches.values())
+            self.on_time_start = sum(world.relay_on_time.values())
+
+        temp = world.boiler.outlet_temp
+        distance = max(self.min_temp - temp, temp - self.max_temp, 0.0)
+        self.samples += 1
+        self.in_band += distance == 0.0
+        self.overshoot = max(self.overshoot, distance)
+        self.error += distance
+
+    def result(self, world, duration):
+        hours = max(duration - self.warmup, 1.0) / 3600
+        samples = max(self.samples, 1)
+        switches = sum(world.relay_switches.values()) - (self.switches_start or 0)
+        on_time = sum(world.relay_on_time.values()) - (self.on_time_start or 0.0)
+        return {
+            "in_band": round(self.in_band / samples, 4),
+            "overshoot": round(self.overshoot, 2),
+            "error": round(self.error / samples, 3),
+            "actuations_h": round(switches / hours, 2),
+            "relay_s_h": round(on_time / hours, 1),
+        }
+
+
+def simulate(job):
+    """Run one parameter set; executed in a fresh worker process."""
+
+    import sim
+    from sim.boiler import BoilerModel, Disturbance
+
+    overrides = dict(BASE_OVERRIDES, **job["config"])
+    with open(job["config_path"] or os.path.join(sim.PROJECT_DIR, "config.example.json")) as file:
+        config_data = dict(json.load(file), **overrides)
+
+    boiler = BoilerModel(disturbance=Disturbance(**job["disturbance"]), **job["boiler"])
+    metrics = Metrics(
+        float(config_data.get("nominal_min_temp", 42.0)),
+        float(config_data.get("nominal_max_temp", 57.0)),
+        warmup=job["warmup"],
+    )
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            world = sim.run(
+                duration=job["duration"],
+                webserver=False,
+                callback=metrics.sample,
+                interval=job["sample_interval"],
+                config_path=job["config_path"],
+                overrides=overrides,
+                boiler=boiler,
+                seed=job["seed"],
+            )
+        result = metrics.result(world, job["duration"])
+    except Exception as e:
+        result = {"failed": repr(e)}
+    return dict(job, result=result)
+
+
+def score(job):
+    """Sort key: most time in band, then smallest error, then fewest switches."""
+
+    result = job["result"]
+    if "failed" in result:
+        return (1, 0, 0, 0)
+    return (0, -result["in_band"], result["error"], result["actuations_h"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune regulation parameters in simulation")
+    parser.add_argument("--param", action="append", metavar="KEY=A,B", help="config values to try")
+    parser.add_argument("--boiler", action="append", metavar="KEY=A,B", help="boiler model values to try")
+    parser.add_argument("--config", help="config.json to start with")
+    parser.add_argument("--duration", type=float, default=6 * 3600, help="virtual seconds per run")
+    parser.add_argument("--warmup", type=float, default=1800, help="virtual seconds ignored by the metrics")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="virtual seconds between samples")
+    parser.add_argument("--heater", type=float, default=0.0, help="supply temp swing in °C (1 h period)")
+    parser.add_argument("--draw", type=float, default=0.0, help="supply temp drop of tap draws in °C")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="write all results as JSON")
+    args = parser.parse_args()
+
+    disturbance = {"heater_amplitude": args.heater, "draw_drop": args.draw}
+    jobs = [
+        {
+            "config": config,
+            "boiler": boiler,
+            "disturbance": disturbance,
+            "config_path": args.config,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "sample_interval": args.sample_interval,
+            "seed": args.seed,
+        }
+        for config in grid(args.param)
+        for boiler in grid(args.boiler)
+    ]
+    print(f"running {len(jobs)} simulation(s) of {args.duration / 3600:.1f} h on {args.workers} worker(s)")
+
+    # A fresh process per job, the project modules keep global state
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers, maxtasksperchild=1) as pool:
+        results = sorted(pool.imap_unordered(simulate, jobs), key=score)
+
+    for job in results:
+        params = " ".join(f"{k}={v}" for k, v in dict(job["config"], **job["boiler"]).items())
+        metrics = " ".join(f"{k}={v}" for k, v in job["result"].items())
+        print(f"{metrics}  |  {params}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Stand-in for MicroPython's ``uasyncio`` on top of CPython's asyncio."""
+
+import asyncio
+from asyncio import *  # noqa: F401,F403
+
+from sim.loopback import open_connection, start_server  # noqa: F401
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(awaitable, timeout):
+    return await asyncio.wait_for(awaitable, timeout / 1000)
+
+
+class ThreadSafeFlag:
+    """Flag that can be set from an IRQ handler and awaited by one task."""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
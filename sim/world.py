@@ -0,0 +1,187 @@
+"""Shared state of the simulated device: clock, pins, sensors, bus and WiFi."""
+
+import random
+
+from sim.boiler import BoilerModel
+from sim.clock import VirtualClock
+from sim.lcd import RecordingLcd
+
+
+class SimSensor:
+    """A 1-Wire/DHT temperature probe reading a value from the world.
+
+    ``fault`` injects sensor errors: ``"missing"`` (no device on the bus),
+    ``"crc"`` (read raises a CRC error), ``"power_on"`` (reads 85.0 °C) or a
+    number for a stuck reading.  ``crc_errors`` makes the next reads raise a
+    CRC error once each, like a disturbed transfer.
+    """
+
+    def __init__(self, read, noise=0.0):
+        self.read = read
+        self.noise = noise
+        self.fault = None
+        self.crc_errors = 0
+        self.resolution = 12
+        self.reads = 0
+
+
+class SimNetwork:
+    """Access point reachable by the simulated WLAN interface."""
+
+    def __init__(self):
+        self.available = True
+        self.ssid = None  # None accepts every SSID
+        self.connect_delay = 2.0
+        self.rssi = -60
+
+
+class World:
+    """Everything outside the microcontroller.
+
+    The boiler model is integrated lazily: whenever a relay pin changes or a
+    sensor is read, the model is advanced from the last update to the current
+    virtual time with the relay states that were active in between.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, boiler=None, seed=0):
+        """Start a new, empty world."""
+
+        self.clock = VirtualClock()
+        self.boiler = boiler or BoilerModel()
+        self.random = random.Random(seed)
+        self.pins = {}
+        self.pin_values = {}
+        self.relay_open_pin = None
+        self.relay_close_pin = None
+        self.sensors = {}
+        self.i2c_devices = {}
+        self.network = SimNetwork()
+        self.updated_at = 0.0
+        self.relay_switches = {}
+        self.relay_on_time = {}
+        self.relay_on_since = {}
+        self.relay_conflicts = 0
+        # Returned by machine.reset_cause(), e.g. machine.WDT_RESET
+        self.reset_cause = 1
+        self.wdt = None
+
+    def configure(self, config_data, lcd=True):
+        """Wire relays, sensors and LCD to the pins given in ``config_data``."""
+
+        self.relay_open_pin = config_data.get("RELAY_OPEN_PIN", 14)
+        self.relay_close_pin = config_data.get("RELAY_CLOSE_PIN", 15)
+        for pin in (self.relay_open_pin, self.relay_close_pin):
+            self.relay_switches[pin] = 0
+            self.relay_on_time[pin] = 0.0
+
+        self.sensors[config_data.get("TEMP_SENSOR_PIN", 6)] = SimSensor(
+            lambda: self.boiler.outlet_temp, noise=0.03
+        )
+        self.sensors[config_data.get("TEMP_SENSOR_2_PIN", 10)] = SimSensor(
+            lambda: self.boiler.supply_temp(), noise=0.03
+        )
+
+        if lcd:
+            address = int(str(config_data.get("LCD_ADDR", "0x27")), 16)
+            self.i2c_devices[address] = RecordingLcd(
+                min(20, config_data.get("LCD_COLS", 20)),
+                min(4, config_data.get("LCD_ROWS", 4)),
+            )
+
+    @property
+    def lcd(self):
+        """Return the first recording LCD on the I2C bus, if any."""
+
+        for device in self.i2c_devices.values():
+            if isinstance(device, RecordingLcd):
+                return device
+        return None
+
+    def relay_active(self, pin):
+        """Return ``True`` if the relay on ``pin`` is energized."""
+
+        return bool(self.pin_values.get(pin, 0))
+
+    def update(self):
+        """Advance the boiler model to the current virtual time."""
+
+        seconds = self.clock.now - self.updated_at
+        if seconds > 0:
+            self.boiler.advance(
+                seconds,
+                opening=self.relay_active(self.relay_open_pin),
+                closing=self.relay_active(self.relay_close_pin),
+            )
+            self.updated_at = self.clock.now
+
+    def pin_changed(self, pin, value):
+        """Record a new output level on ``pin``."""
+
+        self.update()
+        old_value = self.pin_values.get(pin, 0)
+        self.pin_values[pin] = value
+
+        if pin in self.relay_switches and value != old_value:
+            if value:
+                self.relay_switches[pin] += 1
+                self.relay_on_since[pin] = self.clock.now
+            else:
+                self.relay_on_time[pin] += self.clock.now - self.relay_on_since.pop(
+                    pin, self.clock.now
+                )
+            if self.relay_active(self.relay_open_pin) and self.relay_active(
+                self.relay_close_pin
+            ):
+                self.relay_conflicts += 1
+
+    def set_input(self, pin, value):
+        """Drive the input ``pin`` from outside, e.g. a pressed button."""
+
+        old_value = self.pin_values.get(pin, 1)
+        self.pin_values[pin] = 1 if value else 0
+        device_pin = self.pins.get(pin)
+        if device_pin is not None and old_value != self.pin_values[pin]:
+            device_pin.edge(old_value, self.pin_values[pin])
+
+    def read_sensor(self, pin):
+        """Return the current reading of the sensor on ``pin``.
+
+        Raises:
+            OSError: If no sensor is attached or it is missing.
+            Exception: On an injected CRC fault.
+        """
+
+        sensor = self.sensors.get(pin)
+        if sensor is None or sensor.fault == "missing":
+            raise OSError("no sensor on pin {}".format(pin))
+        if sensor.fault == "crc":
+            raise Exception("CRC error")
+        if sensor.crc_errors > 0:
+            sensor.crc_errors -= 1
+            raise Exception("CRC error")
+        if sensor.fault == "power_on":
+            return 85.0
+        if isinstance(sensor.fault, (int, float)):
+            return float(sensor.fault)
+
+        self.update()
+        sensor.reads += 1
+        value = sensor.read() + self.random.gauss(0.0, sensor.noise)
+
+        # Quantize like a DS18B20 with the configured resolution
+        step = 0.5 / (1 << (sensor.resolution - 9))
+        return round(value / step) * step
+
+    def i2c_write(self, address, data):
+        """Deliver ``data`` to the I2C device at ``address``."""
+
+        device = self.i2c_devices.get(address)
+        if device is None:
+            raise OSError(19)  # ENODEV
+        device.write(data)
+
+
+world = World()
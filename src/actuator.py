@@ -0,0 +1,264 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+from utils.log import log, INFO, WARN  # logging function
+from utils.metrics import metrics, COUNTER, GAUGE  # Metrics() instance
+from src.config import config  # Config() instance
+from src.relay import relay_open, relay_close  # Relay() instance
+
+# Command sources, a lower value has a higher priority
+SOURCE_SAFETY = 0
+SOURCE_AUTOMATIC = 1
+SOURCE_MANUAL = 2
+SOURCE_NAMES = ("safety", "automatic", "manual")
+
+# Results of a request, rejected from RESULT_BUSY on
+RESULT_ACCEPTED = 0
+RESULT_MERGED = 1
+RESULT_BUSY = 2
+RESULT_DUTY_CYCLE = 3
+RESULT_INVALID = 4
+RESULT_NAMES = ("accepted", "merged", "busy", "duty_cycle", "invalid")
+
+ACTUATOR_RESULTS = [
+    metrics.register(
+        "actuator_commands_total", COUNTER, "Relay commands per result", f'result="{name}"'
+    )
+    for name in RESULT_NAMES
+]
+ACTUATOR_PREEMPTED = metrics.register(
+    "actuator_preempted_total", COUNTER, "Pulses cut short by a command of higher priority"
+)
+ACTUATOR_HOLD = metrics.register(
+    "actuator_safety_hold", GAUGE, "Automatic and manual commands blocked by a safety stop"
+)
+
+
+class Actuator:
+    """Singleton arbiter between the sources of relay commands and the relays.
+
+    Safety, automatic and manual commands are requested with :meth:`request`,
+    which returns a result code right away and never waits for the pulse.
+    Each source has one pending command; a second command of the same source
+    for the same relay is merged into it (the longer duration wins).
+    :meth:`run` executes the pending command of the highest priority, one
+    pulse at a time, and de-energizes the other relay first, so
+    ``relay_open`` and ``relay_close`` are never on together.
+
+    A command of higher priority cuts a running pulse short and drops the
+    pending commands of lower priority, a command of lower priority is
+    rejected as busy.  Automatic and manual pulses are limited to
+    ``relay_max_duty`` percent on-time per relay: each relay has a budget of
+    ``relay_duty_window * relay_max_duty`` that refills at the duty rate,
+    commands longer than the remaining budget are rejected.
+
+    :meth:`hold` is the safety stop: it cuts a running automatic or manual
+    pulse short and rejects their commands as busy until :meth:`release`,
+    safety pulses still run.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(Actuator, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.pending = [None, None, None]
+            self.running_source = None
+            self.running_relay = None
+            self.running_end = 0
+            self.wake = asyncio.Event()
+            self.preempt = asyncio.Event()
+            self.window_ms = 600000
+            self.max_duty = 20
+            self.budgets = {}
+            self.held = None
+            self.initialized = False
+
+    async def initialize(self):
+        """Load the duty cycle limits and start with full budgets."""
+
+        if self.initialized:
+            return
+        await self.configure()
+        for relay in (relay_open, relay_close):
+            self.budgets[relay] = [self.capacity(), time.ticks_ms()]
+        config.subscribe(("relay_duty_window", "relay_max_duty"), lambda keys: self.configure())
+        self.initialized = True
+
+    async def configure(self):
+        self.window_ms = max(1, await config.get_int("relay_duty_window", 600)) * 1000
+        self.max_duty = max(0, min(100, await config.get_int("relay_max_duty", 20)))
+
+    def capacity(self):
+        return self.window_ms * self.max_duty // 100
+
+    def budget(self, relay):
+        """Return the on-time in ms left to ``relay``."""
+
+        entry = self.budgets.get(relay)
+        if entry is None:
+            entry = self.budgets[relay] = [self.capacity(), time.ticks_ms()]
+        now = time.ticks_ms()
+        # Refill at the duty rate of the elapsed time
+        refill = time.ticks_diff(now, entry[1]) * self.max_duty // 100
+        entry[0] = min(self.capacity(), entry[0] + refill)
+        entry[1] = now
+        return entry[0]
+
+    def request(self, relay, duration_ms, source=SOURCE_AUTOMATIC):
+        """Queue a pulse of ``relay`` for ``duration_ms``.
+
+        Args:
+            relay (Relay): ``relay_open`` or ``relay_close``.
+            duration_ms (int): Pulse length in milliseconds.
+            source (int): ``SOURCE_SAFETY``, ``SOURCE_AUTOMATIC`` or
+                ``SOURCE_MANUAL``.
+
+        Returns:
+            int: ``RESULT_ACCEPTED`` or ``RESULT_MERGED`` if the pulse will
+                run, otherwise the reason of the rejection.
+        """
+
+        result = self.queue(relay, duration_ms, source)
+        metrics.inc(ACTUATOR_RESULTS[result])
+        if result >= RESULT_BUSY:
+            log(
+                WARN,
+                "Actuator.request(pin={}, time={}, source={}): rejected: {}",
+                relay.pin_number,
+                duration_ms,
+                SOURCE_NAMES[source],
+                RESULT_NAMES[result],
+            )
+        else:
+            log(
+                INFO,
+                "Actuator.request(pin={}, time={}, source={}): {}",
+                relay.pin_number,
+                duration_ms,
+                SOURCE_NAMES[source],
+                RESULT_NAMES[result],
+            )
+        return result
+
+    def queue(self, relay, duration_ms, source):
+        if not relay.initialized or duration_ms <= 0:
+            return RESULT_INVALID
+
+        # A command of higher priority is running or waiting
+        if self.held is not None and source != SOURCE_SAFETY:
+            return RESULT_BUSY
+        if self.running_source is not None and self.running_source < source:
+            return RESULT_BUSY
+        for higher in range(source):
+            if self.pending[higher] is not None:
+                return RESULT_BUSY
+
+        if source != SOURCE_SAFETY and self.budget(relay) < duration_ms:
+            return RESULT_DUTY_CYCLE
+
+        # Extend the running pulse of the same source
+        if self.running_source == source and self.running_relay is relay:
+            end = time.ticks_add(time.ticks_ms(), duration_ms)
+            if time.ticks_diff(end, self.running_end) > 0:
+                self.running_end = end
+            return RESULT_MERGED
+
+        pending = self.pending[source]
+        if pending is not None and pending[0] is relay:
+            self.pending[source] = (relay, max(pending[1], duration_ms))
+            return RESULT_MERGED
+
+        self.pending[source] = (relay, duration_ms)
+        for lower in range(source + 1, len(self.pending)):
+            self.pending[lower] = None
+        if self.running_source is not None and source < self.running_source:
+            self.preempt.set()
+        self.wake.set()
+        return RESULT_ACCEPTED
+
+    async def stop(self):
+        """Drop all commands and de-energize both relays."""
+
+        self.pending = [None, None, None]
+        if self.running_source is not None:
+            self.preempt.set()
+        await relay_open.deactivate()
+        await relay_close.deactivate()
+
+    def hold(self, reason):
+        """Stop the automatic and manual commands until :meth:`release`."""
+
+        if self.held is not None:
+            return
+        self.held = reason
+        metrics.set(ACTUATOR_HOLD, 1)
+        log(WARN, "Actuator.hold({}): safety stop", reason)
+        self.pending[SOURCE_AUTOMATIC] = self.pending[SOURCE_MANUAL] = None
+        if self.running_source is not None and self.running_source != SOURCE_SAFETY:
+            self.preempt.set()
+
+    def release(self):
+        """End a safety stop of :meth:`hold`."""
+
+        if self.held is None:
+            return
+        log(INFO, "Actuator.release({})", self.held)
+        self.held = None
+        metrics.set(ACTUATOR_HOLD, 0)
+
+    async def pulse(self, relay, duration_ms, source):
+        if source != SOURCE_SAFETY:
+            # Budget may have been used up since the request
+            duration_ms = min(duration_ms, self.budget(relay))
+            if duration_ms <= 0:
+                return
+
+        # Mutual exclusion: never energize both relays
+        await (relay_close if relay is relay_open else relay_open).deactivate()
+
+        self.running_source, self.running_relay = source, relay
+        self.running_end = time.ticks_add(time.ticks_ms(), duration_ms)
+        self.preempt.clear()
+        start = time.ticks_ms()
+        await relay.activate()
+        try:
+            while True:
+                remaining = time.ticks_diff(self.running_end, time.ticks_ms())
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for_ms(self.preempt.wait(), remaining)
+                    metrics.inc(ACTUATOR_PREEMPTED)
+                    log(INFO, "Actuator.pulse(pin={}): preempted", relay.pin_number)
+                    break
+                except asyncio.TimeoutError:
+                    # The end may have been extended meanwhile
+                    pass
+        finally:
+            await relay.deactivate()
+            if source != SOURCE_SAFETY:
+                entry = self.budgets[relay]
+                self.budget(relay)
+                entry[0] = max(0, entry[0] - time.ticks_diff(time.ticks_ms(), start))
+            self.running_source = self.running_relay = None
+
+    async def run(self):
+        """Execute the pending commands by priority, runs forever."""
+
+        await self.initialize()
+        while True:
+            for source, command in enumerate(self.pending):
+                if command is not None:
+                    self.pending[source] = None
+                    await self.pulse(command[0], command[1], source)
+                    break
+            else:
+                self.wake.clear()
+                await self.wake.wait()
+
+
+actuator = Actuator()
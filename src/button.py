@@ -1,7 +1,81 @@
+import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+from array import array  # https://docs.micropython.org/en/latest/library/array.html
 from machine import Pin  # https://docs.micropython.org/en/latest/library/machine.html
-from utils.log import log  # logging function
+from utils.log import log, VERBOSE  # logging function
 from src.config import config  # Config() instance
-from src.rlock import Rlock  # re-entrant asyncio.Lock()
+
+# Button events
+EVENT_PRESS = 1
+EVENT_LONG_PRESS = 2
+EVENT_REPEAT = 3
+EVENT_RELEASE = 4
+
+# Time the level must be stable before an edge counts
+DEBOUNCE_MS = 30
+
+# Time a button is held until the long press event
+LONG_PRESS_MS = 1000
+
+# Interval of the repeat events after a long press
+REPEAT_MS = 500
+
+# Events kept until they are consumed, the oldest events are dropped
+QUEUE_SIZE = 16
+
+
+class ButtonEvents:
+    """Singleton queue of button events shared by all buttons.
+
+    Events are stored in preallocated arrays, :meth:`post` does not allocate.
+    Consumers wait in :meth:`get` on an ``asyncio.ThreadSafeFlag`` instead of
+    polling the pins.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(ButtonEvents, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.pins = array("H", [0] * QUEUE_SIZE)
+            self.events = bytearray(QUEUE_SIZE)
+            self.head = 0
+            self.count = 0
+            self.flag = asyncio.ThreadSafeFlag()
+            self.initialized = True
+
+    def post(self, pin_number, event):
+        """Queue ``event`` of the button on ``pin_number``."""
+
+        if self.count == QUEUE_SIZE:
+            self.head = (self.head + 1) % QUEUE_SIZE
+            self.count -= 1
+        tail = (self.head + self.count) % QUEUE_SIZE
+        self.pins[tail] = pin_number
+        self.events[tail] = event
+        self.count += 1
+        self.flag.set()
+
+    async def get(self):
+        """Wait for the next event.
+
+        Returns:
+            tuple: ``(pin_number, event)``
+        """
+
+        while not self.count:
+            await self.flag.wait()
+        pin_number = self.pins[self.head]
+        event = self.events[self.head]
+        self.head = (self.head + 1) % QUEUE_SIZE
+        self.count -= 1
+        return pin_number, event
+
+
+button_events = ButtonEvents()
 
 
 class Button:
@@ -11,6 +85,11 @@ class Button:
     registry so multiple parts of the program referencing the same pin share the
     same object.  The class tracks how many buttons have been created to derive a
     postfix used by the configuration system.
+
+    The pin interrupt only sets a ``ThreadSafeFlag``.  :meth:`watch` debounces
+    the edges and posts ``EVENT_PRESS``, ``EVENT_LONG_PRESS`` after
+    ``LONG_PRESS_MS``, ``EVENT_REPEAT`` every ``REPEAT_MS`` while the button is
+    held and ``EVENT_RELEASE`` to :data:`button_events`.
     """
 
     _instances = {}
@@ -23,7 +102,8 @@ class Button:
         instance.pin_number = None
         instance.pin = None
         instance.is_activated = False
-        instance.lock = Rlock()
+        instance.flag = None
+        instance.task = None
         instance.initialized = False
         return instance
 
@@ -32,7 +112,8 @@ class Button:
 
         If an instance for ``pin_number`` already exists it is reused.  The pin
         is configured as input with a pull-up resistor and the activation state
-        is read from the configuration.
+        is read from the configuration.  Activated buttons start watching the
+        pin interrupt.
 
         Args:
             pin_number (int): GPIO pin number to which the button is connected.
@@ -54,20 +135,26 @@ class Button:
             return existing_instance
 
         try:
-            async with self.lock:
-                if not self.initialized:
-                    self.pin_number = pin_number
-                    self.pin = Pin(pin_number, Pin.IN, Pin.PULL_UP)
-                    Button._instances[pin_number] = self
-                    Button.count += 1
-                    self.count = Button.count
-                    self.postfix = f"_{self.count}" if self.count > 1 else ""
-                    self.is_activated = await config.get_bool(
-                        "buttons_activated", False
+            if not self.initialized:
+                self.pin_number = pin_number
+                self.pin = Pin(pin_number, Pin.IN, Pin.PULL_UP)
+                Button._instances[pin_number] = self
+                Button.count += 1
+                self.count = Button.count
+                self.postfix = f"_{self.count}" if self.count > 1 else ""
+                self.is_activated = await config.get_bool(
+                    "buttons_activated", False
+                )
+                if self.is_activated:
+                    self.flag = asyncio.ThreadSafeFlag()
+                    self.pin.irq(
+                        handler=self.irq,
+                        trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING,
                     )
-                    log("INFO", f"Relay.initialize(pin={pin_number}): successful")
-                    self.initialized = True
-                return self
+                    self.task = asyncio.create_task(self.watch())
+                log("INFO", f"Button.initialize(pin={pin_number}): successful")
+                self.initialized = True
+            return self
 
         except (ValueError, TypeError) as e:
             log("ERROR", f"Button.initialize(): failed: {e}")
@@ -77,6 +164,48 @@ class Button:
             log("ERROR", f"Button.initialize(pin={pin_number}): failed: {e}")
             return None
 
+    def irq(self, pin):
+        # Runs in interrupt context: no allocation, no logging
+        self.flag.set()
+
+    async def wait_edge(self, timeout_ms):
+        """Return ``True`` if the pin changed within ``timeout_ms``."""
+
+        try:
+            await asyncio.wait_for_ms(self.flag.wait(), timeout_ms)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def settle(self):
+        """Wait until the level was stable for ``DEBOUNCE_MS``."""
+
+        while await self.wait_edge(DEBOUNCE_MS):
+            pass
+
+    async def watch(self):
+        """Turn the pin interrupts into button events, runs forever."""
+
+        while True:
+            await self.flag.wait()
+            await self.settle()
+            if self.pin.value():
+                # Bounce or release without a press
+                continue
+
+            log(VERBOSE, "Button.pressed(pin={})", self.pin_number)
+            button_events.post(self.pin_number, EVENT_PRESS)
+            event, timeout = EVENT_LONG_PRESS, LONG_PRESS_MS
+            while True:
+                if await self.wait_edge(timeout):
+                    await self.settle()
+                    if self.pin.value():
+                        break
+                else:
+                    button_events.post(self.pin_number, event)
+                    event, timeout = EVENT_REPEAT, REPEAT_MS
+            button_events.post(self.pin_number, EVENT_RELEASE)
+
     def is_pressed(self):
         """Check whether the button is currently pressed.
 
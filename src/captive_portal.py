@@ -0,0 +1,107 @@
+import socket  # https://docs.micropython.org/en/latest/library/socket.html
+import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+from utils.log import log, INFO  # logging function
+
+# Port of the DNS responder
+DNS_PORT = 53
+
+# Interval of the socket polls, uasyncio has no datagram streams
+POLL_MS = 100
+
+# Answer: pointer to the name in the question, type A, class IN, TTL 60 s, 4 bytes
+ANSWER = b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04"
+
+
+class CaptivePortal:
+    """Singleton DNS responder that resolves every name to the device.
+
+    While the device runs its own access point, phones and laptops check for
+    internet access by requesting well-known hosts.  Answering every query
+    with the address of the device makes them open the WiFi setup page served
+    by the webserver.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(CaptivePortal, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.ip = None
+            self.socket = None
+            self.task = None
+            self.initialized = True
+
+    def start(self, ip):
+        """Answer DNS queries with ``ip`` (e.g. ``"192.168.4.1"``)."""
+
+        if self.task:
+            return
+        try:
+            self.ip = bytes(int(part) for part in ip.split("."))
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(("0.0.0.0", DNS_PORT))
+            self.socket.setblocking(False)
+            self.task = asyncio.create_task(self.serve())
+            log(INFO, "CaptivePortal.start({})", ip)
+
+        except Exception as e:
+            log("ERROR", f"CaptivePortal.start({ip}): failed: {e}")
+            self.stop()
+
+    def stop(self):
+        """Stop answering DNS queries."""
+
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+            log(INFO, "CaptivePortal.stop()")
+
+    def response(self, request):
+        """Return the answer to the DNS ``request`` or ``None`` to ignore it."""
+
+        # Ignore truncated packets and responses
+        if len(request) < 12 or request[2] & 0x80:
+            return None
+
+        # End of the first question: name labels, zero byte, type and class
+        end = 12
+        while end < len(request) and request[end]:
+            end += request[end] + 1
+        end += 5
+        if end > len(request):
+            return None
+
+        # ID, flags (response, recursion available), 1 question, 1 answer
+        return (
+            request[:2]
+            + b"\x81\x80\x00\x01\x00\x01\x00\x00\x00\x00"
+            + request[12:end]
+            + ANSWER
+            + self.ip
+        )
+
+    async def serve(self):
+        while True:
+            try:
+                request, address = self.socket.recvfrom(512)
+            except OSError:
+                await asyncio.sleep_ms(POLL_MS)
+                continue
+
+            try:
+                response = self.response(request)
+                if response:
+                    self.socket.sendto(response, address)
+            except Exception as e:
+                log("ERROR", f"CaptivePortal.serve(): failed: {e}")
+
+
+captive_portal = CaptivePortal()
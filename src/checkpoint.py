@@ -0,0 +1,210 @@
+import struct  # https://docs.micropython.org/en/latest/library/struct.html
+import time  # https://docs.micropython.org/en/latest/library/time.html
+from binascii import crc32  # https://docs.micropython.org/en/latest/library/binascii.html
+import machine  # https://docs.micropython.org/en/latest/library/machine.html
+from utils.log import log, INFO  # logging function
+from utils.metrics import metrics, COUNTER, GAUGE  # Metrics() instance
+from src.config import config  # Config() instance
+from src.relay import Relay, relay_open, relay_close  # Relay() instance
+
+# Record: sequence, timestamp, update_time, temp_last_measurement,
+# valve_position, category, temp_increasing, followed by the CRC32
+STATE_FORMAT = "<IIIfIBB"
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+RECORD_SIZE = STATE_SIZE + 4
+
+# Encoding of temp_change_category
+CATEGORIES = ("LOW", "HIGH")
+
+CHECKPOINT_WRITES = metrics.register(
+    "checkpoint_writes_total", COUNTER, "Checkpoint records written"
+)
+VALVE_POSITION = metrics.register(
+    "valve_position_percent", GAUGE, "Valve position estimated from the relay run times"
+)
+
+
+class Checkpoint:
+    """Control loop state kept across resets in a small fixed-size file.
+
+    The file holds ``slots`` fixed-length records, each with a sequence
+    number and a CRC32.  Every :meth:`save` writes the next slot only, so the
+    writes are spread over the file instead of wearing out one flash block,
+    and a record torn by a reset leaves the previous slot intact.
+    :meth:`restore` loads the valid record with the highest sequence number.
+
+    Besides the ``update_time`` countdown of the main loop a record holds the
+    temperature category, the last measurement and the valve position.  The
+    valve position is estimated from the relay run times: ``relay_open``
+    moves it towards ``valve_travel_time``, ``relay_close`` towards zero.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        slots (int): Number of records rotated through.
+    """
+
+    def __init__(self, path="/checkpoint.bin", slots=8):
+        self.path = path
+        self.slots = slots
+        self.slot = 0
+        self.sequence = 0
+        self.opened = False
+        self.record = bytearray(RECORD_SIZE)
+        self.valve_position = 0
+        self.valve_travel_ms = 120000
+        self.activated_ms = {}
+        self.initialized = False
+
+    async def initialize(self):
+        """Load the settings and follow the relays to estimate the valve position."""
+
+        if self.initialized:
+            return
+        self.valve_travel_ms = max(1, await config.get_int("valve_travel_time", 120)) * 1000
+        Relay.on_change(self.relay_changed)
+        self.initialized = True
+
+    def relay_changed(self, relay, active):
+        if active:
+            self.activated_ms[relay] = time.ticks_ms()
+            return
+        start = self.activated_ms.pop(relay, None)
+        if start is None:
+            return
+        run_time = time.ticks_diff(time.ticks_ms(), start)
+        if relay is relay_open:
+            self.valve_position = min(self.valve_travel_ms, self.valve_position + run_time)
+        elif relay is relay_close:
+            self.valve_position = max(0, self.valve_position - run_time)
+        metrics.set(VALVE_POSITION, self.valve_position * 100 // self.valve_travel_ms)
+
+    def open(self):
+        """Find the slot written last or create a new pre-allocated file.
+
+        Returns:
+            tuple | None: Newest valid record without the CRC.
+        """
+
+        newest = None
+        try:
+            with open(self.path, "rb") as file:
+                for slot in range(self.slots):
+                    if file.readinto(self.record) != RECORD_SIZE:
+                        break
+                    checksum = struct.unpack_from("<I", self.record, STATE_SIZE)[0]
+                    if checksum != crc32(memoryview(self.record)[:STATE_SIZE]):
+                        continue
+                    state = struct.unpack_from(STATE_FORMAT, self.record)
+                    if newest is None or state[0] > newest[0]:
+                        newest = state
+                        self.slot = (slot + 1) % self.slots
+                else:
+                    if newest is not None:
+                        self.sequence = newest[0]
+                    self.opened = True
+                    return newest
+        except OSError:
+            pass
+
+        # Create (or replace a truncated) file
+        self.slot, self.sequence = 0, 0
+        for index in range(RECORD_SIZE):
+            self.record[index] = 0
+        with open(self.path, "wb") as file:
+            for _ in range(self.slots):
+                file.write(self.record)
+        self.opened = True
+        return None
+
+    async def save(self, update_time):
+        """Write the current state into the next slot.
+
+        Args:
+            update_time (int): Remaining seconds of the main loop countdown.
+
+        Returns:
+            bool: ``True`` if the record was written.
+        """
+
+        try:
+            if not self.opened:
+                self.open()
+            category = await config.get("temp_change_category", "LOW")
+            self.sequence += 1
+            struct.pack_into(
+                STATE_FORMAT,
+                self.record,
+                0,
+                self.sequence,
+                int(time.time()),
+                max(0, update_time),
+                await config.get_float("temp_last_measurement", 0.0),
+                self.valve_position,
+                CATEGORIES.index(category) if category in CATEGORIES else 0,
+                int(await config.get_bool("temp_increasing", False)),
+            )
+            struct.pack_into(
+                "<I", self.record, STATE_SIZE, crc32(memoryview(self.record)[:STATE_SIZE])
+            )
+            with open(self.path, "r+b") as file:
+                file.seek(self.slot * RECORD_SIZE)
+                file.write(self.record)
+            self.slot = (self.slot + 1) % self.slots
+            metrics.inc(CHECKPOINT_WRITES)
+            return True
+
+        except OSError as e:
+            # Ignore file system errors to avoid blocking main program
+            log("ERROR", f"Checkpoint.save(): failed: {e}")
+            return False
+
+    def recent(self, timestamp, max_age):
+        """Return ``True`` if a record written at ``timestamp`` may be resumed."""
+
+        age = time.time() - timestamp
+        if age >= 0:
+            return age <= max_age
+        # The clock restarted with the reset, which was only recent if the
+        # device was not powered off in between
+        return machine.reset_cause() != machine.PWRON_RESET
+
+    async def restore(self):
+        """Restore the state of a recent checkpoint into the configuration.
+
+        Returns:
+            int | None: Remaining ``update_time`` seconds, or ``None`` if
+                there is no checkpoint to resume from.
+        """
+
+        await self.initialize()
+        max_age = await config.get_int("checkpoint_max_age", 600)
+        try:
+            state = self.open()
+        except OSError as e:
+            log("ERROR", f"Checkpoint.restore(): failed: {e}")
+            return None
+        if state is None or max_age <= 0:
+            return None
+
+        sequence, timestamp, update_time, temp, position, category, increasing = state
+        if not self.recent(timestamp, max_age):
+            log(INFO, "Checkpoint.restore(): checkpoint {} too old", sequence)
+            return None
+
+        await config.set("temp_last_measurement", round(temp, 1))
+        await config.set("temp_change_category", CATEGORIES[min(category, 1)])
+        await config.set("temp_increasing", increasing)
+        self.valve_position = min(position, self.valve_travel_ms)
+        metrics.set(VALVE_POSITION, self.valve_position * 100 // self.valve_travel_ms)
+        log(
+            INFO,
+            "Checkpoint.restore(sequence={}, update_time={}, category={}, valve_position={})",
+            sequence,
+            update_time,
+            CATEGORIES[min(category, 1)],
+            self.valve_position,
+        )
+        return update_time
+
+
+checkpoint = Checkpoint()
@@ -1,18 +1,26 @@
 import ujson  # https://docs.micropython.org/en/latest/library/json.html
-from utils.log import log  # logging function
+from utils.log import log, INFO  # logging function
 from utils.get_bool import get_bool
 from utils.get_float import get_float
 from utils.get_int import get_int
-from src.rlock import Rlock  # re-entrant asyncio.Lock()
 
 
 class Config:
     """Singleton for accessing and modifying project configuration values.
 
     The configuration is stored as a JSON file on the device.  The class offers
-    asynchronous helpers to read and write settings while protecting concurrent
-    access with a re-entrant lock.  Basic type-conversion utilities are provided
-    for convenience.
+    asynchronous helpers to read and write settings.  Basic type-conversion
+    utilities are provided for convenience.  The JSON file is parsed lazily on
+    first access so that importing this module during boot stays cheap.
+
+    No method awaits anything, so under the cooperative ``uasyncio``
+    scheduler each call runs to completion without another task interleaving
+    and no lock is needed.  Keep it that way: a method that suspends would
+    need a lock again.
+
+    Components :meth:`subscribe` to the keys they depend on.  After the web
+    interface changed values, :meth:`notify` calls them so they re-initialize
+    in place instead of requiring a reset.
     """
 
     _instance = None
@@ -29,11 +37,18 @@ class Config:
             self.file_name = file_name
             self.file_path = self.root_path + self.file_name
             self.config = {}
-            self.lock = Rlock()
+            self.loaded = False
+            self.subscribers = []
+            self.initialized = True
+
+    def ensure_loaded(self):
+        """Load and reset the configuration on first access."""
+
+        if not self.loaded:
+            self.loaded = True
             self.load()
             self.reset()
             log("INFO", f"Config({self.file_path}): initialized")
-            self.initialized = True
 
     def load(self):
         """Load the configuration from the JSON file into memory.
@@ -60,42 +75,70 @@ class Config:
         self.config["temp_last_measurement_time"] = 0
         self.config["temp_change_category"] = "LOW"
 
-    async def save(self):
-        """Persist the current configuration to disk."""
-        async with self.lock:
+    def subscribe(self, keys, callback):
+        """Call ``callback(changed_keys)`` when one of ``keys`` was changed.
+
+        Coroutine functions are awaited.
+
+        Args:
+            keys (tuple): Configuration keys the caller depends on.
+            callback: Called with the list of changed keys among ``keys``.
+        """
+
+        self.subscribers.append((keys, callback))
+
+    async def notify(self, keys):
+        """Call the subscribers of the changed ``keys``, each at most once."""
+
+        for subscribed, callback in self.subscribers:
+            changed = [key for key in keys if key in subscribed]
+            if not changed:
+                continue
             try:
-                log("INFO", f"Config.save(): {self.file_path}")
-                with open(self.file_path, "w", encoding="utf-8") as file:
-                    ujson.dump(self.config, file)
+                log(INFO, "Config.notify({})", changed)
+                result = callback(changed)
+                # Coroutine functions return a coroutine (a generator on MicroPython)
+                if result is not None and hasattr(result, "send"):
+                    await result
             except Exception as e:
-                log(
-                    "ERROR",
-                    f"Config.save({self.file_path}): {e}",
-                )
+                log("ERROR", f"Config.notify({changed}): failed: {e}")
+
+    async def save(self):
+        """Persist the current configuration to disk."""
+        self.ensure_loaded()
+        try:
+            log("INFO", f"Config.save(): {self.file_path}")
+            with open(self.file_path, "w", encoding="utf-8") as file:
+                ujson.dump(self.config, file)
+        except Exception as e:
+            log(
+                "ERROR",
+                f"Config.save({self.file_path}): {e}",
+            )
 
     async def get_config(self):
         """Return a copy of the entire configuration dictionary."""
-        async with self.lock:
-            try:
-                log("INFO", f"Config.get_config()")
-                return self.config
-            except Exception as e:
-                log("ERROR", f"Config.get_config(): {e}")
+        self.ensure_loaded()
+        try:
+            log(INFO, "Config.get_config()")
+            return self.config
+        except Exception as e:
+            log("ERROR", f"Config.get_config(): {e}")
 
     async def get(self, key, default=None):
         """Retrieve the raw value for ``key`` from the configuration."""
-        async with self.lock:
-            return self.config.get(key, default)
+        self.ensure_loaded()
+        return self.config.get(key, default)
 
     async def get_bool(self, key, default=False):
         """Return the configuration value for ``key`` as a boolean."""
-        async with self.lock:
-            return get_bool(self.config.get(key), "Config", "get_bool")
+        self.ensure_loaded()
+        return get_bool(self.config.get(key), "Config", "get_bool")
 
     async def get_int(self, key, default=0):
         """Return the configuration value for ``key`` as an integer."""
-        async with self.lock:
-            return get_int(self.config.get(key), default, "Config", "get_int")
+        self.ensure_loaded()
+        return get_int(self.config.get(key), default, "Config", "get_int")
 
     async def get_float(self, key, default=0.0, decimal=None):
         """Return the configuration value for ``key`` as a float.
@@ -108,18 +151,18 @@ class Config:
         Returns:
             float: Parsed float or ``default``.
         """
-        async with self.lock:
-            return get_float(
-                self.config.get(key), default, decimal, "Config", "get_float"
-            )
+        self.ensure_loaded()
+        return get_float(
+            self.config.get(key), default, decimal, "Config", "get_float"
+        )
 
     async def set(self, key, value):
         """Store ``value`` under ``key`` in the configuration dictionary."""
-        async with self.lock:
-            try:
-                self.config[str(key)] = value
-            except Exception as e:
-                log("ERROR", f"Config.set(): failed: {e}")
+        self.ensure_loaded()
+        try:
+            self.config[str(key)] = value
+        except Exception as e:
+            log("ERROR", f"Config.set(): failed: {e}")
 
 
 config = Config()
@@ -0,0 +1,131 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+from array import array  # https://docs.micropython.org/en/latest/library/array.html
+from utils.log import log  # logging function
+from src.config import config  # Config() instance
+from src.validator import median3  # median of three values
+
+# Filter stages, applied in the order given by temp_filter
+STAGE_MEDIAN = 0
+STAGE_EMA = 1
+STAGE_KALMAN = 2
+STAGE_NAMES = ("median", "ema", "kalman")
+
+# Variance of the DS18B20 noise on top of the quantization in °C²
+SENSOR_VARIANCE = 0.0025
+
+# Configuration keys of the filter
+FILTER_KEYS = ("temp_filter", "temp_ema_alpha", "temp_kalman_q")
+
+# Indexes into TempFilter.state
+EMA = 0
+ESTIMATE = 1
+VARIANCE = 2
+
+
+def quantization_variance(resolution):
+    """Return the variance of the rounding to the step of ``resolution`` bits."""
+
+    step = 0.5 / (1 << (resolution - 9))
+    return step * step / 12
+
+
+class TempFilter:
+    """Filter pipeline between the accepted samples and ``current_temp``.
+
+    ``temp_filter`` lists the stages, e.g. ``"median,ema"`` or
+    ``"median,kalman"``, an empty value passes the samples through:
+
+    - ``median``: median of the last three samples, removes single outliers
+      the validator let pass.
+    - ``ema``: exponential moving average with the weight ``temp_ema_alpha``
+      of the new sample.
+    - ``kalman``: scalar Kalman filter of a random walk with the process
+      noise ``temp_kalman_q`` in °C² per second.  The measurement noise is
+      derived from the conversion resolution of each sample, so a 9 bit
+      sample counts less than a 12 bit sample and the filter follows a
+      change of the resolution.
+
+    The state is kept in two arrays of three floats, an update does not
+    allocate besides the returned float.
+    """
+
+    def __init__(self):
+        self.stages = (STAGE_MEDIAN, STAGE_EMA)
+        self.window = array("f", (0.0, 0.0, 0.0))
+        self.state = array("f", (0.0, 0.0, 0.0))
+        self.count = 0
+        self.index = 0
+        self.last_ms = 0
+        self.output = None
+        self.alpha = 0.5
+        self.process_noise = 0.01
+
+    async def configure(self):
+        """Load the stages and their parameters and start over."""
+
+        stages = []
+        for name in (await config.get("temp_filter", "median,ema") or "").split(","):
+            name = name.strip()
+            if name in STAGE_NAMES:
+                stages.append(STAGE_NAMES.index(name))
+            elif name:
+                log("ERROR", f"TempFilter.configure(): unknown stage {name}")
+        self.stages = tuple(stages)
+        self.alpha = max(0.01, min(1.0, await config.get_float("temp_ema_alpha", 0.5)))
+        self.process_noise = max(0.0, await config.get_float("temp_kalman_q", 0.01))
+        self.reset()
+
+    def reset(self):
+        """Forget the history, the next sample starts every stage."""
+
+        self.count = self.index = 0
+        self.output = None
+
+    def update(self, value, now_ms, resolution=12):
+        """Filter the accepted sample ``value`` read at ``now_ms``.
+
+        Args:
+            value (float): Sample in °C.
+            now_ms (int): ``time.ticks_ms()`` of the reading.
+            resolution (int): Conversion resolution of the sample in bits.
+
+        Returns:
+            float: Filtered temperature in °C.
+        """
+
+        first = self.count == 0
+        self.count = min(3, self.count + 1)
+        state = self.state
+        for stage in self.stages:
+            if stage == STAGE_MEDIAN:
+                window = self.window
+                window[self.index] = value
+                self.index = (self.index + 1) % 3
+                if self.count == 3:
+                    value = median3(window[0], window[1], window[2])
+
+            elif stage == STAGE_EMA:
+                if first:
+                    state[EMA] = value
+                else:
+                    state[EMA] += self.alpha * (value - state[EMA])
+                value = state[EMA]
+
+            else:
+                measurement_variance = quantization_variance(resolution) + SENSOR_VARIANCE
+                if first:
+                    state[ESTIMATE] = value
+                    state[VARIANCE] = measurement_variance
+                else:
+                    # Predict: the temperature may have drifted since the last sample
+                    seconds = time.ticks_diff(now_ms, self.last_ms) / 1000
+                    state[VARIANCE] += self.process_noise * seconds
+                    # Correct
+                    gain = state[VARIANCE] / (state[VARIANCE] + measurement_variance)
+                    state[ESTIMATE] += gain * (value - state[ESTIMATE])
+                    state[VARIANCE] *= 1 - gain
+                value = state[ESTIMATE]
+
+        self.last_ms = now_ms
+        self.output = value
+        return value
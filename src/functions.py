@@ -1,14 +1,36 @@
 import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
 import time  # https://docs.micropython.org/en/latest/library/time.html
-from utils.log import log  # logging function
+from utils.log import log, enabled, INFO, VERBOSE  # logging function
+from utils.supervisor import supervisor  # Supervisor() instance
 from src.config import config  # Config() instance
-from src.lcd import lcd  # LCD() instance
+from src.lcd import lcd, encode_into, CHARACTER_CODES, MAX_COLS, SPACE  # LCD() instance
 from src.relay import relay_open, relay_close  # Relay() instance
+from src.actuator import actuator, SOURCE_SAFETY, SOURCE_AUTOMATIC  # Actuator() instance
 from src.temp import temp_sensor, temp_sensor_2  # TemperatureSensor() instance
 
 # List of available temperature sensors
 SENSORS = [temp_sensor, temp_sensor_2]
 
+# Heartbeat of the control loop, beaten by wait_start() and the main loop
+CONTROL_TASK = supervisor.register("control", 60000)
+
+# Preallocated LCD fields of the display updates done on every tick,
+# filled in place with HD44780A00 character codes
+TEMP_FIELD = bytearray(MAX_COLS // 2)
+TIMER_LINE = bytearray(MAX_COLS)
+timer_message = None
+timer_message_end = 0
+
+# Character codes used by the in place formatting
+DIGIT_0 = ord("0")
+DOT = ord(".")
+MINUS = ord("-")
+DEGREE = CHARACTER_CODES["°"]
+UNIT_C = ord("C")
+UNIT_H = ord("h")
+UNIT_M = ord("m")
+UNIT_S = ord("s")
+
 
 # ==================================================
 # Functions
@@ -117,20 +139,34 @@ async def adjust_update_time_based_on_temp_category():
     return update_time
 
 
-# Convert utf-8 characters to HD44780 characters
-# Get dual number from the HD44780 table: https://de.wikipedia.org/wiki/HD44780#Schrift_und_Zeichensatz
-# Convert dual number to octal number: https://www.arndt-bruenner.de/mathe/scripts/Zahlensysteme.htm
-def convert_utf8(string=""):
-    replacements = {
-        "ß": "\u00DF",  # Unicode for ß
-        "°": "\u00B0",  # Unicode for °
-        "ä": "\u00E4",  # Unicode for ä
-        "ö": "\u00F6",  # Unicode for ö
-        "ü": "\u00FC",  # Unicode for ü
-    }
-    for original, replacement in replacements.items():
-        string = string.replace(original, replacement)
-    return string
+# Write the digits of value right aligned into buffer, ending before end
+def write_number(buffer, end, value, min_digits=1):
+    digits = 0
+    while (value or digits < min_digits) and end > 0:
+        end -= 1
+        buffer[end] = DIGIT_0 + value % 10
+        value //= 10
+        digits += 1
+    return end
+
+
+# Format temp right aligned as "-127.0 °C" into the first width bytes of TEMP_FIELD
+def format_temp(temp, width):
+    tenths = int(temp * 10 + (0.5 if temp >= 0 else -0.5))
+    field = TEMP_FIELD
+    field[width - 1] = UNIT_C
+    field[width - 2] = DEGREE
+    field[width - 3] = SPACE
+    end = write_number(field, width - 3, abs(tenths) % 10)
+    end -= 1
+    field[end] = DOT
+    end = write_number(field, end, abs(tenths) // 10)
+    if tenths < 0 and end > 0:
+        end -= 1
+        field[end] = MINUS
+    for index in range(end):
+        field[index] = SPACE
+    return field
 
 
 # Update current temp on lcd
@@ -139,23 +175,33 @@ async def update_temp(sensor_number=1):
     current_temp = await SENSORS[sensor_number - 1].get_temp()
 
     if current_temp is not None:
-        # Set LCD columns once
-        lcd_cols_half = int(lcd.cols / 2)
-
-        # Format the temperature string
-        current_temp_string = lcd.rjust(f"{current_temp:.1f} °C", lcd_cols_half)
-        current_temp_string_utf8 = convert_utf8(current_temp_string)
-
-        log("INFO", f"Functions.update_temp({sensor_number}): {current_temp:.1f} °C")
+        if enabled(INFO):
+            log(INFO, "Functions.update_temp({}): {:.1f} °C", sensor_number, current_temp)
 
         # Print temp on LCD
         # ....................
         # temp 2     temp 1
         # -127.0 °C  -127.0 °C
-        temp_pos = max(lcd.cols - len(current_temp_string), 0)
-        if sensor_number > 1:
-            temp_pos = max(lcd_cols_half - len(current_temp_string), 0)
-        await lcd.print(0, temp_pos, current_temp_string_utf8, False)
+        width = lcd.cols // 2
+        cursor = lcd.cols - width if sensor_number == 1 else 0
+        await lcd.write(0, cursor, format_temp(current_temp, width), width)
+
+        if sensor_number == 1:
+            await check_safety(current_temp)
+
+
+# Safety reactions on the outlet temperature, they take priority over all other commands
+async def check_safety(current_temp):
+    if current_temp == -127.0:
+        # Sensor fault, the valve must not be moved blindly
+        actuator.hold("sensor fault")
+        return
+    actuator.release()
+
+    # Over-temperature, let in cold water regardless of the duty cycle
+    if current_temp > await config.get_float("temp_safety_max", 65.0):
+        relay_time = await config.get_int("relay_time", 1200)
+        actuator.request(relay_open, relay_time, SOURCE_SAFETY)
 
 
 # Print nominal temp
@@ -179,7 +225,7 @@ async def print_nominal_temp():
     await lcd.print(1, temp_pos, nominal_temp)
 
 
-# Open relays depending on temp
+# Open relays depending on temp, the pulse runs in the background
 async def open_relays(relay_time):
 
     # Load config
@@ -196,12 +242,12 @@ async def open_relays(relay_time):
         if current_temp < nominal_min_temp:
             # Increase temp
             await lcd.print(3, 0, "schließe Ventil  >>>")
-            await relay_close.toggle(relay_time)
+            actuator.request(relay_close, relay_time, SOURCE_AUTOMATIC)
 
         elif current_temp > nominal_max_temp:
             # Decrease temp
             await lcd.print(3, 0, "öffne Ventil     >>>")
-            await relay_open.toggle(relay_time)
+            actuator.request(relay_open, relay_time, SOURCE_AUTOMATIC)
 
         else:
             # Do nothing
@@ -213,96 +259,96 @@ async def open_relays(relay_time):
         await asyncio.sleep(2)
 
 
-# Update temp display
+# Update temp display, the symbols are right aligned
 async def update_temp_display(rate, message, symbol):
     if rate >= 3:
-        await lcd.print(2, 0, f"{message}   {symbol * 3}")
+        count = 3
     elif rate >= 0.5:
-        await lcd.print(2, 0, f"{message}    {symbol * 2}")
+        count = 2
     else:
-        await lcd.print(2, 0, f"{message}     {symbol}")
-
-    await asyncio.sleep(2)
-    await lcd.print(2, 0, f"                    ")
-
-
-# # Update nominal temp
-# async def update_nominal_temp(button_pin):
-#     button_long = 0
-#     rate = 0.1
-#
-#     # Load config
-#     temp_up_pin = await config.get_int("BUTTON_TEMP_UP_PIN", 1)
-#     temp_down_pin = await config.get_int("BUTTON_TEMP_DOWN_PIN", 2)
-#     nominal_min_temp = await config.get_float("nominal_min_temp", 42.0)
-#     nominal_max_temp = await config.get_float("nominal_max_temp", 58.0)
-#
-#     # While button is pressed
-#     while check_button(button_pin):
-#         # Increase temp on temp up button
-#         if button_pin == temp_up_pin:
-#             nominal_min_temp += rate
-#             nominal_max_temp += rate
-#             await update_temp_display(rate, "TempUp Pressed", "+")
-#
-#         # Decrease temp on temp down button
-#         elif button_pin == temp_down_pin:
-#             nominal_min_temp -= rate
-#             nominal_max_temp -= rate
-#             await update_temp_display(rate, "TempDown Pressed", "-")
-#
-#         # Update config values and print nominal temp
-#         await config.set("nominal_min_temp", nominal_min_temp)
-#         await config.set("nominal_max_temp", nominal_max_temp)
-#         await print_nominal_temp()
-#
-#         # Adjust rate and sleep
-#         await asyncio.sleep(0.5)
-#         button_long += 1
-#         if button_long == 5:
-#             rate = 1
-#         elif button_long == 10:
-#             rate = 1  # Adjust rate as needed
-#
-#     # Save config
-#     await config.save()
-
-
-# Check buttons
-# async def check_buttons():
-#     # Check if buttons_activated = 1
-#     if await config.get_bool("buttons_activated", False):
-#         # Update nomianl temp
-#         await update_nominal_temp(await config.get_int("BUTTON_TEMP_UP_PIN", 1))
-#         await update_nominal_temp(await config.get_int("BUTTON_TEMP_DOWN_PIN", 2))
-
-
-# Format time
-def format_time(secs):
+        count = 1
+    padding = " " * max(1, lcd.cols - len(message) - count)
+    await lcd.print(2, 0, f"{message}{padding}{symbol * count}")
+
+
+# Adjust the nominal temps on button events, runs forever
+async def handle_buttons(temp_up_pin, temp_down_pin):
+    # Imported lazily, only started with buttons_activated
+    from src.button import button_events, EVENT_PRESS, EVENT_RELEASE  # ButtonEvents() instance
+
+    while True:
+        pin_number, event = await button_events.get()
+
+        # Save once the button is released
+        if event == EVENT_RELEASE:
+            await lcd.print(2, 0, " ")
+            await config.save()
+            continue
+
+        if pin_number == temp_up_pin:
+            sign, message, symbol = 1, "TempUp Pressed", "+"
+        elif pin_number == temp_down_pin:
+            sign, message, symbol = -1, "TempDown Pressed", "-"
+        else:
+            continue
+
+        # Fine steps on a short press, coarse steps while held
+        rate = 0.1 if event == EVENT_PRESS else 1.0
+        nominal_min_temp = await config.get_float("nominal_min_temp", 42.0)
+        nominal_max_temp = await config.get_float("nominal_max_temp", 58.0)
+        nominal_min_temp = max(0.0, min(120.0, nominal_min_temp + sign * rate))
+        nominal_max_temp = max(0.0, min(120.0, nominal_max_temp + sign * rate))
+
+        # Update config values and print nominal temp
+        await config.set("nominal_min_temp", round(nominal_min_temp, 1))
+        await config.set("nominal_max_temp", round(nominal_max_temp, 1))
+        await print_nominal_temp()
+        await update_temp_display(rate, message, symbol)
+
+
+# Format "<message>   [HHh ]MMm SSs" into TIMER_LINE, the message is only encoded when it changes
+def format_timer(secs, message):
+    global timer_message, timer_message_end
+
+    line = TIMER_LINE
+    cols = lcd.cols
+    if message is not timer_message:
+        timer_message_end = encode_into(line, 0, cols, message)
+        timer_message = message
+
     hours = secs // 3600
     mins = (secs % 3600) // 60
     secs = secs % 60
+    line[cols - 1] = UNIT_S
+    end = write_number(line, cols - 1, secs, 2)
+    line[end - 1] = SPACE
+    line[end - 2] = UNIT_M
+    end = write_number(line, end - 2, mins, 2)
     if hours > 0:
-        return f"{hours:02d}h {mins:02d}m {secs:02d}s"
-    else:
-        return f"{mins:02d}m {secs:02d}s"
+        line[end - 1] = SPACE
+        line[end - 2] = UNIT_H
+        end = write_number(line, end - 2, hours, 2)
+
+    # Clear between message and time, encode the message again if the time overwrote it
+    for index in range(timer_message_end, end):
+        line[index] = SPACE
+    if end < timer_message_end:
+        timer_message = None
+    return line
 
 
 # Update timer
 async def update_timer(secs, message="Regle in:"):
     stop_timer = await config.get_int("stop_timer", 0)
     if stop_timer >= 0:
-        log("VERBOSE", f"Functions.stop_timer({stop_timer})")
+        if enabled(VERBOSE):
+            log(VERBOSE, "Functions.stop_timer({})", stop_timer)
         await config.set("stop_timer", (stop_timer - 1))
     else:
-        log("VERBOSE", f"Functions.update_timer({secs})")
+        if enabled(VERBOSE):
+            log(VERBOSE, "Functions.update_timer({})", secs)
         await config.set("timer", secs)
-
-        time = format_time(secs)
-        cursor = lcd.cols - len(time)
-
-        await lcd.print(3, 0, message)
-        await lcd.print(3, cursor, time)
+        await lcd.write(3, 0, format_timer(secs, message), lcd.cols)
 
 
 # Wait start
@@ -315,6 +361,7 @@ async def wait_start(secs=0, lcd_text="Starte in:"):
     temp_update_interval = await config.get_int("temp_update_interval", 5)
 
     while secs > 0:
+        supervisor.beat(CONTROL_TASK)
         current_millis = time.ticks_ms()
         if time.ticks_diff(current_millis, previous_millis) > interval:
             # Update timer
@@ -325,9 +372,6 @@ async def wait_start(secs=0, lcd_text="Starte in:"):
                 await update_temp()
                 await update_temp(2)
 
-            # # Check buttons
-            # await check_buttons()
-
             # Decrease secs
             secs -= 1
             previous_millis = current_millis
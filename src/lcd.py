@@ -4,13 +4,65 @@ from machine import (
 )  # https://docs.micropython.org/en/latest/library/machine.html
 from utils.log import log  # logging function
 from utils.get_bool import get_bool  # Convert value to bool
+from utils.metrics import metrics, COUNTER  # Metrics() instance
 from src.config import config  # Config() instance
 from src.machine_i2c_lcd import I2cLcd  # I2C LCD
-from src.rlock import Rlock  # re-entrant asyncio.Lock()
+
+LCD_I2C_BYTES = metrics.register(
+    "lcd_i2c_bytes_total", COUNTER, "Bytes sent to the LCD over I2C"
+)
+
+# Largest supported display
+MAX_COLS = 20
+MAX_ROWS = 4
+
+# HD44780A00 character codes of the characters outside of ASCII
+# Get dual number from the HD44780A00 table: https://de.wikipedia.org/wiki/HD44780#Schrift_und_Zeichensatz
+CHARACTER_CODES = {
+    "ß": 0xE2,
+    "°": 0xDF,
+    "ä": 0xE1,
+    "ö": 0xEF,
+    "ü": 0xF5,
+    "↑": 0,  # custom character 0
+    "↓": 1,  # custom character 1
+}
+CHARACTERS = {code: char for char, code in CHARACTER_CODES.items()}
+SPACE = 0x20
+
+
+def encode_into(buffer, start, end, string):
+    """Write ``string`` as HD44780A00 codes into ``buffer`` from ``start``.
+
+    Characters at or beyond ``end`` are dropped.
+
+    Returns:
+        int: Index after the last written character.
+    """
+
+    for char in string:
+        if start >= end:
+            break
+        code = CHARACTER_CODES.get(char)
+        buffer[start] = code if code is not None else ord(char) & 0xFF
+        start += 1
+    return start
 
 
 class LCD:
-    """Singleton manager for the character LCD display."""
+    """Singleton manager for the character LCD display.
+
+    The content of the display is kept in one preallocated ``bytearray`` per
+    line holding HD44780A00 character codes.  :meth:`write` copies already
+    encoded bytes into a line and sends them without building any strings, so
+    it is used by the display updates of every tick.  :meth:`print` encodes a
+    string first.  Lines written before :meth:`initialize` are shown once the
+    display is ready.
+
+    No method suspends between updating the line buffers and writing to the
+    I2C bus, so every call is a single uninterrupted writer under the
+    cooperative ``uasyncio`` scheduler and no lock is taken.
+    """
 
     _instance = None
 
@@ -23,16 +75,23 @@ class LCD:
         if not hasattr(self, "initialized"):
             self.i2c = None
             self.lcd = None
-            self.lines = []
-            self.cols = 20
-            self.rows = 4
+            self.cols = MAX_COLS
+            self.rows = MAX_ROWS
+            self.lines = [bytearray(b" " * MAX_COLS) for _ in range(MAX_ROWS)]
+            # Decoded lines for get_line(), reset on every change
+            self.decoded = [None] * MAX_ROWS
             self.freq = 100000
             self.addr = int("0x27", 16)
             self.sda_pin = 20
             self.scl_pin = 21
-            self.lock = Rlock()
             self.initialized = False
 
+    def collect_metrics(self):
+        """Copy the I2C byte count of the driver into the metrics registry."""
+
+        if self.lcd:
+            metrics.set(LCD_I2C_BYTES, self.lcd.bytes_written)
+
     async def initialize(self):
         """Initialize hardware interfaces and prepare the LCD for use.
 
@@ -44,73 +103,69 @@ class LCD:
         if self.initialized:
             return
         try:
-            async with self.lock:
-
-                # Setup LCD
-                self.sda_pin = await config.get_int("LCD_PIN_SDA", 20)
-                self.scl_pin = await config.get_int("LCD_PIN_SCL", 21)
-                self.freq = await config.get_int("LCD_FREQ", 100000)
-                addr = await config.get("LCD_ADDR", "0x27")
-                self.addr = int(str(addr), 16)
-                self.cols = await config.get_int("LCD_COLS", 20)
-                if self.cols > 20:
-                    self.cols = 20
-                self.rows = await config.get_int("LCD_ROWS", 4)
-                if self.rows > 4:
-                    self.rows = 4
-
-                # Empty lines list
-                self.lines = [" " * self.cols for _ in range(self.rows)]
-
-                # Setup I2C
-                sda_pin = Pin(self.sda_pin)
-                scl_pin = Pin(self.scl_pin)
-                self.i2c = I2C(0, sda=sda_pin, scl=scl_pin, freq=self.freq)
-
-                # Initialize LCD
-                self.lcd = I2cLcd(self.i2c, self.addr, self.rows, self.cols)
-
-                # Add custom characters
-                arrow_up = [
-                    0b00100,
-                    0b01110,
-                    0b11111,
-                    0b00100,
-                    0b00100,
-                    0b00100,
-                    0b00100,
-                    0b00100,
-                ]
-                arrow_down = [
-                    0b00100,
-                    0b00100,
-                    0b00100,
-                    0b00100,
-                    0b00100,
-                    0b11111,
-                    0b01110,
-                    0b00100,
-                ]
-                self.lcd.custom_char(0, bytearray(arrow_up))
-                self.lcd.custom_char(1, bytearray(arrow_down))
-
-                # Configure LCD backlight
-                lcd_i2c_backlight = await config.get_bool("lcd_i2c_backlight", True)
-                await self.set_backlight(lcd_i2c_backlight)
-
-                # Hide LCD cursor
-                await self.set_cursor(False)
-
-                # Disable LCD blink cursor
-                await self.blink_cursor(False)
-
-                # Clear LCD
-                await self.clear()
-
-                log("INFO", "LCD.initialize(): successful")
-                self.initialized = True
-
-                return self
+
+            # Setup LCD
+            self.sda_pin = await config.get_int("LCD_PIN_SDA", 20)
+            self.scl_pin = await config.get_int("LCD_PIN_SCL", 21)
+            self.freq = await config.get_int("LCD_FREQ", 100000)
+            addr = await config.get("LCD_ADDR", "0x27")
+            self.addr = int(str(addr), 16)
+            self.cols = min(await config.get_int("LCD_COLS", 20), MAX_COLS)
+            self.rows = min(await config.get_int("LCD_ROWS", 4), MAX_ROWS)
+            self.decoded = [None] * MAX_ROWS
+
+            # Setup I2C
+            sda_pin = Pin(self.sda_pin)
+            scl_pin = Pin(self.scl_pin)
+            self.i2c = I2C(0, sda=sda_pin, scl=scl_pin, freq=self.freq)
+
+            # Initialize LCD
+            self.lcd = I2cLcd(self.i2c, self.addr, self.rows, self.cols)
+
+            # Add custom characters
+            arrow_up = [
+                0b00100,
+                0b01110,
+                0b11111,
+                0b00100,
+                0b00100,
+                0b00100,
+                0b00100,
+                0b00100,
+            ]
+            arrow_down = [
+                0b00100,
+                0b00100,
+                0b00100,
+                0b00100,
+                0b00100,
+                0b11111,
+                0b01110,
+                0b00100,
+            ]
+            self.lcd.custom_char(0, bytearray(arrow_up))
+            self.lcd.custom_char(1, bytearray(arrow_down))
+
+            # Configure LCD backlight
+            lcd_i2c_backlight = await config.get_bool("lcd_i2c_backlight", True)
+            await self.set_backlight(lcd_i2c_backlight)
+
+            # Hide LCD cursor
+            await self.set_cursor(False)
+
+            # Disable LCD blink cursor
+            await self.blink_cursor(False)
+
+            # Clear LCD
+            await self.clear()
+
+            log("INFO", "LCD.initialize(): successful")
+            self.initialized = True
+
+            # Show lines printed before initialization
+            await self.redraw()
+
+            return self
 
         except (ValueError, TypeError) as e:
             log("ERROR", f"LCD.initialize(): failed: {e}")
@@ -123,6 +178,16 @@ class LCD:
             )
             return None
 
+    async def reconfigure(self):
+        """Rebuild the I2C bus and the driver from the current configuration.
+
+        The cached lines are kept and shown again on the new display.
+        """
+
+        log("INFO", "LCD.reconfigure()")
+        self.initialized = False
+        return await self.initialize()
+
     async def set_backlight(self, value=True):
         """Enable or disable the LCD backlight.
 
@@ -130,56 +195,64 @@ class LCD:
             value (bool): ``True`` to switch the backlight on.
         """
 
-        async with self.lock:
-            try:
-                if get_bool(value, "set_backlight"):
-                    self.lcd.backlight_on()
-                else:
-                    self.lcd.backlight_off()
-                log("INFO", f"LCD.set_backlight({value})")
+        try:
+            if get_bool(value, "set_backlight"):
+                self.lcd.backlight_on()
+            else:
+                self.lcd.backlight_off()
+            log("INFO", f"LCD.set_backlight({value})")
 
-            except Exception as e:
-                log("ERROR", f"LCD.set_backlight({value}): failed: {e}")
+        except Exception as e:
+            log("ERROR", f"LCD.set_backlight({value}): failed: {e}")
 
     async def set_cursor(self, value=True):
         """Show or hide the cursor on the LCD."""
 
-        async with self.lock:
-            try:
-                if get_bool(value):
-                    self.lcd.show_cursor()
-                else:
-                    self.lcd.hide_cursor()
-                log("INFO", f"LCD.set_cursor({value})")
+        try:
+            if get_bool(value):
+                self.lcd.show_cursor()
+            else:
+                self.lcd.hide_cursor()
+            log("INFO", f"LCD.set_cursor({value})")
 
-            except Exception as e:
-                log("ERROR", f"LCD.set_cursor({value}): failed: {e}")
+        except Exception as e:
+            log("ERROR", f"LCD.set_cursor({value}): failed: {e}")
 
     async def blink_cursor(self, value=True):
         """Enable or disable the blinking cursor."""
 
-        async with self.lock:
-            try:
-                if get_bool(value):
-                    self.lcd.blink_cursor_on()
-                else:
-                    self.lcd.blink_cursor_off()
-                log("INFO", f"LCD.blink_cursor({value})")
+        try:
+            if get_bool(value):
+                self.lcd.blink_cursor_on()
+            else:
+                self.lcd.blink_cursor_off()
+            log("INFO", f"LCD.blink_cursor({value})")
 
-            except Exception as e:
-                log("ERROR", f"LCD.blink_cursor({value}): failed: {e}")
+        except Exception as e:
+            log("ERROR", f"LCD.blink_cursor({value}): failed: {e}")
 
     async def clear(self):
         """Clear the LCD screen."""
 
-        async with self.lock:
-            try:
-                if self.initialized:
-                    self.lcd.clear()
-                    log("INFO", f"LCD.clear()")
+        try:
+            if self.initialized:
+                self.lcd.clear()
+                log("INFO", f"LCD.clear()")
+
+        except Exception as e:
+            log("ERROR", f"LCD.clear(): failed: {e}")
+
+    async def redraw(self):
+        """Write all cached lines to the display."""
 
-            except Exception as e:
-                log("ERROR", f"LCD.clear(): failed: {e}")
+        try:
+            if self.initialized:
+                for row in range(self.rows):
+                    self.send(row, 0, self.cols)
+                log("VERBOSE", "LCD.redraw()")
+
+        except Exception as e:
+            log("ERROR", f"LCD.redraw(): failed: {e}")
 
     # Check if line is out of range
     def check_line(self, line, function="set_line"):
@@ -201,22 +274,37 @@ class LCD:
             column = self.cols - 1
         return column
 
-    # Convert utf-8 characters to HD44780A00 characters
-    # Get dual number from the HD44780A00 table: https://de.wikipedia.org/wiki/HD44780#Schrift_und_Zeichensatz
-    # Convert dual number to octal number: https://www.arndt-bruenner.de/mathe/scripts/Zahlensysteme.htm
-    def convert_HD44780A00(self, string=""):
-        """Convert UTF-8 characters to the HD44780A00 character set."""
-
-        replacements = {
-            "ß": "\342",  # HD44780A00 for ß
-            "°": "\337",  # HD44780A00 for °
-            "ä": "\341",  # HD44780A00 for ä
-            "ö": "\357",  # HD44780A00 for ö
-            "ü": "\365",  # HD44780A00 for ü
-        }
-        for original, replacement in replacements.items():
-            string = string.replace(original, replacement)
-        return string
+    def encode(self, line, cursor, string):
+        """Write ``string`` as HD44780A00 codes into the cached ``line`` at ``cursor``.
+
+        Returns:
+            int: Column after the last written character.
+        """
+
+        self.decoded[line] = None
+        return encode_into(self.lines[line], cursor, self.cols, string)
+
+    def decode(self, line):
+        """Return the cached ``line`` as string, custom characters as arrows."""
+
+        if self.decoded[line] is None:
+            self.decoded[line] = "".join(
+                CHARACTERS.get(code) or (chr(code) if code >= SPACE else "-")
+                for code in self.lines[line][: self.cols]
+            )
+        return self.decoded[line]
+
+    def send(self, line, start, end):
+        """Send the cached columns ``start`` to ``end`` of ``line`` to the display.
+
+        The display advances its address after each character, so the cursor
+        is only positioned once.
+        """
+
+        self.lcd.move_to(start, line)  # self.lcd.move_to(col, row)
+        row = self.lines[line]
+        for column in range(start, end):
+            self.lcd.hal_write_data(row[column])
 
     def ljust(self, string="", width=0, fillchar=" "):
         """Pad ``string`` on the right with ``fillchar`` up to ``width`` characters."""
@@ -240,57 +328,77 @@ class LCD:
     async def get_line(self, line=0):
         """Return the cached contents of a single LCD line."""
 
-        async with self.lock:
-            try:
-                return self.lines[self.check_line(line, "get_line")]
+        try:
+            return self.decode(self.check_line(line, "get_line"))
 
-            except (ValueError, TypeError) as e:
-                log("ERROR", f"LCD.get_line(): {e}")
-                return ""
-            except Exception as e:
-                log("ERROR", f"LCD.get_line({line}): {e}")
-                return ""
+        except (ValueError, TypeError) as e:
+            log("ERROR", f"LCD.get_line(): {e}")
+            return ""
+        except Exception as e:
+            log("ERROR", f"LCD.get_line({line}): {e}")
+            return ""
 
     async def get_lines(self):
         """Return the cached contents of all LCD lines."""
 
-        async with self.lock:
-            try:
-                return self.lines
+        try:
+            return [self.decode(row) for row in range(self.rows)]
 
-            except Exception as e:
-                log("ERROR", f"LCD.get_lines(): {e}")
-                return []
+        except Exception as e:
+            log("ERROR", f"LCD.get_lines(): {e}")
+            return []
 
     async def set_lines(self, line=0, message=""):
         """Replace the content of the cached line ``line`` with ``message``."""
 
-        async with self.lock:
-            try:
-                self.lines[self.check_line(line, "set_lines")] = str(message)
+        try:
+            line = self.check_line(line, "set_lines")
+            end = self.encode(line, 0, str(message))
+            row = self.lines[line]
+            for column in range(end, self.cols):
+                row[column] = SPACE
 
-            except Exception as e:
-                log("ERROR", f"LCD.set_lines(): {e}")
+        except Exception as e:
+            log("ERROR", f"LCD.set_lines(): {e}")
 
     async def set_line(self, line=0, cursor=0, message=""):
         """Insert ``message`` into the cached line at ``cursor`` position."""
 
-        async with self.lock:
-            try:
-                line = self.check_line(line, "set_line")
-                cursor = self.check_cols(cursor, "set_line")
-                message = str(message)
-                current_line = self.lines[line]
+        try:
+            line = self.check_line(line, "set_line")
+            cursor = self.check_cols(cursor, "set_line")
+            self.encode(line, cursor, str(message))
 
-                # Set parts
-                part1 = current_line[:cursor]
-                part2 = message
-                part3 = current_line[(cursor + len(message)) :]
+        except Exception as e:
+            log("ERROR", f"LCD.set_line(): {e}")
 
-                self.lines[line] = str(part1 + part2 + part3)[: self.cols]
+    async def write(self, line, cursor, data, length):
+        """Display ``length`` encoded bytes of ``data`` at ``line``/``cursor``.
 
-            except Exception as e:
-                log("ERROR", f"LCD.set_line(): {e}")
+        ``data`` already contains HD44780A00 character codes, e.g. a
+        preallocated ``bytearray`` filled in place, so no memory is allocated.
+
+        Args:
+            line (int): Line index on the display.
+            cursor (int): Column position.
+            data (bytes | bytearray): Character codes to show.
+            length (int): Number of bytes of ``data`` to show.
+        """
+
+        try:
+            line = self.check_line(line, "write")
+            cursor = self.check_cols(cursor, "write")
+            end = min(cursor + length, self.cols)
+            row = self.lines[line]
+            for column in range(cursor, end):
+                row[column] = data[column - cursor]
+            self.decoded[line] = None
+
+            if self.initialized:
+                self.send(line, cursor, end)
+
+        except Exception as e:
+            log("ERROR", f"LCD.write(): {e}")
 
     async def print(self, line=0, cursor=0, message="", fill=True):
         """Display a string at the given line and cursor position.
@@ -302,61 +410,40 @@ class LCD:
             fill (bool): If ``True`` the message is padded to the end of line.
         """
 
-        line = self.check_line(line, "set_line")
-        cursor = self.check_cols(cursor, "set_line")
-        message = str(message)
-
-        # Fill message
-        if fill:
-            message = self.fill(message, cursor)
-
-        # Set LCD line
-        await self.set_line(line, cursor, message)
+        try:
+            line = self.check_line(line, "print")
+            cursor = self.check_cols(cursor, "print")
 
-        # Convert utf-8 characters to HD44780A00 characters
-        message = self.convert_HD44780A00(message)
+            # Set LCD line
+            end = self.encode(line, cursor, str(message))
+            if fill:
+                row = self.lines[line]
+                for column in range(end, self.cols):
+                    row[column] = SPACE
+                end = self.cols
 
-        # Print LCD
-        async with self.lock:
-            try:
-                if self.initialized:
-                    self.lcd.move_to(cursor, line)  # self.lcd.move_to(col, row)
-                    self.lcd.putstr(message)
-                    self.lcd.hide_cursor()
+            # Print LCD
+            if self.initialized:
+                self.send(line, cursor, end)
 
-            except Exception as e:
-                log("ERROR", f"LCD.print(): {e}")
+        except Exception as e:
+            log("ERROR", f"LCD.print(): {e}")
 
     async def print_char(self, line=0, cursor=0, char=0):
         """Write a single character code to the display at ``line``/``cursor``."""
 
         try:
-            line = self.check_line(line, "set_line")
-            cursor = self.check_cols(cursor, "set_line")
-            char = int(char)
-
-            # Get char for lines
-            char_string = ""
-            if char == 0:
-                char_string = "↑"
-            elif char == 1:
-                char_string = "↓"
-            else:
-                char_string = "-"
-
-            current_line = await self.get_line(line)
-            await self.set_lines(
-                line,
-                current_line[:cursor] + char_string + current_line[cursor + 1 :],
-            )
+            line = self.check_line(line, "print_char")
+            cursor = self.check_cols(cursor, "print_char")
+            self.lines[line][cursor] = int(char) & 0xFF
+            self.decoded[line] = None
 
-            async with self.lock:
-                if self.initialized:
-                    self.lcd.move_to(cursor, line)  # self.lcd.move_to(col, row)
-                    self.lcd.putchar(chr(char))
+            if self.initialized:
+                self.send(line, cursor, cursor + 1)
 
         except Exception as e:
             log("ERROR", f"LCD.print_char(): {e}")
 
 
 lcd = LCD()
+metrics.add_collector(lcd.collect_metrics)
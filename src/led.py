@@ -2,7 +2,6 @@ from machine import Pin  # https://docs.micropython.org/en/latest/library/machin
 from utils.log import log  # logging function
 from utils.get_bool import get_bool  # Convert value to bool
 from src.config import config  # Config() instance
-from src.rlock import Rlock  # re-entrant asyncio.Lock()
 
 
 class LED:
@@ -19,7 +18,6 @@ class LED:
         if not hasattr(self, "initialized"):
             self.pin = None
             self.value = False
-            self.lock = Rlock()
             self.initialized = False
 
     async def initialize(self):
@@ -28,12 +26,11 @@ class LED:
         if self.initialized:
             return
         try:
-            async with self.lock:
-                self.value = await config.get_bool("LED", True)
-                self.pin = Pin("LED", Pin.OUT)
-                self.pin.value(self.value)
-                log("INFO", f"LED.initialize({self.value}): successful")
-                self.initialized = True
+            self.value = await config.get_bool("LED", True)
+            self.pin = Pin("LED", Pin.OUT)
+            self.pin.value(self.value)
+            log("INFO", f"LED.initialize({self.value}): successful")
+            self.initialized = True
 
         except (ValueError, TypeError) as e:
             log("ERROR", f"LED.initialize(): failed: {e}")
@@ -49,16 +46,15 @@ class LED:
             value (bool): Desired LED state where ``True`` turns it on.
         """
 
-        async with self.lock:
-            try:
-                value = get_bool(value)
-                self.pin.value(value)
-                self.value = value
-                await config.set("LED", value)
-                log("INFO", f"LED.set({value})")
+        try:
+            value = get_bool(value)
+            self.pin.value(value)
+            self.value = value
+            await config.set("LED", value)
+            log("INFO", f"LED.set({value})")
 
-            except Exception as e:
-                log("ERROR", f"LED.set({value}): failed: {e}")
+        except Exception as e:
+            log("ERROR", f"LED.set({value}): failed: {e}")
 
     async def activate(self):
         """Turn the LED on and log the action."""
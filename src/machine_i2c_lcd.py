@@ -19,7 +19,11 @@ class I2cLcd(LcdApi):
     def __init__(self, i2c, i2c_addr, num_lines, num_columns):
         self.i2c = i2c
         self.i2c_addr = i2c_addr
-        self.i2c.writeto(self.i2c_addr, bytearray([0]))
+        # Reused for every byte sent, see hal_write_byte()
+        self.byte = bytearray(1)
+        # Number of bytes sent to the PCF8574
+        self.bytes_written = 0
+        self.hal_write_byte(0)
         sleep_ms(20)  # Allow LCD time to powerup
         # Send reset 3 times
         self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
@@ -37,6 +41,16 @@ class I2cLcd(LcdApi):
             cmd |= self.LCD_FUNCTION_2LINES
         self.hal_write_command(cmd)
 
+    def hal_write_byte(self, byte):
+        """Send a single byte to the PCF8574 without allocating a buffer.
+
+        Args:
+            byte (int): Output state of the PCF8574 pins.
+        """
+        self.byte[0] = byte
+        self.i2c.writeto(self.i2c_addr, self.byte)
+        self.bytes_written += 1
+
     def hal_write_init_nibble(self, nibble):
         """Send a high-order nibble during LCD initialization.
 
@@ -46,16 +60,16 @@ class I2cLcd(LcdApi):
             nibble (int): Upper four bits to transmit to the LCD.
         """
         byte = ((nibble >> 4) & 0x0F) << SHIFT_DATA
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.hal_write_byte(byte | MASK_E)
+        self.hal_write_byte(byte)
 
     def hal_backlight_on(self):
         """Turn the LCD backlight on via the PCF8574 expander."""
-        self.i2c.writeto(self.i2c_addr, bytearray([1 << SHIFT_BACKLIGHT]))
+        self.hal_write_byte(1 << SHIFT_BACKLIGHT)
 
     def hal_backlight_off(self):
         """Turn the LCD backlight off via the PCF8574 expander."""
-        self.i2c.writeto(self.i2c_addr, bytearray([0]))
+        self.hal_write_byte(0)
 
     def hal_write_command(self, cmd):
         """Send a command byte to the LCD controller.
@@ -68,11 +82,11 @@ class I2cLcd(LcdApi):
             cmd (int): Command byte to transmit.
         """
         byte = (self.backlight << SHIFT_BACKLIGHT) | (((cmd >> 4) & 0x0F) << SHIFT_DATA)
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.hal_write_byte(byte | MASK_E)
+        self.hal_write_byte(byte)
         byte = (self.backlight << SHIFT_BACKLIGHT) | ((cmd & 0x0F) << SHIFT_DATA)
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.hal_write_byte(byte | MASK_E)
+        self.hal_write_byte(byte)
         if cmd <= 3:
             # The home and clear commands require a worst case delay of 4.1 msec
             sleep_ms(5)
@@ -88,12 +102,12 @@ class I2cLcd(LcdApi):
             | (self.backlight << SHIFT_BACKLIGHT)
             | (((data >> 4) & 0x0F) << SHIFT_DATA)
         )
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.hal_write_byte(byte | MASK_E)
+        self.hal_write_byte(byte)
         byte = (
             MASK_RS
             | (self.backlight << SHIFT_BACKLIGHT)
             | ((data & 0x0F) << SHIFT_DATA)
         )
-        self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytearray([byte]))
+        self.hal_write_byte(byte | MASK_E)
+        self.hal_write_byte(byte)
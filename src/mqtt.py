@@ -0,0 +1,387 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+import ujson  # https://docs.micropython.org/en/latest/library/json.html
+import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+from utils.log import log, enabled, INFO, VERBOSE  # logging function
+from utils.metrics import metrics, COUNTER, GAUGE  # Metrics() instance
+from src.config import config  # Config() instance
+from src.relay import Relay, relay_open, relay_close  # Relay() instance
+from src.wifi import wifi  # WiFi() instance
+
+# MQTT 3.1.1 control packet types (upper nibble of the fixed header)
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+SUBSCRIBE = 0x82
+SUBACK = 0x90
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+# Timeout of the broker's CONNACK
+CONNACK_TIMEOUT_MS = 5000
+
+# Interval of the temperature samples collected into a batch
+SAMPLE_INTERVAL_MS = 5000
+
+# Relay events kept per batch, older events of the same batch are dropped
+MAX_EVENTS = 32
+
+# Valve states derived from the relay events
+VALVE_IDLE = "idle"
+VALVE_OPENING = "opening"
+VALVE_CLOSING = "closing"
+
+MQTT_CONNECTED = metrics.register("mqtt_connected", GAUGE, "MQTT broker connection")
+MQTT_PUBLISHED = metrics.register(
+    "mqtt_published_total", COUNTER, "Telemetry batches sent to the broker"
+)
+MQTT_BUFFERED = metrics.register(
+    "mqtt_buffered", GAUGE, "Telemetry batches waiting for the broker"
+)
+MQTT_DROPPED = metrics.register(
+    "mqtt_dropped_total", COUNTER, "Telemetry batches dropped from the full buffer"
+)
+MQTT_COMMANDS = metrics.register(
+    "mqtt_commands_total", COUNTER, "Commands received on the command topic"
+)
+
+
+def encode_length(length):
+    """Return ``length`` as MQTT variable length integer."""
+
+    encoded = bytearray()
+    while True:
+        byte = length & 0x7F
+        length >>= 7
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return encoded
+
+
+def encode_string(string):
+    """Return ``string`` with the 2 byte length prefix of MQTT strings."""
+
+    if isinstance(string, str):
+        string = string.encode("utf-8")
+    return len(string).to_bytes(2, "big") + string
+
+
+class MQTT:
+    """Singleton that publishes telemetry to an MQTT broker.
+
+    Pushing the readings once per ``mqtt_interval`` is cheaper for the device
+    than being polled over HTTP.  :meth:`run` samples ``current_temp`` and
+    ``current_temp_2`` every ``SAMPLE_INTERVAL_MS`` and publishes them together
+    with the temperature category, the valve state and the relay events of the
+    interval as one JSON message to ``<mqtt_topic>/telemetry``.
+
+    Batches are queued in a ring of ``mqtt_buffer`` messages.  While the broker
+    is unreachable the oldest batches are dropped, after a reconnect the ring
+    is flushed in order.  Payloads written to ``<mqtt_topic>/set`` in
+    ``key=value&...`` form are passed to the callbacks registered with
+    :meth:`on_command`.
+
+    Only QoS 0 is implemented; the client is small enough to avoid a blocking
+    third party library.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(MQTT, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.broker = None
+            self.port = 1883
+            self.user = None
+            self.password = None
+            self.topic = "hotwater"
+            self.interval_ms = 60000
+            self.buffer_size = 30
+            self.client_id = "hotwater"
+            self.reader = None
+            self.writer = None
+            self.connected = False
+            self.buffer = []
+            self.samples = []
+            self.events = []
+            self.batch_start_ms = time.ticks_ms()
+            self.valve = VALVE_IDLE
+            self.command_callbacks = []
+            self.wake = asyncio.Event()
+            self.initialized = False
+
+    async def initialize(self):
+        """Load the broker settings, returns ``False`` if MQTT is disabled."""
+
+        if self.initialized:
+            return True
+        try:
+            self.broker = await config.get("mqtt_broker", "")
+            if not self.broker:
+                log(INFO, "MQTT.initialize(): no broker configured")
+                return False
+            self.port = await config.get_int("mqtt_port", 1883)
+            self.user = await config.get("mqtt_user", "")
+            self.password = await config.get("mqtt_password", "")
+            self.topic = await config.get("mqtt_topic", "hotwater")
+            self.interval_ms = await config.get_int("mqtt_interval", 60) * 1000
+            self.buffer_size = max(1, await config.get_int("mqtt_buffer", 30))
+
+            from machine import unique_id  # https://docs.micropython.org/en/latest/library/machine.html#machine.unique_id
+
+            self.client_id = f"hotwater-{unique_id().hex()}"
+
+            Relay.on_change(self.relay_changed)
+            wifi.on_connect(self.wake.set)
+            wifi.on_disconnect(self.close)
+            log("INFO", "MQTT.initialize(): successful")
+            self.initialized = True
+            return True
+
+        except Exception as e:
+            log("ERROR", f"MQTT.initialize(): failed: {e}")
+            return False
+
+    def on_command(self, callback):
+        """Call ``callback(body)`` for every message on the command topic.
+
+        ``body`` is the payload as ``key=value&...`` string.  Coroutine
+        functions are awaited.
+        """
+
+        self.command_callbacks.append(callback)
+
+    def relay_changed(self, relay, active):
+        if relay is relay_open:
+            name = "open"
+        elif relay is relay_close:
+            name = "close"
+        else:
+            name = str(relay.pin_number)
+
+        if active:
+            self.valve = VALVE_OPENING if relay is relay_open else VALVE_CLOSING
+        else:
+            self.valve = VALVE_IDLE
+
+        if len(self.events) >= MAX_EVENTS:
+            self.events.pop(0)
+        self.events.append(
+            (time.ticks_diff(time.ticks_ms(), self.batch_start_ms), name, int(active))
+        )
+
+    async def sample(self):
+        """Add the current temperatures to the batch."""
+
+        self.samples.append(
+            (
+                await config.get_float("current_temp", -127.0, 1),
+                await config.get_float("current_temp_2", -127.0, 1),
+            )
+        )
+
+    async def batch(self):
+        """Queue the samples and events since the last batch as one message."""
+
+        now = time.ticks_ms()
+        message = {
+            "interval_ms": time.ticks_diff(now, self.batch_start_ms),
+            "current_temp": [sample[0] for sample in self.samples],
+            "current_temp_2": [sample[1] for sample in self.samples],
+            "category": await config.get("temp_change_category", "LOW"),
+            "valve": self.valve,
+            "relay_events": self.events,
+        }
+        payload = ujson.dumps(message).encode("utf-8")
+        self.samples = []
+        self.events = []
+        self.batch_start_ms = now
+
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.pop(0)
+            metrics.inc(MQTT_DROPPED)
+        self.buffer.append(payload)
+        metrics.set(MQTT_BUFFERED, len(self.buffer))
+
+    async def send(self, packet_type, body):
+        self.writer.write(bytes((packet_type,)) + encode_length(len(body)) + body)
+        await self.writer.drain()
+
+    async def publish(self, topic, payload, retain=False):
+        """Publish ``payload`` to ``topic`` with QoS 0."""
+
+        await self.send(PUBLISH | (1 if retain else 0), encode_string(topic) + payload)
+
+    async def connect(self):
+        """Connect to the broker and subscribe to the command topic.
+
+        Returns:
+            bool: ``True`` if the broker accepted the connection.
+        """
+
+        status_topic = f"{self.topic}/status"
+        try:
+            log(INFO, "MQTT.connect({}:{})", self.broker, self.port)
+            self.reader, self.writer = await asyncio.open_connection(
+                self.broker, self.port
+            )
+
+            # Clean session, retained last will "offline" on the status topic
+            flags = 0x02 | 0x04 | 0x20
+            payload = (
+                encode_string(self.client_id)
+                + encode_string(status_topic)
+                + encode_string("offline")
+            )
+            if self.user:
+                flags |= 0x80
+                payload += encode_string(self.user)
+                if self.password:
+                    flags |= 0x40
+                    payload += encode_string(self.password)
+            # Keep alive of two batch intervals, every batch is a publish
+            keepalive = min(2 * self.interval_ms // 1000, 0xFFFF)
+            await self.send(
+                CONNECT,
+                encode_string("MQTT")
+                + bytes((4, flags))
+                + keepalive.to_bytes(2, "big")
+                + payload,
+            )
+
+            response = await asyncio.wait_for_ms(
+                self.reader.readexactly(4), CONNACK_TIMEOUT_MS
+            )
+            if response[0] != CONNACK or response[3] != 0:
+                raise OSError(f"connection refused: {response[3]}")
+
+            await self.send(
+                SUBSCRIBE, b"\x00\x01" + encode_string(f"{self.topic}/set") + b"\x00"
+            )
+            await self.publish(status_topic, b"online", retain=True)
+
+            self.connected = True
+            metrics.set(MQTT_CONNECTED, 1)
+            asyncio.create_task(self.listen())
+            log("INFO", "MQTT.connect(): successful")
+            return True
+
+        except Exception as e:
+            log("ERROR", f"MQTT.connect(): failed: {e}")
+            self.close()
+            return False
+
+    def close(self):
+        """Drop the broker connection, queued batches are kept."""
+
+        if self.writer:
+            try:
+                self.writer.close()
+            except OSError:
+                pass
+        self.reader = None
+        self.writer = None
+        if self.connected:
+            self.connected = False
+            metrics.set(MQTT_CONNECTED, 0)
+            log("WARN", "MQTT.disconnected()")
+
+    async def flush(self):
+        """Publish the queued batches from the oldest to the newest."""
+
+        topic = f"{self.topic}/telemetry"
+        try:
+            while self.buffer and self.connected:
+                await self.publish(topic, self.buffer[0])
+                self.buffer.pop(0)
+                metrics.inc(MQTT_PUBLISHED)
+        except Exception as e:
+            log("ERROR", f"MQTT.flush(): failed: {e}")
+            self.close()
+        metrics.set(MQTT_BUFFERED, len(self.buffer))
+
+    async def listen(self):
+        """Read packets from the broker until the connection is closed."""
+
+        reader = self.reader
+        try:
+            while reader is self.reader:
+                header = (await reader.readexactly(1))[0]
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b""
+
+                if header & 0xF0 == PUBLISH:
+                    await self.handle_publish(header, body)
+                elif enabled(VERBOSE):
+                    log(VERBOSE, "MQTT.listen(): packet {:02x}", header)
+
+        except Exception as e:
+            if reader is self.reader:
+                log("ERROR", f"MQTT.listen(): failed: {e}")
+                self.close()
+
+    async def handle_publish(self, header, body):
+        topic_length = int.from_bytes(body[:2], "big")
+        offset = 2 + topic_length
+        # Packet identifier of QoS 1 and 2 messages
+        if header & 0x06:
+            offset += 2
+        payload = body[offset:].decode("utf-8")
+        metrics.inc(MQTT_COMMANDS)
+        log(INFO, "MQTT.command({})", payload)
+
+        for callback in self.command_callbacks:
+            try:
+                result = callback(payload)
+                if result is not None and hasattr(result, "send"):
+                    await result
+            except Exception as e:
+                log("ERROR", f"MQTT.handle_publish(): failed: {e}")
+
+    async def run(self):
+        """Sample, batch and publish the telemetry, runs forever."""
+
+        if not await self.initialize():
+            return
+
+        # The first sample is taken after the first measurement of main()
+        now = time.ticks_ms()
+        next_sample_ms = time.ticks_add(now, SAMPLE_INTERVAL_MS)
+        next_batch_ms = time.ticks_add(now, self.interval_ms)
+        while True:
+            # Connect once per batch or after a WiFi reconnect, not per sample
+            retry = self.wake.is_set()
+            now = time.ticks_ms()
+            if time.ticks_diff(now, next_sample_ms) >= 0:
+                await self.sample()
+                next_sample_ms = time.ticks_add(next_sample_ms, SAMPLE_INTERVAL_MS)
+            if time.ticks_diff(now, next_batch_ms) >= 0:
+                await self.batch()
+                next_batch_ms = time.ticks_add(next_batch_ms, self.interval_ms)
+                retry = True
+
+            if retry and self.buffer and not self.connected and wifi.is_connected():
+                await self.connect()
+            if self.connected:
+                await self.flush()
+
+            # A WiFi reconnect ends the wait early to flush the buffer
+            self.wake.clear()
+            delay = time.ticks_diff(next_sample_ms, time.ticks_ms())
+            if delay > 0:
+                try:
+                    await asyncio.wait_for_ms(self.wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+
+mqtt = MQTT()
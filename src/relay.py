@@ -1,8 +1,8 @@
-import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+import time  # https://docs.micropython.org/en/latest/library/time.html
 from machine import Pin  # https://docs.micropython.org/en/latest/library/machine.html
-from utils.log import log  # logging function
-from src.config import config  # Config() instance
-from src.rlock import Rlock  # re-entrant asyncio.Lock()
+from utils.log import log, VERBOSE  # logging function
+from utils.metrics import metrics, COUNTER  # Metrics() instance
+from utils.gc_manager import gc_manager  # GcManager() instance
 
 
 class Relay:
@@ -10,17 +10,26 @@ class Relay:
 
     Each relay is treated as a singleton per GPIO pin so that concurrent parts of
     the application do not accidentally create multiple instances for the same
-    hardware.  Access to the hardware pin is protected by a re-entrant lock to
-    allow nested asynchronous calls.
+    hardware.
+
+    :meth:`activate` and :meth:`deactivate` do not suspend and need no lock.
+    Timed pulses are run by the :class:`~src.actuator.Actuator`, which keeps
+    pulses requested by the main loop and the web interface from overlapping.
+
+    Callbacks registered with :meth:`on_change` are called as
+    ``callback(relay, active)`` whenever any relay is switched.
     """
 
     _instances = {}
+    _listeners = []
 
     def __new__(cls, *args, **kwargs):
         instance = super(Relay, cls).__new__(cls)
         instance.pin_number = None
         instance.pin = None
-        instance.lock = Rlock()
+        instance.activated_ms = None
+        instance.actuations_metric = None
+        instance.on_time_metric = None
         instance.initialized = False
         return instance
 
@@ -51,15 +60,26 @@ class Relay:
             return existing_instance
 
         try:
-            async with self.lock:
-                if not self.initialized:
-                    self.pin_number = pin_number
-                    self.pin = Pin(self.pin_number, Pin.OUT)
-                    self.pin.value(0)
-                    self.initialized = True
-                    Relay._instances[pin_number] = self
-                    log("INFO", f"Relay.initialize(pin={pin_number}): successful")
-                return self
+            if not self.initialized:
+                self.pin_number = pin_number
+                self.pin = Pin(self.pin_number, Pin.OUT)
+                self.pin.value(0)
+                labels = f'pin="{pin_number}"'
+                # Metrics are kept and relabeled when the relay moves to another pin
+                if self.actuations_metric is None:
+                    self.actuations_metric = metrics.register(
+                        "relay_actuations_total", COUNTER, "Relay activations", labels
+                    )
+                    self.on_time_metric = metrics.register(
+                        "relay_on_ms_total", COUNTER, "Time the relay was active", labels
+                    )
+                else:
+                    metrics.relabel(self.actuations_metric, labels)
+                    metrics.relabel(self.on_time_metric, labels)
+                self.initialized = True
+                Relay._instances[pin_number] = self
+                log("INFO", f"Relay.initialize(pin={pin_number}): successful")
+            return self
 
         except (ValueError, TypeError) as e:
             log("ERROR", f"Relay.initialize(): failed: {e}")
@@ -69,52 +89,77 @@ class Relay:
             log("ERROR", f"Relay.initialize(pin={pin_number}): failed: {e}")
             return None
 
-    async def activate(self):
-        """Energize the relay coil to close the circuit."""
+    async def reconfigure(self, pin_number):
+        """Move the relay to ``pin_number``, a running pulse is cut short.
 
-        async with self.lock:
-            try:
-                self.pin.value(1)
-                log("VERBOSE", f"Relay.activate(pin={self.pin_number})")
-            except Exception as e:
-                log("ERROR", f"Relay.activate(pin={self.pin_number}): failed: {e}")
+        Returns:
+            bool: ``True`` if the relay is initialized on ``pin_number``.
+        """
 
-    async def deactivate(self):
-        """Remove power from the relay coil to open the circuit."""
+        if pin_number == self.pin_number:
+            return True
+        if pin_number in Relay._instances:
+            log(
+                "ERROR",
+                f"Relay.reconfigure(pin={pin_number}): pin already used by another relay",
+            )
+            return False
+
+        log("INFO", f"Relay.reconfigure(pin={self.pin_number} -> {pin_number})")
+        if self.initialized:
+            await self.deactivate()
+            Relay._instances.pop(self.pin_number, None)
+            self.initialized = False
+        await self.initialize(pin_number)
+        return self.initialized
+
+    @staticmethod
+    def on_change(callback):
+        """Call ``callback(relay, active)`` on every switch of a relay.
+
+        Callbacks run synchronously while the relay is switched and must not
+        block.
+        """
 
-        async with self.lock:
+        Relay._listeners.append(callback)
+
+    def notify(self, active):
+        for callback in Relay._listeners:
             try:
-                self.pin.value(0)
-                log("VERBOSE", f"Relay.deactivate(pin={self.pin_number})")
+                callback(self, active)
             except Exception as e:
-                log("ERROR", f"Relay.deactivate(pin={self.pin_number}): failed: {e}")
+                log("ERROR", f"Relay.notify(pin={self.pin_number}): failed: {e}")
 
-    async def toggle(self, relay_time=None):
-        """Activate the relay for a limited time and then deactivate it.
-
-        Args:
-            relay_time (int, optional): Duration in milliseconds the relay
-                should remain active. When ``None`` the value is read from the
-                configuration.
-        """
+    async def activate(self):
+        """Energize the relay coil to close the circuit."""
 
-        async with self.lock:
-            try:
-                if relay_time == None:
-                    relay_time = await config.get_int("relay_time", 1200)
+        try:
+            self.pin.value(1)
+            if self.activated_ms is None:
+                self.activated_ms = time.ticks_ms()
+                metrics.inc(self.actuations_metric)
+                gc_manager.enter_critical()
+                self.notify(True)
+            log(VERBOSE, "Relay.activate(pin={})", self.pin_number)
+        except Exception as e:
+            log("ERROR", f"Relay.activate(pin={self.pin_number}): failed: {e}")
 
-                log("INFO", f"Relay.toggle(pin={self.pin_number}, time={relay_time})")
-                await self.activate()
-                await asyncio.sleep_ms(relay_time)
-                await self.deactivate()
+    async def deactivate(self):
+        """Remove power from the relay coil to open the circuit."""
 
-            except (ValueError, TypeError) as e:
-                log("ERROR", f"Relay.toggle(): failed: {e}")
-            except Exception as e:
-                log(
-                    "ERROR",
-                    f"Relay.toggle(pin={self.pin_number}, time={relay_time}): failed: {e}",
+        try:
+            self.pin.value(0)
+            if self.activated_ms is not None:
+                metrics.inc(
+                    self.on_time_metric,
+                    time.ticks_diff(time.ticks_ms(), self.activated_ms),
                 )
+                self.activated_ms = None
+                gc_manager.exit_critical()
+                self.notify(False)
+            log(VERBOSE, "Relay.deactivate(pin={})", self.pin_number)
+        except Exception as e:
+            log("ERROR", f"Relay.deactivate(pin={self.pin_number}): failed: {e}")
 
 
 relay_open = Relay()
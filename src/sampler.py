@@ -0,0 +1,125 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+from utils.log import log, INFO  # logging function
+from utils.metrics import metrics, GAUGE  # Metrics() instance
+from src.config import config  # Config() instance
+
+# Samples taken at least until the temperature could reach a band edge
+SAMPLES_TO_EDGE = 4
+
+# Weight of the newest slope in the smoothed slope
+SLOPE_ALPHA = 0.5
+
+# Configuration keys of the sampler
+SAMPLER_KEYS = (
+    "temp_sampling_interval",
+    "temp_sampling_interval_max",
+    "temp_slope_threshold",
+)
+
+SAMPLER_INTERVAL = metrics.register(
+    "sensor_sampling_interval_ms", GAUGE, "Current interval between the temperature samples"
+)
+
+
+class Sampler:
+    """Singleton that adapts the interval between the temperature samples.
+
+    The main loop reads the sensors when :meth:`due` returns ``True`` and
+    passes the new temperature to :meth:`update`.  The sampler is *active*
+    while the temperature is outside the band or changes faster than
+    ``temp_slope_threshold`` °C per minute; then it samples every
+    ``temp_sampling_interval`` ms.  Leaving the active state needs the slope
+    to fall below half the threshold, so the interval does not toggle on a
+    slope at the threshold.
+
+    Once steady the interval doubles with every sample up to
+    ``temp_sampling_interval_max`` ms, but stays short enough for
+    ``SAMPLES_TO_EDGE`` samples before the temperature could reach the band
+    edge it is moving towards.  A steady temperature close to an edge is
+    therefore sampled rarely, one drifting towards it more often.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(Sampler, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.min_ms = 5000
+            self.max_ms = 60000
+            self.slope_threshold = 0.5
+            self.interval_ms = self.min_ms
+            self.active = True
+            self.slope = 0.0
+            self.last_temp = None
+            self.last_ms = 0
+            self.initialized = False
+
+    async def initialize(self):
+        """Load the settings and follow their changes."""
+
+        if self.initialized:
+            return
+        await self.configure()
+        config.subscribe(SAMPLER_KEYS, lambda keys: self.configure())
+        self.initialized = True
+
+    async def configure(self):
+        self.min_ms = max(1000, await config.get_int("temp_sampling_interval", 5000))
+        self.max_ms = max(
+            self.min_ms, await config.get_int("temp_sampling_interval_max", 60000)
+        )
+        self.slope_threshold = await config.get_float("temp_slope_threshold", 0.5)
+        self.interval_ms = self.min_ms if self.active else min(self.interval_ms, self.max_ms)
+        metrics.set(SAMPLER_INTERVAL, self.interval_ms)
+
+    def due(self, now_ms):
+        """Return ``True`` if the next sample is due at ``now_ms``."""
+
+        return self.last_temp is None or time.ticks_diff(now_ms, self.last_ms) >= self.interval_ms
+
+    async def update(self, temp, now_ms):
+        """Take the sample ``temp`` read at ``now_ms`` and set the next interval."""
+
+        if self.last_temp is not None and temp > -127.0 and self.last_temp > -127.0:
+            seconds = time.ticks_diff(now_ms, self.last_ms) / 1000
+            if seconds > 0:
+                # °C per minute, smoothed against the quantization of single steps
+                slope = (temp - self.last_temp) * 60 / seconds
+                self.slope += SLOPE_ALPHA * (slope - self.slope)
+        self.last_temp, self.last_ms = temp, now_ms
+
+        min_temp = await config.get_float("nominal_min_temp", 42.0)
+        max_temp = await config.get_float("nominal_max_temp", 58.0)
+        slope = abs(self.slope)
+        threshold = self.slope_threshold / 2 if self.active else self.slope_threshold
+        # A failed read is outside the band as well
+        active = not min_temp <= temp <= max_temp or slope >= threshold
+
+        if active:
+            interval_ms = self.min_ms
+        else:
+            interval_ms = min(self.max_ms, self.interval_ms * 2)
+            if slope > 0:
+                # Time until the edge ahead is reached at the current slope
+                distance = max_temp - temp if self.slope > 0 else temp - min_temp
+                interval_ms = min(interval_ms, int(distance / slope * 60000) // SAMPLES_TO_EDGE)
+            interval_ms = max(self.min_ms, interval_ms)
+        if active != self.active:
+            log(
+                INFO,
+                "Sampler.update({}, slope={:.2f}): {}",
+                temp,
+                self.slope,
+                "active" if active else "steady",
+            )
+        self.active = active
+        if interval_ms != self.interval_ms:
+            self.interval_ms = interval_ms
+            metrics.set(SAMPLER_INTERVAL, interval_ms)
+
+
+sampler = Sampler()
@@ -0,0 +1,287 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+from array import array  # https://docs.micropython.org/en/latest/library/array.html
+from utils.log import log, INFO  # logging function
+from src.config import config  # Config() instance
+from src.wifi import wifi  # WiFi() instance
+from src.functions import print_nominal_temp
+
+# Minutes of a week, transitions are stored as minute of the week (Monday 00:00 = 0)
+DAY_MINUTES = 1440
+WEEK_MINUTES = 7 * DAY_MINUTES
+
+# Longest sleep between two checks of the clock
+MAX_WAIT_MS = 3600000
+
+# Interval of the NTP synchronization while WiFi is connected
+SYNC_INTERVAL = 86400
+
+# The RTC is only trusted if it is not older than this year
+MIN_YEAR = 2024
+
+DAY_NAMES = ("Mo", "Di", "Mi", "Do", "Fr", "Sa", "So")
+
+
+def parse_days(days):
+    """Return the days (1 = Monday ... 7 = Sunday) of ``"*"``, ``"1-5"`` or ``"6,7"``."""
+
+    if days == "*":
+        return range(1, 8)
+    result = []
+    for part in days.split(","):
+        first, _, last = part.partition("-")
+        first = int(first)
+        last = int(last) if last else first
+        if not 1 <= first <= last <= 7:
+            raise ValueError(f"invalid days: {days}")
+        result.extend(range(first, last + 1))
+    return result
+
+
+def parse_schedule(text):
+    """Parse ``"<days> <HH:MM> <min> <max>"`` entries separated by ``;`` or new lines.
+
+    Returns:
+        tuple: ``(entries, transitions)`` with the normalized entries and the
+            transitions ``(minute of week, min, max)`` in tenths of a degree,
+            sorted by time.  A later entry replaces an earlier one at the same
+            minute.
+
+    Raises:
+        ValueError: If an entry is invalid.
+    """
+
+    entries = []
+    transitions = {}
+    for entry in text.replace("\n", ";").split(";"):
+        fields = entry.split()
+        if not fields:
+            continue
+        if len(fields) != 4:
+            raise ValueError(f"invalid entry: {entry.strip()}")
+        days, clock, min_temp, max_temp = fields
+        hours, _, minutes = clock.partition(":")
+        minute = int(hours) * 60 + int(minutes or 0)
+        min_temp, max_temp = float(min_temp), float(max_temp)
+        if not 0 <= minute < DAY_MINUTES:
+            raise ValueError(f"invalid time: {clock}")
+        if not 0.0 <= min_temp <= max_temp <= 120.0:
+            raise ValueError(f"invalid temperatures: {min_temp} {max_temp}")
+        for day in parse_days(days):
+            transitions[(day - 1) * DAY_MINUTES + minute] = (
+                round(min_temp * 10),
+                round(max_temp * 10),
+            )
+        entries.append(
+            f"{days} {minute // 60:02d}:{minute % 60:02d} {min_temp:.1f} {max_temp:.1f}"
+        )
+    return entries, sorted((minute,) + band for minute, band in transitions.items())
+
+
+def format_minute(minute):
+    """Return a minute of the week as ``"Mo 06:00"``."""
+
+    day, minute = divmod(minute, DAY_MINUTES)
+    return f"{DAY_NAMES[day]} {minute // 60:02d}:{minute % 60:02d}"
+
+
+class Schedule:
+    """Singleton that switches the setpoint band by a weekly schedule.
+
+    The ``schedule`` configuration value holds entries like
+    ``"1-5 06:00 45.0 57.0;1-5 22:00 40.0 50.0"`` (days 1 = Monday ... 7 =
+    Sunday or ``*``).  They are expanded into three arrays sorted by the
+    minute of the week, so the active transition is found once with a binary
+    search and afterwards the next one is simply the following index.
+
+    At every transition the band is written to ``nominal_min_temp`` and
+    ``nominal_max_temp``, so :func:`open_relays` keeps reading it from the
+    configuration.  A band changed on the buttons or the web interface is
+    kept until the next transition.  :meth:`run` sleeps until the next
+    transition, an edit of the schedule or a clock synchronization.
+
+    The clock is synchronized with NTP (``ntptime``) whenever WiFi connects
+    and once a day.  Afterwards the time is counted on from the
+    synchronization with ``time.ticks_ms()``, so it stays monotonic even if
+    the RTC is reset.  Before the first synchronization the RTC is used if it
+    holds a plausible date, otherwise the static band stays active.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(Schedule, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.entries = []
+            self.minutes = array("H")
+            self.min_temps = array("H")
+            self.max_temps = array("H")
+            self.active = None
+            self.applied = None
+            self.utc_offset = 0
+            self.base_time = None
+            self.base_ticks = 0
+            self.last_sync = 0
+            self.wake = asyncio.Event()
+            self.initialized = False
+
+    async def initialize(self):
+        """Load the schedule and synchronize the clock on every WiFi connect."""
+
+        if self.initialized:
+            return
+        await self.load()
+        config.subscribe(("schedule", "utc_offset"), lambda keys: self.load())
+        wifi.on_connect(self.sync)
+        self.initialized = True
+
+    async def load(self):
+        """Build the transition index from the ``schedule`` configuration value."""
+
+        self.utc_offset = await config.get_int("utc_offset", 0) * 60
+        try:
+            self.entries, transitions = parse_schedule(await config.get("schedule", "") or "")
+        except ValueError as e:
+            log("ERROR", f"Schedule.load(): failed: {e}")
+            self.entries, transitions = [], []
+        self.minutes = array("H", (transition[0] for transition in transitions))
+        self.min_temps = array("H", (transition[1] for transition in transitions))
+        self.max_temps = array("H", (transition[2] for transition in transitions))
+        self.active = None
+        self.applied = None
+        log(INFO, "Schedule.load(): {} transitions", len(self.minutes))
+        self.wake.set()
+
+    async def sync(self):
+        """Set the RTC from NTP and count on from it with the ticks."""
+
+        try:
+            # Imported lazily, the network stack is only loaded with WiFi
+            import ntptime  # https://docs.micropython.org/en/latest/esp8266/quickref.html#networking
+
+            ntptime.host = await config.get("ntp_host", "pool.ntp.org")
+            ntptime.settime()
+            self.base_time = self.last_sync = time.time()
+            self.base_ticks = time.ticks_ms()
+            self.active = None
+            log(INFO, "Schedule.sync(): {}", time.gmtime(self.base_time))
+            self.wake.set()
+        except Exception as e:
+            log("ERROR", f"Schedule.sync(): failed: {e}")
+
+    def now(self):
+        """Return the local time in seconds since the epoch, ``None`` if unknown."""
+
+        if self.base_time is None:
+            now = time.time()
+            if time.gmtime(now)[0] < MIN_YEAR:
+                return None
+            return now + self.utc_offset
+
+        # Move the base forward so the ticks difference never overflows
+        seconds = time.ticks_diff(time.ticks_ms(), self.base_ticks) // 1000
+        self.base_time += seconds
+        self.base_ticks = time.ticks_add(self.base_ticks, seconds * 1000)
+        return self.base_time + self.utc_offset
+
+    def span(self, index):
+        """Return the minutes from transition ``index`` to the next one."""
+
+        count = len(self.minutes)
+        return (self.minutes[(index + 1) % count] - self.minutes[index] - 1) % WEEK_MINUTES + 1
+
+    def locate(self, minute):
+        """Return the index of the transition active at ``minute`` of the week."""
+
+        # Usually still the active transition or the one following it
+        if self.active is not None:
+            for index in (self.active, (self.active + 1) % len(self.minutes)):
+                if (minute - self.minutes[index]) % WEEK_MINUTES < self.span(index):
+                    return index
+
+        # Binary search for the last transition not after minute
+        low, high = 0, len(self.minutes)
+        while low < high:
+            middle = (low + high) // 2
+            if self.minutes[middle] <= minute:
+                low = middle + 1
+            else:
+                high = middle
+        # Before the first transition of the week the last one is still active
+        return (low - 1) % len(self.minutes)
+
+    def band(self):
+        """Return the ``(min, max)`` band of the active transition or ``None``."""
+
+        if self.active is None:
+            return None
+        return self.min_temps[self.active] / 10, self.max_temps[self.active] / 10
+
+    async def apply(self, now):
+        """Activate the transition of ``now`` and return the ms until the next one."""
+
+        local = time.gmtime(now)
+        minute = local[6] * DAY_MINUTES + local[3] * 60 + local[4]
+        self.active = self.locate(minute)
+
+        if self.active != self.applied:
+            self.applied = self.active
+            min_temp, max_temp = self.band()
+            await config.set("nominal_min_temp", min_temp)
+            await config.set("nominal_max_temp", max_temp)
+            await print_nominal_temp()
+            log(
+                INFO,
+                "Schedule.apply({}): {:.1f} - {:.1f} °C",
+                format_minute(self.minutes[self.active]),
+                min_temp,
+                max_temp,
+            )
+
+        minutes = self.span(self.active) - (minute - self.minutes[self.active]) % WEEK_MINUTES
+        return minutes * 60000 - local[5] * 1000
+
+    async def run(self):
+        """Switch the band at the transitions, runs forever."""
+
+        await self.initialize()
+        while True:
+            self.wake.clear()
+            wait_ms = MAX_WAIT_MS
+            now = self.now()
+            if self.minutes and now is not None:
+                wait_ms = max(1000, min(wait_ms, await self.apply(now)))
+
+            # Synchronize the clock once a day
+            if (
+                now is not None
+                and self.base_time is not None
+                and wifi.is_connected()
+                and self.base_time - self.last_sync >= SYNC_INTERVAL
+            ):
+                await self.sync()
+
+            try:
+                await asyncio.wait_for_ms(self.wake.wait(), wait_ms)
+            except asyncio.TimeoutError:
+                pass
+
+    def lines(self):
+        """Yield the schedule entries and the active band as text lines."""
+
+        for entry in self.entries:
+            yield f"{entry}\n"
+        band = self.band()
+        if band is not None:
+            since = format_minute(self.minutes[self.active])
+            until = format_minute(self.minutes[(self.active + 1) % len(self.minutes)])
+            yield f"# active {since} - {until}: {band[0]:.1f} - {band[1]:.1f} °C\n"
+        elif self.minutes and self.now() is None:
+            yield "# time unknown, waiting for NTP\n"
+
+
+schedule = Schedule()
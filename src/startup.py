@@ -0,0 +1,146 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+from utils.log import log  # logging function
+from src.config import config  # Config() instance
+from src.lcd import lcd  # LCD() instance
+from src.led import led  # LED() instance
+from src.relay import relay_open, relay_close  # Relay() instance
+from src.temp import temp_sensor, temp_sensor_2, TEMP_KEYS  # TemperatureSensor() instance
+
+# Initialization result per device: name -> (successful, duration in ms)
+init_results = {}
+
+# Configuration keys of the LCD, a change rebuilds the I2C bus
+LCD_KEYS = ("LCD_PIN_SDA", "LCD_PIN_SCL", "LCD_ADDR", "LCD_FREQ", "LCD_COLS", "LCD_ROWS")
+
+
+async def timed_initialize(name, device, initialize):
+    """Await a device initialization and record its duration and result.
+
+    Args:
+        name (str): Device name used in ``init_results`` and log messages.
+        device: Device instance providing an ``initialized`` attribute.
+        initialize: Coroutine that initializes ``device``.
+
+    Returns:
+        bool: ``True`` if the device is initialized afterwards.
+    """
+
+    start = time.ticks_ms()
+    try:
+        await initialize
+    except Exception as e:
+        log("ERROR", f"Startup.initialize({name}): failed: {e}")
+
+    successful = bool(device.initialized)
+    duration = time.ticks_diff(time.ticks_ms(), start)
+    init_results[name] = (successful, duration)
+    log(
+        "INFO" if successful else "ERROR",
+        f"Startup.initialize({name}): {'successful' if successful else 'failed'} in {duration} ms",
+    )
+    return successful
+
+
+async def initialize_relay(relay, pin_key):
+    """Initialize ``relay`` on the pin stored under ``pin_key``."""
+
+    await relay.initialize(await config.get_int(pin_key))
+
+
+async def initialize_temp_sensor(sensor, key_prefix, number):
+    """Initialize ``sensor`` from the ``<key_prefix>_*`` configuration values."""
+
+    await sensor.initialize(
+        await config.get_int(f"{key_prefix}_PIN"),
+        resolution=await config.get_int(f"{key_prefix}_RESOLUTION_BIT", 11),
+        type=await config.get(f"{key_prefix}_TYPE", "ds18x20"),
+        number=number,
+    )
+
+
+async def reconfigure_relay(relay, pin_key):
+    """Move ``relay`` to the pin stored under ``pin_key``."""
+
+    await relay.reconfigure(await config.get_int(pin_key))
+
+
+async def reconfigure_temp_sensor(sensor, key_prefix):
+    """Apply the ``<key_prefix>_*`` configuration values to ``sensor``."""
+
+    await sensor.reconfigure(
+        await config.get_int(f"{key_prefix}_PIN"),
+        resolution=await config.get_int(f"{key_prefix}_RESOLUTION_BIT", 11),
+        type=await config.get(f"{key_prefix}_TYPE", "ds18x20"),
+    )
+
+
+def subscribe_devices():
+    """Re-initialize devices in place when their configuration changes."""
+
+    config.subscribe(LCD_KEYS, lambda keys: lcd.reconfigure())
+    for relay, pin_key in (
+        (relay_open, "RELAY_OPEN_PIN"),
+        (relay_close, "RELAY_CLOSE_PIN"),
+    ):
+        config.subscribe(
+            (pin_key,),
+            lambda keys, relay=relay, pin_key=pin_key: reconfigure_relay(relay, pin_key),
+        )
+    for sensor, key_prefix in (
+        (temp_sensor, "TEMP_SENSOR"),
+        (temp_sensor_2, "TEMP_SENSOR_2"),
+    ):
+        config.subscribe(
+            (f"{key_prefix}_PIN", f"{key_prefix}_TYPE", f"{key_prefix}_RESOLUTION_BIT"),
+            lambda keys, sensor=sensor, key_prefix=key_prefix: reconfigure_temp_sensor(
+                sensor, key_prefix
+            ),
+        )
+        config.subscribe(TEMP_KEYS, lambda keys, sensor=sensor: sensor.configure())
+
+
+async def initialize_devices():
+    """Initialize all devices concurrently.
+
+    Only the devices required for regulation (both relays and the first
+    temperature sensor) are awaited.  The LCD, the LED and the second
+    temperature sensor continue to initialize in the background so that the
+    control loop can start as early as possible.  Afterwards the devices
+    follow changes of their configuration without a reset.
+
+    Returns:
+        bool: ``True`` if all devices required for regulation are initialized.
+    """
+
+    # Devices not required for regulation
+    for name, device, initialize in (
+        ("lcd", lcd, lcd.initialize()),
+        ("led", led, led.initialize()),
+        (
+            "temp_sensor_2",
+            temp_sensor_2,
+            initialize_temp_sensor(temp_sensor_2, "TEMP_SENSOR_2", 2),
+        ),
+    ):
+        asyncio.create_task(timed_initialize(name, device, initialize))
+
+    # Devices required for regulation
+    results = await asyncio.gather(
+        timed_initialize(
+            "relay_open", relay_open, initialize_relay(relay_open, "RELAY_OPEN_PIN")
+        ),
+        timed_initialize(
+            "relay_close",
+            relay_close,
+            initialize_relay(relay_close, "RELAY_CLOSE_PIN"),
+        ),
+        timed_initialize(
+            "temp_sensor",
+            temp_sensor,
+            initialize_temp_sensor(temp_sensor, "TEMP_SENSOR", 1),
+        ),
+    )
+    subscribe_devices()
+
+    return all(results)
@@ -1,15 +1,67 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
 import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
 from machine import Pin  # https://docs.micropython.org/en/latest/library/machine.html
 from onewire import OneWire  # OneWire
 from ds18x20 import DS18X20  # DS180B20
-from dht import DHT11  # DHT11
-from utils.log import log  # logging function
+from utils.log import log, INFO, VERBOSE, WARN  # logging function
+from utils.metrics import metrics, COUNTER, GAUGE  # Metrics() instance
+from utils.gc_manager import gc_manager  # GcManager() instance
+from utils.supervisor import supervisor  # Supervisor() instance
 from src.config import config  # Config() instance
 from src.rlock import Rlock  # re-entrant asyncio.Lock()
+from src.relay import Relay, relay_open  # Relay() instance
+from src.checkpoint import checkpoint  # Checkpoint() instance
+from src.validator import (
+    SampleValidator,
+    SAMPLE_VALID,
+    SAMPLE_NAMES,
+    VALIDATOR_KEYS,
+)  # plausibility check
+from src.filter import TempFilter, FILTER_KEYS  # filter pipeline
+
+# Heartbeat of the sensor reads
+SENSOR_TASK = supervisor.register("sensor", 120000)
+
+# Reads of the scratchpad after a CRC error, the conversion is not repeated
+CRC_RETRIES = 2
+
+# Oldest value of the reference sensor used for the cross-check
+REFERENCE_MAX_AGE_MS = 300000
+
+# Resolution far from the band edges, 94 ms per conversion
+LOW_RESOLUTION = 9
+
+# Extra distance before returning to the low resolution, one 9 bit step
+RESOLUTION_HYSTERESIS = 0.5
+
+# Configuration keys applied by TempSensor.configure()
+TEMP_KEYS = VALIDATOR_KEYS + FILTER_KEYS + ("temp_resolution_adaptive", "temp_resolution_margin")
 
 
 class TempSensor:
-    """Abstraction for temperature sensors with per-pin singleton behavior."""
+    """Abstraction for temperature sensors with per-pin singleton behavior.
+
+    Every reading passes the :class:`SampleValidator` of the sensor before it
+    is written to ``current_temp``.  A rejected sample is replaced by the last
+    accepted value, after ``temp_max_rejects`` rejections in a row the sensor
+    reads ``-127.0`` like a failed read.  The first sensor is cross-checked
+    against the ``reference`` sensor measuring the hot water supply.
+    Accepted samples pass the :class:`TempFilter` pipeline.
+
+    The first sensor follows the relays (see :meth:`relay_changed`) and counts
+    the valve pulses that should change its reading.  A reading unchanged
+    across ``temp_stuck_pulses`` of them is logged and flagged by the
+    ``sensor_stuck`` gauge, the regulation goes on with it.
+
+    With ``temp_resolution_adaptive`` the first sensor converts with 9 bit
+    (94 ms) while the temperature is more than ``temp_resolution_margin``
+    away from both band edges and with the configured resolution near them,
+    where the next relay pulse is decided.
+
+    Only :meth:`get_temp` and :meth:`reconfigure` take the lock: the DS18X20
+    conversion is awaited and neither a second read nor a new configuration
+    may touch the bus meanwhile.
+    """
 
     _instances = {}
     count = 0
@@ -31,10 +83,26 @@ class TempSensor:
         #   12   0,00626 °C   750,00 ms
         instance.resolution_time = 375
         instance.lock = Rlock()
+        instance.configured_resolution = 11
+        instance.adaptive_resolution = False
+        instance.resolution_margin = 1.0
+        instance.validator = SampleValidator()
+        instance.filter = TempFilter()
+        instance.reference = None
+        instance.min_temp = 42.0
+        instance.max_temp = 58.0
+        instance.pulse_expected = False
+        instance.reads_metric = None
+        instance.failures_metric = None
+        instance.latency_metric = None
+        instance.latency_total_metric = None
+        instance.crc_retries_metric = None
+        instance.rejected_metrics = None
+        instance.stuck_metric = None
         instance.initialized = False
         return instance
 
-    async def initialize(self, pin_number, resolution=11, type="ds18x20"):
+    async def initialize(self, pin_number, resolution=11, type="ds18x20", number=None):
         """Initialize the sensor on ``pin_number`` with a given resolution.
 
         If a sensor for the pin already exists the existing instance is
@@ -44,6 +112,9 @@ class TempSensor:
             pin_number (int): GPIO pin the sensor is connected to.
             resolution (int): Desired resolution for DS18X20 sensors.
             type (str): Sensor type identifier.
+            number (int, optional): Fixed sensor number used for the config
+                postfix (e.g. ``current_temp_2``). Required when sensors are
+                initialized concurrently. Defaults to the initialization order.
 
         Returns:
             TempSensor | None: Initialized instance or ``None`` on error.
@@ -65,39 +136,73 @@ class TempSensor:
             return existing_instance
 
         try:
-            async with self.lock:
-                if not self.initialized:
-                    self.pin_number = pin_number
-                    self.pin = Pin(self.pin_number)
-                    self.type = str(type).lower()
-
-                    # Limits the resolution to valid values
-                    self.resolution = max(9, min(resolution, 12))
-
-                    # Initialize sensor with from type
-                    if self.type == "ds18x20":
-                        self.sensor = DS18X20(OneWire(self.pin))
-                    elif self.type == "dht11":
-                        self.sensor = DHT11(self.pin)
-                    else:
-                        log(
-                            "ERROR",
-                            f"TempSensor.initialize(pin={self.pin_number}, type={self.type}): failed: type is not supported",
-                        )
-                        return self
-
-                    self.resolution_time = int(750 / (2 ** (12 - self.resolution)))
-                    self.set_resolution()
-                    TempSensor._instances[pin_number] = self
-                    TempSensor.count += 1
-                    self.count = TempSensor.count
-                    self.postfix = f"_{self.count}" if self.count > 1 else ""
-                    self.initialized = True
+            if not self.initialized:
+                self.pin_number = pin_number
+                self.pin = Pin(self.pin_number)
+                self.type = str(type).lower()
+
+                # Limits the resolution to valid values
+                self.resolution = max(9, min(resolution, 12))
+                self.configured_resolution = self.resolution
+
+                # Initialize sensor with from type
+                if self.type == "ds18x20":
+                    self.sensor = DS18X20(OneWire(self.pin))
+                elif self.type == "dht11":
+                    # Imported lazily, the DHT11 driver is rarely used
+                    from dht import DHT11  # DHT11
+
+                    self.sensor = DHT11(self.pin)
+                else:
                     log(
-                        "INFO",
-                        f"TempSensor.initialize(pin={self.pin_number}, type={self.type}): successful",
+                        "ERROR",
+                        f"TempSensor.initialize(pin={self.pin_number}, type={self.type}): failed: type is not supported",
+                    )
+                    return self
+
+                self.set_resolution(self.resolution)
+                self.validator.reset()
+                await self.configure()
+                TempSensor._instances[pin_number] = self
+                TempSensor.count += 1
+                self.count = number if number else TempSensor.count
+                self.postfix = f"_{self.count}" if self.count > 1 else ""
+                # Metrics are kept when the sensor is reconfigured
+                if self.reads_metric is None:
+                    labels = f'sensor="{self.count}"'
+                    self.reads_metric = metrics.register(
+                        "sensor_reads_total", COUNTER, "Successful sensor reads", labels
+                    )
+                    self.failures_metric = metrics.register(
+                        "sensor_failures_total", COUNTER, "Failed sensor reads", labels
                     )
-                return self
+                    self.latency_metric = metrics.register(
+                        "sensor_read_latency_us", GAUGE, "Duration of the last read", labels
+                    )
+                    self.latency_total_metric = metrics.register(
+                        "sensor_read_us_total", COUNTER, "Duration of all reads", labels
+                    )
+                    self.crc_retries_metric = metrics.register(
+                        "sensor_crc_retries_total", COUNTER, "Scratchpad reads repeated", labels
+                    )
+                    self.rejected_metrics = [
+                        metrics.register(
+                            "sensor_rejected_total",
+                            COUNTER,
+                            "Samples rejected by the validator",
+                            f'{labels},reason="{name}"',
+                        )
+                        for name in SAMPLE_NAMES[1:]
+                    ]
+                    self.stuck_metric = metrics.register(
+                        "sensor_stuck", GAUGE, "Reading unchanged across valve pulses", labels
+                    )
+                self.initialized = True
+                log(
+                    "INFO",
+                    f"TempSensor.initialize(pin={self.pin_number}, type={self.type}): successful",
+                )
+            return self
 
         except (ValueError, TypeError) as e:
             log("ERROR", f"TempSensor.initialize(): failed: {e}")
@@ -116,6 +221,10 @@ class TempSensor:
         try:
             # Limits the resolution to valid values
             self.resolution = max(9, min(resolution, 12))
+            self.resolution_time = int(750 / (2 ** (12 - self.resolution)))
+            # The DHT11 reads whole degrees and a 9 bit conversion 0.5 °C steps,
+            # a valve pulse may not change them
+            self.validator.stuck = self.type == "ds18x20" and self.resolution > LOW_RESOLUTION
 
             # Resolution only supported on ds18x20
             if self.type == "ds18x20":
@@ -149,6 +258,109 @@ class TempSensor:
                 f"TempSensor.set_resolution(pin={self.pin_number}, resolution={resolution}): failed: {e}",
             )
 
+    async def reconfigure(self, pin_number, resolution=11, type="ds18x20"):
+        """Apply changed sensor settings after a running conversion has ended.
+
+        A new resolution is written to the sensor, a new pin or type
+        initializes the sensor again.
+
+        Returns:
+            bool: ``True`` if the sensor is initialized afterwards.
+        """
+
+        async with self.lock:
+            type = str(type).lower()
+            if pin_number == self.pin_number and type == self.type:
+                resolution = max(9, min(resolution, 12))
+                if resolution != self.configured_resolution:
+                    self.configured_resolution = resolution
+                    self.set_resolution(resolution)
+                return self.initialized
+            if pin_number in TempSensor._instances:
+                log(
+                    "ERROR",
+                    f"TempSensor.reconfigure(pin={pin_number}): pin already used by another sensor",
+                )
+                return False
+
+            log(
+                "INFO",
+                f"TempSensor.reconfigure(pin={self.pin_number} -> {pin_number}, type={type})",
+            )
+            TempSensor._instances.pop(self.pin_number, None)
+            self.initialized = False
+            await self.initialize(pin_number, resolution, type, number=self.count)
+            return self.initialized
+
+    async def configure(self):
+        """Load the settings of the validator, the filter and the resolution."""
+
+        async with self.lock:
+            await self.validator.configure()
+            await self.filter.configure()
+            self.adaptive_resolution = await config.get_bool("temp_resolution_adaptive", True)
+            self.resolution_margin = await config.get_float("temp_resolution_margin", 1.0)
+            if not self.adaptive_resolution and self.resolution != self.configured_resolution:
+                self.set_resolution(self.configured_resolution)
+
+    async def adapt_resolution(self, temp):
+        """Use the low resolution unless ``temp`` is close to a band edge."""
+
+        distance = min(abs(temp - self.min_temp), abs(temp - self.max_temp))
+        margin = self.resolution_margin
+        if self.resolution != LOW_RESOLUTION:
+            margin += RESOLUTION_HYSTERESIS
+        resolution = self.configured_resolution if distance <= margin else LOW_RESOLUTION
+        if resolution != self.resolution:
+            self.set_resolution(resolution)
+
+    def relay_changed(self, relay, active):
+        """Count the valve pulses expected to change the reading, a ``Relay.on_change`` callback.
+
+        A pulse does not count if the estimated valve position is at the end
+        stop it drives to, or if it drives the temperature further out of
+        the band: ``relay_open`` lowers it, ``relay_close`` raises it.
+        """
+
+        if active:
+            last = self.validator.last
+            if relay is relay_open:
+                self.pulse_expected = checkpoint.valve_position < checkpoint.valve_travel_ms and (
+                    last is None or last >= self.min_temp
+                )
+            else:
+                self.pulse_expected = checkpoint.valve_position > 0 and (
+                    last is None or last <= self.max_temp
+                )
+        elif self.pulse_expected:
+            self.pulse_expected = False
+            self.validator.moved()
+
+    def read_scratchpad(self, rom):
+        """Read the converted temperature, retrying on a CRC error."""
+
+        for attempt in range(CRC_RETRIES + 1):
+            try:
+                return self.sensor.read_temp(rom)
+            except Exception as e:
+                # A disturbed transfer, the scratchpad still holds the value
+                if attempt == CRC_RETRIES or "CRC" not in str(e):
+                    raise
+                metrics.inc(self.crc_retries_metric)
+
+    def reference_temp(self):
+        """Return the recent accepted value of the ``reference`` sensor or ``None``."""
+
+        reference = self.reference
+        if reference is None or not reference.initialized:
+            return None
+        validator = reference.validator
+        if validator.last is None or validator.rejects:
+            return None
+        if time.ticks_diff(time.ticks_ms(), validator.last_ms) > REFERENCE_MAX_AGE_MS:
+            return None
+        return validator.last
+
     async def get_temp(self):
         """Read the temperature value from the sensor.
 
@@ -157,15 +369,23 @@ class TempSensor:
         """
 
         async with self.lock:
+            # A read hanging in the conversion holds the lock and stops the beats
+            supervisor.beat(SENSOR_TASK)
             try:
                 if self.initialized:
+                    start = time.ticks_us()
                     if self.type == "ds18x20":
                         roms = self.sensor.scan()
                         if not roms:
                             raise OSError("No sensors found")
-                        self.sensor.convert_temp()
-                        await asyncio.sleep_ms(self.resolution_time)
-                        temp = self.sensor.read_temp(roms[0])
+                        # No automatic collection between conversion and read
+                        gc_manager.enter_critical()
+                        try:
+                            self.sensor.convert_temp()
+                            await asyncio.sleep_ms(self.resolution_time)
+                            temp = self.read_scratchpad(roms[0])
+                        finally:
+                            gc_manager.exit_critical()
 
                     elif self.type == "dht11":
                         self.sensor.measure()
@@ -174,15 +394,63 @@ class TempSensor:
                     else:
                         raise ValueError("sensor type not supported")
 
-                    temp = round(float(temp), 1)
+                    latency = time.ticks_diff(time.ticks_us(), start)
+                    metrics.inc(self.reads_metric)
+                    metrics.set(self.latency_metric, latency)
+                    metrics.inc(self.latency_total_metric, latency)
+
+                    temp = float(temp)
+                    now = time.ticks_ms()
+                    # Only the first sensor is compared with the band
+                    if self.count == 1:
+                        self.min_temp = await config.get_float("nominal_min_temp", 42.0)
+                        self.max_temp = await config.get_float("nominal_max_temp", 58.0)
+                    result = self.validator.check(temp, now, self.reference_temp())
+                    if result != SAMPLE_VALID:
+                        metrics.inc(self.rejected_metrics[result - 1])
+                        log(
+                            WARN,
+                            "TempSensor.get_temp(pin={}): rejected {}°C: {}",
+                            self.pin_number,
+                            temp,
+                            SAMPLE_NAMES[result],
+                        )
+                        if self.validator.faulted():
+                            raise ValueError(f"implausible samples: {SAMPLE_NAMES[result]}")
+                        # Hold the last value
+                        if self.filter.output is not None:
+                            temp = self.filter.output
+                        else:
+                            temp = self.validator.last
+                    else:
+                        temp = self.filter.update(temp, now, self.resolution)
+                        if self.adaptive_resolution and self.count == 1 and self.type == "ds18x20":
+                            await self.adapt_resolution(temp)
+
+                    # A stuck reading is a hint only, the valve may be at a stop unknown to the estimate
+                    stuck = self.validator.stuck_reading()
+                    if stuck != bool(metrics.get(self.stuck_metric)):
+                        metrics.set(self.stuck_metric, int(stuck))
+                        log(
+                            WARN if stuck else INFO,
+                            "TempSensor.get_temp(pin={}): reading {}",
+                            self.pin_number,
+                            "stuck" if stuck else "moving again",
+                        )
+
+                    temp = round(temp, 1)
                     await config.set(f"current_temp{self.postfix}", temp)
                     log(
-                        "VERBOSE",
-                        f"TempSensor.get_temp(pin={self.pin_number}): temp = {temp}°C",
+                        VERBOSE,
+                        "TempSensor.get_temp(pin={}): temp = {}°C",
+                        self.pin_number,
+                        temp,
                     )
                     return temp
 
             except Exception as e:
+                if self.failures_metric is not None:
+                    metrics.inc(self.failures_metric)
                 await config.set(f"current_temp{self.postfix}", -127.0)
                 log(
                     "ERROR",
@@ -197,31 +465,35 @@ class TempSensor:
             float: Relative humidity or ``-1`` when unavailable or on error.
         """
 
-        async with self.lock:
-            try:
-                if self.initialized:
-                    if self.type == "dht11":
-                        humidity = self.sensor.humidity()
-
-                    else:
-                        raise ValueError("sensor does not support humidity")
+        try:
+            if self.initialized:
+                if self.type == "dht11":
+                    humidity = self.sensor.humidity()
 
-                    humidity = round(humidity, 0)
-                    await config.set(f"current_humidity{self.postfix}", humidity)
-                    log(
-                        "VERBOSE",
-                        f"TempSensor.get_humidity(pin={self.pin_number}): humidity = {humidity}g/m",
-                    )
-                    return humidity
+                else:
+                    raise ValueError("sensor does not support humidity")
 
-            except Exception as e:
-                await config.set(f"current_humidity{self.postfix}", -1)
+                humidity = round(humidity, 0)
+                await config.set(f"current_humidity{self.postfix}", humidity)
                 log(
-                    "ERROR",
-                    f"TempSensor.get_humidity(pin={self.pin_number}): failed: {e}",
+                    "VERBOSE",
+                    f"TempSensor.get_humidity(pin={self.pin_number}): humidity = {humidity}g/m",
                 )
-                return -1
+                return humidity
+
+        except Exception as e:
+            await config.set(f"current_humidity{self.postfix}", -1)
+            log(
+                "ERROR",
+                f"TempSensor.get_humidity(pin={self.pin_number}): failed: {e}",
+            )
+            return -1
 
 
 temp_sensor = TempSensor()
 temp_sensor_2 = TempSensor()
+
+# The mixed water of the first sensor follows the valve and is never hotter
+# than the supply measured by the second
+temp_sensor.reference = temp_sensor_2
+Relay.on_change(temp_sensor.relay_changed)
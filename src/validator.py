@@ -0,0 +1,172 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+from array import array  # https://docs.micropython.org/en/latest/library/array.html
+from src.config import config  # Config() instance
+
+# Results of a check, a sample is rejected from SAMPLE_RANGE on
+SAMPLE_VALID = 0
+SAMPLE_RANGE = 1
+SAMPLE_POWER_ON = 2
+SAMPLE_RATE = 3
+SAMPLE_SPIKE = 4
+SAMPLE_CROSS = 5
+SAMPLE_NAMES = ("valid", "range", "power_on", "rate", "spike", "cross")
+
+# Measuring range of the DS18B20
+MIN_TEMP = -55.0
+MAX_TEMP = 125.0
+
+# Value of the scratchpad after power-on, read if the conversion did not run
+POWER_ON_TEMP = 85.0
+
+# Configuration keys of the limits
+VALIDATOR_KEYS = (
+    "temp_max_rate",
+    "temp_spike",
+    "temp_stuck_pulses",
+    "temp_cross_margin",
+    "temp_max_rejects",
+)
+
+
+def median3(a, b, c):
+    """Return the median of three values without sorting."""
+
+    if a > b:
+        a, b = b, a
+    return min(b, max(a, c))
+
+
+class SampleValidator:
+    """Streaming plausibility check of the samples of one temperature sensor.
+
+    Every sample passes :meth:`check`, which keeps a constant amount of state:
+    the last three samples, the last accepted value and the run of identical
+    readings.  A sample is rejected if it
+
+    - lies outside the measuring range of the DS18B20,
+    - reads exactly 85 °C, the power-on value of the scratchpad, while the
+      last accepted value is not close to it,
+    - deviates more than ``temp_spike`` from the median of the last three
+      samples (a single spike never moves the median, a real step does with
+      the second sample),
+    - changes faster than ``temp_max_rate`` °C/s since the last accepted value,
+    - is higher than the ``reference`` (the hot water supply measured by the
+      second sensor) plus ``temp_cross_margin``, as the mixed water can not
+      be hotter than the supply.
+
+    A rejected sample is replaced by the last accepted value until
+    ``temp_max_rejects`` samples in a row were rejected, then the sensor
+    counts as faulted (see :meth:`faulted`).
+
+    A reading that has not changed although the valve was moved
+    ``temp_stuck_pulses`` times (see :meth:`moved`) is only flagged by
+    :meth:`stuck_reading`, not rejected: the owner of the validator counts
+    the pulses, and a valve against its end stop or a supply too cold for the
+    band leave a healthy reading unchanged as well.
+
+    Args:
+        stuck (bool): Detect stuck readings, off for sensors with a coarse
+            resolution that a valve pulse does not change.
+    """
+
+    def __init__(self, stuck=True):
+        self.samples = array("f", (0.0, 0.0, 0.0))
+        self.count = 0
+        self.index = 0
+        self.last = None
+        self.last_ms = 0
+        self.previous = None
+        self.same_pulses = 0
+        self.pulses = 0
+        self.rejects = 0
+        self.stuck = stuck
+        self.max_rate = 1.0
+        self.spike = 2.0
+        self.stuck_pulses = 3
+        self.cross_margin = 5.0
+        self.max_rejects = 3
+
+    async def configure(self):
+        """Load the limits, ``0`` disables a check."""
+
+        self.max_rate = await config.get_float("temp_max_rate", 1.0)
+        self.spike = await config.get_float("temp_spike", 2.0)
+        self.stuck_pulses = await config.get_int("temp_stuck_pulses", 3)
+        self.cross_margin = await config.get_float("temp_cross_margin", 5.0)
+        self.max_rejects = max(1, await config.get_int("temp_max_rejects", 3))
+
+    def reset(self):
+        """Forget the history, e.g. after the sensor was replaced."""
+
+        self.count = self.index = self.rejects = 0
+        self.last = self.previous = None
+
+    def moved(self):
+        """Count a finished valve pulse that was expected to change the reading."""
+
+        self.pulses += 1
+
+    def stuck_reading(self):
+        """Return ``True`` if the reading did not change across ``temp_stuck_pulses`` pulses."""
+
+        return self.stuck and 0 < self.stuck_pulses <= self.pulses - self.same_pulses
+
+    def faulted(self):
+        """Return ``True`` if there is no accepted value to hold."""
+
+        return self.last is None or self.rejects >= self.max_rejects
+
+    def check(self, value, now_ms, reference=None):
+        """Check ``value`` read at ``now_ms`` and return ``SAMPLE_VALID`` or the reason.
+
+        Args:
+            value (float): Raw reading in °C.
+            now_ms (int): ``time.ticks_ms()`` of the reading.
+            reference (float, optional): Upper bound measured by another sensor.
+
+        Returns:
+            int: ``SAMPLE_VALID`` or one of the ``SAMPLE_*`` rejection reasons.
+        """
+
+        result = self.classify(value, now_ms, reference)
+        if result == SAMPLE_VALID:
+            self.last, self.last_ms = value, now_ms
+            self.rejects = 0
+        else:
+            self.rejects += 1
+        return result
+
+    def classify(self, value, now_ms, reference):
+        if not MIN_TEMP <= value <= MAX_TEMP:
+            return SAMPLE_RANGE
+
+        # A lost conversion reads 85.0 exactly, a real 85 °C is approached
+        if value == POWER_ON_TEMP and (
+            self.last is None or abs(self.last - POWER_ON_TEMP) > max(1.0, self.spike)
+        ):
+            return SAMPLE_POWER_ON
+
+        # Run of identical readings across valve pulses
+        if value != self.previous:
+            self.previous = value
+            self.same_pulses = self.pulses
+
+        # Rejected samples enter the window too, so a real step moves the median
+        samples = self.samples
+        samples[self.index] = value
+        self.index = (self.index + 1) % 3
+        self.count = min(3, self.count + 1)
+        if self.spike > 0 and self.count == 3:
+            if abs(value - median3(samples[0], samples[1], samples[2])) > self.spike:
+                return SAMPLE_SPIKE
+
+        if self.max_rate > 0 and self.last is not None:
+            seconds = time.ticks_diff(now_ms, self.last_ms) / 1000
+            if abs(value - self.last) > self.spike + self.max_rate * seconds:
+                return SAMPLE_RATE
+
+        if self.cross_margin > 0 and reference is not None:
+            if value > reference + self.cross_margin:
+                return SAMPLE_CROSS
+
+        return SAMPLE_VALID
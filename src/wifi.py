@@ -1,12 +1,68 @@
-import network
+import random  # https://docs.micropython.org/en/latest/library/random.html
 import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
-from utils.log import log  # logging function
+from utils.log import log, INFO  # logging function
+from utils.metrics import metrics, COUNTER, GAUGE  # Metrics() instance
+from utils.supervisor import supervisor  # Supervisor() instance
 from src.config import config  # Config() instance
 from src.lcd import lcd  # LCD() instance
+from src.captive_portal import captive_portal  # CaptivePortal() instance
+
+# Connection states
+STATE_DISABLED = 0
+STATE_DISCONNECTED = 1
+STATE_CONNECTING = 2
+STATE_CONNECTED = 3
+STATE_BACKOFF = 4
+
+# Interval of the link check while connected
+CHECK_INTERVAL_MS = 5000
+
+# Interval of the status polls while connecting
+CONNECT_POLL_MS = 500
+
+# First delay after a failed connection attempt, doubled on every failure
+BACKOFF_MIN_MS = 2000
+
+# Shortest password accepted for a WPA2 access point
+AP_PASSWORD_MIN_LENGTH = 8
+
+WIFI_CONNECTED = metrics.register("wifi_connected", GAUGE, "WiFi link state")
+WIFI_RSSI = metrics.register("wifi_rssi_dbm", GAUGE, "Signal strength of the WiFi link")
+WIFI_CONNECTS = metrics.register(
+    "wifi_connects_total", COUNTER, "Successful WiFi connections"
+)
+WIFI_FAILURES = metrics.register(
+    "wifi_connect_failures_total", COUNTER, "Failed WiFi connection attempts"
+)
+WIFI_AP_ACTIVE = metrics.register(
+    "wifi_ap_active", GAUGE, "Fallback access point state"
+)
+
+# Heartbeat of the state machine, waits are announced with each beat
+WIFI_TASK = supervisor.register("wifi", 30000)
 
 
 class WiFi:
-    """Singleton that manages the device's WiFi connection."""
+    """Singleton that manages the device's WiFi connection.
+
+    :meth:`run` is a state machine that connects, watches the link and
+    reconnects after a loss.  Failed attempts are retried with an exponential
+    backoff (``BACKOFF_MIN_MS`` doubled per failure up to ``wifi_backoff_max``
+    seconds) and a random jitter of up to half the delay, so devices do not
+    reconnect in lockstep after an access point reboot.  All waits are
+    ``uasyncio`` sleeps, other tasks keep running while connecting.
+
+    The link state and RSSI are cached by the state machine, so
+    :meth:`is_connected` does not query the hardware.  Callbacks registered
+    with :meth:`on_connect` and :meth:`on_disconnect` are called on every
+    change of the link state.
+
+    After ``wifi_ap_fallback_attempts`` failed attempts in a row the device
+    opens its own access point with a captive DNS responder, so the WiFi
+    credentials can be entered on ``/wifi`` from a phone.  The station keeps
+    retrying in the background and the access point is closed as soon as the
+    link is established.
+    """
 
     _instance = None
 
@@ -19,11 +75,22 @@ class WiFi:
     def __init__(self):
         if not self.initialized:
             self.wifi = None
+            self.ap = None
+            self.ap_active = False
+            self.ap_fallback_attempts = 3
             self.wifi_is_activated = False
             self.ssid = None
             self.password = None
             self.max_attempts = 10
+            self.backoff_max_ms = 300000
             self.show_message = 1
+            self.state = STATE_DISABLED
+            self.connected = False
+            self.rssi = 0
+            self.failures = 0
+            self.connect_callbacks = []
+            self.disconnect_callbacks = []
+            self.wake = asyncio.Event()
             self.initialized = False
 
     async def initialize(self):
@@ -32,78 +99,253 @@ class WiFi:
         if self.initialized:
             return
         try:
+            # Imported lazily so the network stack is not loaded during boot
+            import network  # https://docs.micropython.org/en/latest/library/network.html
+
             self.wifi = network.WLAN(network.STA_IF)
             self.wifi_is_activated = True
             network.country(await config.get("wifi_country", "DE"))
             self.ssid = await config.get("wifi_ssid", "ssid")
             self.password = await config.get("wifi_password", "password")
             self.max_attempts = await config.get_int("wifi_max_attempts", 10)
+            self.backoff_max_ms = await config.get_int("wifi_backoff_max", 300) * 1000
+            self.ap_fallback_attempts = await config.get_int(
+                "wifi_ap_fallback_attempts", 3
+            )
+            self.state = STATE_DISCONNECTED
+            # Connect with credentials entered on the web interface right away
+            config.subscribe(
+                ("wifi_ssid", "wifi_password"), lambda keys: self.reconnect()
+            )
             log("INFO", "WiFi.initialize(): successful")
             self.initialized = True
 
         except Exception as e:
             log("ERROR", f"WiFi.initialize(): failed: {e}")
 
+    def on_connect(self, callback):
+        """Call ``callback()`` whenever the link is established.
+
+        Coroutine functions are started as a new task.
+        """
+
+        self.connect_callbacks.append(callback)
+
+    def on_disconnect(self, callback):
+        """Call ``callback()`` whenever the link is lost."""
+
+        self.disconnect_callbacks.append(callback)
+
+    def notify(self, callbacks):
+        for callback in callbacks:
+            try:
+                result = callback()
+                # Coroutine functions return a coroutine (a generator on MicroPython)
+                if result is not None and hasattr(result, "send"):
+                    asyncio.create_task(result)
+            except Exception as e:
+                log("ERROR", f"WiFi.notify(): failed: {e}")
+
+    def set_connected(self, connected):
+        """Update the cached link state and notify the callbacks on a change."""
+
+        if connected == self.connected:
+            return
+        self.connected = connected
+        metrics.set(WIFI_CONNECTED, 1 if connected else 0)
+        if connected:
+            self.state = STATE_CONNECTED
+            self.failures = 0
+            self.stop_access_point()
+            metrics.inc(WIFI_CONNECTS)
+            self.update_rssi()
+            log(INFO, "WiFi.connected(ssid={}, rssi={})", self.ssid, self.rssi)
+            self.notify(self.connect_callbacks)
+        else:
+            self.state = STATE_DISCONNECTED
+            self.rssi = 0
+            metrics.set(WIFI_RSSI, 0)
+            log("WARN", "WiFi.disconnected()")
+            self.notify(self.disconnect_callbacks)
+
+    def update_rssi(self):
+        try:
+            self.rssi = self.wifi.status("rssi")
+            metrics.set(WIFI_RSSI, self.rssi)
+        except Exception:
+            # Not every port reports the RSSI
+            pass
+
+    def backoff_ms(self):
+        """Return the delay before the next attempt after ``self.failures`` failures."""
+
+        delay = BACKOFF_MIN_MS << min(self.failures - 1, 16)
+        delay = min(delay, self.backoff_max_ms)
+        # Equal jitter: keep half of the delay, randomize the other half
+        half = delay // 2
+        return half + (half * random.getrandbits(8) >> 8)
+
+    async def start_access_point(self):
+        """Open the fallback access point and start the captive DNS responder."""
+
+        if self.ap_active:
+            return
+        try:
+            import network  # https://docs.micropython.org/en/latest/library/network.html
+            from machine import unique_id  # https://docs.micropython.org/en/latest/library/machine.html#machine.unique_id
+
+            # Suffix from the chip id so several devices can be told apart
+            ssid = await config.get("wifi_ap_ssid", "HotWater")
+            ssid = f"{ssid}-{unique_id()[-2:].hex().upper()}"
+            password = await config.get("wifi_ap_password", "hotwater")
+
+            self.ap = network.WLAN(network.AP_IF)
+            if password and len(password) >= AP_PASSWORD_MIN_LENGTH:
+                self.ap.config(essid=ssid, password=password, security=3)
+            else:
+                self.ap.config(essid=ssid, security=0)
+            self.ap.active(True)
+            self.ap_active = True
+            metrics.set(WIFI_AP_ACTIVE, 1)
+
+            ip = self.ap.ifconfig()[0]
+            captive_portal.start(ip)
+            log("WARN", f"WiFi.start_access_point(ssid={ssid}, ip={ip})")
+            await lcd.print(2, 0, f"AP {ssid}")
+
+        except Exception as e:
+            log("ERROR", f"WiFi.start_access_point(): failed: {e}")
+
+    def stop_access_point(self):
+        """Close the fallback access point."""
+
+        if not self.ap_active:
+            return
+        captive_portal.stop()
+        try:
+            self.ap.active(False)
+        except OSError as e:
+            log("ERROR", f"WiFi.stop_access_point(): failed: {e}")
+        self.ap_active = False
+        metrics.set(WIFI_AP_ACTIVE, 0)
+        log(INFO, "WiFi.stop_access_point()")
+
+    def reconnect(self):
+        """Retry with the saved credentials now instead of after the backoff."""
+
+        self.failures = 0
+        self.wake.set()
+
     async def connect(self):
-        """Attempt to connect to the configured WiFi network."""
+        """Attempt to connect to the configured WiFi network once.
 
-        if self.wifi_is_activated:
-            log("INFO", f"WiFi.connect(ssid={self.ssid})")
+        Returns:
+            bool: ``True`` if the link is established.
+        """
+
+        if not self.wifi_is_activated:
+            return False
+
+        if self.ssid is None:
+            log("ERROR", f"WiFi.connect(): no SSID found")
+            await lcd.print(2, 0, "keine SSID gefunden!")
+            self.wifi_is_activated = False
+            self.state = STATE_DISABLED
+            return False
 
-            if self.ssid is not None:
+        # Credentials may have been changed on the WiFi setup page
+        self.ssid = await config.get("wifi_ssid", self.ssid)
+        self.password = await config.get("wifi_password", self.password)
 
-                # Activate and Connect WiFi
+        log(INFO, "WiFi.connect(ssid={}, attempt={})", self.ssid, self.failures + 1)
+        self.state = STATE_CONNECTING
+        if self.show_message >= 1 and not self.ap_active:
+            await lcd.print(2, 0, "verbinde WLAN ...")
+
+        # Activate and connect WiFi, the driver connects in the background
+        try:
+            self.wifi.active(True)
+            if self.failures:
+                # Abort the previous attempt before retrying
                 try:
-                    self.wifi.active(True)
-                    self.wifi.connect(self.ssid, self.password)
-                except OSError as e:
-                    log("ERROR", f"WiFi.connect(): failed: {e}")
-                    log("INFO", "WiFi.wifi_is_activated(False)")
-                    self.wifi_is_activated = False
-
-                # Wait until connection is established
-                attempts = 0
-                while (
-                    self.wifi_is_activated
-                    and not self.wifi.isconnected()
-                    and attempts < self.max_attempts
-                ):
-                    await asyncio.sleep(1)
-                    attempts += 1
-                    await lcd.print(2, 0, "verbinde WLAN ... {:02d}".format(attempts))
+                    self.wifi.disconnect()
+                except OSError:
+                    pass
+            self.wifi.connect(self.ssid, self.password)
+        except OSError as e:
+            log("ERROR", f"WiFi.connect(): failed: {e}")
+            log("INFO", "WiFi.wifi_is_activated(False)")
+            self.wifi_is_activated = False
+            self.state = STATE_DISABLED
+            return False
+
+        # Wait until the connection is established or max_attempts seconds passed
+        waited = 0
+        while not self.wifi.isconnected() and waited < self.max_attempts * 1000:
+            await asyncio.sleep_ms(CONNECT_POLL_MS)
+            waited += CONNECT_POLL_MS
+
+        if self.wifi.isconnected():
+            self.set_connected(True)
+            if self.show_message >= 1:
+                log("INFO", f"WiFi.wifi.ifconfig(): {self.wifi.ifconfig()}")
+                await lcd.print(2, 0, "WLAN wurde verbunden")
+                await asyncio.sleep(3)
+                await lcd.print(2, 0, " ")
+            self.show_message = 0
+            return True
+
+        self.failures += 1
+        self.state = STATE_BACKOFF
+        metrics.inc(WIFI_FAILURES)
+        log("WARN", f"WiFi.connect(): failed, attempt {self.failures}")
+        if self.show_message >= 1 and not self.ap_active:
+            await lcd.print(2, 0, "WLAN nicht verbunden")
+        return False
 
+    async def run(self):
+        """Connect and keep the connection alive, runs forever."""
+
+        await self.initialize()
+
+        while self.wifi_is_activated:
+            # Covers the link check as well as a connection attempt
+            supervisor.beat(WIFI_TASK, max(CHECK_INTERVAL_MS, self.max_attempts * 1000))
+            if self.state == STATE_CONNECTED:
+                await asyncio.sleep_ms(CHECK_INTERVAL_MS)
                 if self.wifi.isconnected():
-                    if self.show_message >= 1:
-                        log("INFO", f"WiFi.wifi.ifconfig(): {self.wifi.ifconfig()}")
-                        await lcd.print(2, 0, "WLAN wurde verbunden")
-                        await asyncio.sleep(3)
-                    self.show_message = 0
+                    self.update_rssi()
                 else:
-                    log("WARN", "WiFi.connect(): failed")
-                    await lcd.print(2, 0, "WLAN nicht verbunden")
-            else:
-                log("ERROR", f"WiFi.connect(): no SSID found")
-                await lcd.print(2, 0, "keine SSID gefunden!")
-                self.wifi_is_activated = False
+                    self.set_connected(False)
 
-            await asyncio.sleep(5)
-            await lcd.print(2, 0, " ")
+            elif not await self.connect() and self.wifi_is_activated:
+                if 0 < self.ap_fallback_attempts <= self.failures:
+                    await self.start_access_point()
+                delay = self.backoff_ms()
+                log(INFO, "WiFi.run(): retry in {} ms", delay)
+                supervisor.beat(WIFI_TASK, delay)
+                # reconnect() ends the wait early
+                self.wake.clear()
+                try:
+                    await asyncio.wait_for_ms(self.wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                if self.show_message >= 1 and not self.ap_active:
+                    await lcd.print(2, 0, " ")
+
+        self.state = STATE_DISABLED
+        self.set_connected(False)
+        supervisor.pause(WIFI_TASK)
 
     def is_activated(self):
         """Return whether the WiFi interface is enabled."""
 
-        log("INFO", f"WiFi.is_activated()")
         return self.wifi_is_activated
 
     def is_connected(self):
-        """Check the current WiFi connection status."""
+        """Return the link state cached by :meth:`run`."""
 
-        try:
-            log("INFO", f"WiFi.is_connected(): {self.wifi.isconnected()}")
-            return self.wifi.isconnected()
-        except Exception as error:
-            log("ERROR", f"WiFi.is_connected(): failed: {error}")
-            return False
+        return self.connected
 
 
 wifi = WiFi()
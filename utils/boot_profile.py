@@ -0,0 +1,59 @@
+import gc  # https://docs.micropython.org/en/latest/library/gc.html
+import time  # https://docs.micropython.org/en/latest/library/time.html
+
+
+class BootProfile:
+    """Singleton that records timestamps and free heap during boot.
+
+    ``mark()`` is called after each expensive step (e.g. a module import) and
+    stores the time elapsed since the previous mark together with the free
+    heap.  The log level is not known while modules are still being imported,
+    so the collected marks are only printed by :meth:`report` once logging has
+    been initialized.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(BootProfile, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.start_us = time.ticks_us()
+            self.last_us = self.start_us
+            self.marks = []
+            self.initialized = True
+
+    def mark(self, name):
+        """Record the duration since the previous mark under ``name``.
+
+        Args:
+            name (str): Label of the finished boot step.
+        """
+
+        now_us = time.ticks_us()
+        self.marks.append((name, time.ticks_diff(now_us, self.last_us), gc.mem_free()))
+        self.last_us = now_us
+
+    def total_ms(self):
+        """Return the milliseconds elapsed since the profile was created."""
+
+        return time.ticks_diff(self.last_us, self.start_us) // 1000
+
+    def report(self):
+        """Log all recorded marks and the total boot time."""
+
+        # Imported here to keep this module free of dependencies
+        from utils.log import log
+
+        for name, duration_us, mem_free in self.marks:
+            log(
+                "INFO",
+                f"BootProfile({name}): {duration_us // 1000} ms, mem_free = {mem_free} Bytes",
+            )
+        log("INFO", f"BootProfile(total): {self.total_ms()} ms")
+
+
+boot_profile = BootProfile()
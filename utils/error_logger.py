@@ -1,33 +1,179 @@
-import os
+import struct  # https://docs.micropython.org/en/latest/library/struct.html
+import time  # https://docs.micropython.org/en/latest/library/time.html
 
+# Source ids of log records
+SOURCE_MAIN = 1
+SOURCE_WEBSERVER = 2
+SOURCE_SUPERVISOR = 3
+SOURCE_NAMES = ("-", "main", "webserver", "supervisor")
 
-def append_log(msg: str, path: str, max_size: int = 1024 * 1024) -> None:
-    """Append a message to a log file and trim it if it grows too large.
+# Codes of log records
+CODE_EXCEPTION = 1
+CODE_HEARTBEAT_MISSED = 2
+CODE_WATCHDOG_RESET = 3
+CODE_NAMES = ("-", "exception", "heartbeat_missed", "watchdog_reset")
 
-    Args:
-        msg (str): Message to be written.
-        path (str): Target file path.
-        max_size (int, optional): Maximum allowed file size in bytes.
-            Defaults to 1 MiB.
+# File header: magic, version, record size, capacity, head, count, sequence
+HEADER_FORMAT = "<4sBBHHHI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"RLOG"
+VERSION = 1
+
+# Record: sequence, timestamp, level, source, code, arguments
+RECORD_FORMAT = "<IIBBH52s"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+ARGS_SIZE = 52
+
+
+class RingLog:
+    """Fixed-size circular log file with fixed-length binary records.
 
-    Returns:
-        None
+    The file is pre-allocated with room for ``capacity`` records.  Appending
+    overwrites the oldest record in place and updates the head pointer in the
+    header, so each append writes exactly one record and one header and never
+    reads or moves existing data.  The file does not grow and the heap usage is
+    constant, which makes it safe to use right before a reset.
+
+    Args:
+        path (str): Path of the log file.
+        capacity (int): Number of records kept in the file.
     """
-    try:
-        # Append the message
-        with open(path, "a", encoding="utf-8") as file:
-            file.write(msg)
-
-        # Check file size
-        size = os.stat(path).st_size
-        if size > max_size:
-            # Keep only the last half of max_size bytes
-            with open(path, "r+", encoding="utf-8", errors="ignore") as file:
-                file.seek(size - max_size // 2)
-                data = file.read()
+
+    def __init__(self, path="/error_log.bin", capacity=128):
+        self.path = path
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+        self.sequence = 0
+        self.opened = False
+        self.header = bytearray(HEADER_SIZE)
+        self.record = bytearray(RECORD_SIZE)
+
+    def open(self):
+        """Load the header from the file or create a new pre-allocated file."""
+
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read(HEADER_SIZE)
+            # A truncated file is recreated, unpack would fail on it
+            if len(data) == HEADER_SIZE:
+                magic, version, record_size, capacity, head, count, sequence = (
+                    struct.unpack(HEADER_FORMAT, data)
+                )
+            else:
+                magic = None
+            if (
+                magic == MAGIC
+                and version == VERSION
+                and record_size == RECORD_SIZE
+                and capacity == self.capacity
+            ):
+                self.head, self.count, self.sequence = head, count, sequence
+                self.opened = True
+                return
+        except (OSError, ValueError):
+            pass
+
+        # Create (or replace an incompatible) file
+        self.head, self.count, self.sequence = 0, 0, 0
+        with open(self.path, "wb") as file:
+            file.write(self.pack_header())
+            for _ in range(self.capacity):
+                file.write(self.record)
+        self.opened = True
+
+    def pack_header(self):
+        struct.pack_into(
+            HEADER_FORMAT,
+            self.header,
+            0,
+            MAGIC,
+            VERSION,
+            RECORD_SIZE,
+            self.capacity,
+            self.head,
+            self.count,
+            self.sequence,
+        )
+        return self.header
+
+    def append(self, level, source, code=CODE_EXCEPTION, args=b""):
+        """Write a record over the oldest one.
+
+        Args:
+            level (int): Numeric log level, e.g. ``ERROR``.
+            source (int): Source id, e.g. ``SOURCE_MAIN``.
+            code (int): Record code, e.g. ``CODE_EXCEPTION``.
+            args (bytes | str): Arguments, truncated to 52 bytes.
+
+        Returns:
+            bool: ``True`` if the record was written.
+        """
+
+        try:
+            if not self.opened:
+                self.open()
+            if isinstance(args, str):
+                args = args.encode("utf-8")
+
+            self.sequence += 1
+            struct.pack_into(
+                RECORD_FORMAT,
+                self.record,
+                0,
+                self.sequence,
+                int(time.time()),
+                level,
+                source,
+                code,
+                args[:ARGS_SIZE],
+            )
+            with open(self.path, "r+b") as file:
+                file.seek(HEADER_SIZE + self.head * RECORD_SIZE)
+                file.write(self.record)
+                self.head = (self.head + 1) % self.capacity
+                self.count = min(self.count + 1, self.capacity)
                 file.seek(0)
-                file.write(data)
-                file.truncate()
-    except OSError:
-        # Ignore file system errors to avoid blocking main program
-        pass
+                file.write(self.pack_header())
+            return True
+
+        except OSError:
+            # Ignore file system errors to avoid blocking main program
+            return False
+
+    def records(self):
+        """Yield all records from the oldest to the newest.
+
+        Yields:
+            tuple: ``(sequence, timestamp, level, source, code, args)``
+        """
+
+        try:
+            if not self.opened:
+                self.open()
+            start = (self.head - self.count) % self.capacity
+            with open(self.path, "rb") as file:
+                for index in range(self.count):
+                    position = (start + index) % self.capacity
+                    file.seek(HEADER_SIZE + position * RECORD_SIZE)
+                    file.readinto(self.record)
+                    yield struct.unpack(RECORD_FORMAT, self.record)
+        except OSError:
+            return
+
+
+def format_record(record):
+    """Return a record as a single text line for the web interface."""
+
+    # Imported here, log_level is only needed for decoding
+    from utils.log_level import LOG_PREFIXES
+
+    sequence, timestamp, level, source, code, args = record
+    level_name = LOG_PREFIXES[level] if level < len(LOG_PREFIXES) else str(level)
+    source_name = SOURCE_NAMES[source] if source < len(SOURCE_NAMES) else str(source)
+    code_name = CODE_NAMES[code] if code < len(CODE_NAMES) else str(code)
+    args = args.rstrip(b"\x00").decode("utf-8", "ignore")
+    return f"{sequence} {timestamp} {level_name} {source_name} {code_name} {args}\n"
+
+
+error_log = RingLog()
@@ -0,0 +1,201 @@
+import gc  # https://docs.micropython.org/en/latest/library/gc.html
+import time  # https://docs.micropython.org/en/latest/library/time.html
+from utils.log import log, enabled, VERBOSE  # logging function
+from utils.metrics import metrics, GAUGE, GC_COLLECTIONS  # Metrics() instance
+
+# Lower limit of the automatic collection threshold
+MIN_THRESHOLD = 4096
+
+# Minimum time between two scheduled collections
+MIN_SPACING_MS = 1000
+
+# Pause assumed before the first collection was measured
+DEFAULT_PAUSE_US = 10000
+
+# Minimum time between two measurements of the largest free block
+FRAGMENTATION_SPACING_MS = 300000
+
+# Resolution of the largest free block search
+PROBE_STEP = 256
+
+GC_PAUSE = metrics.register("gc_pause_us", GAUGE, "Duration of the last collection")
+GC_THRESHOLD = metrics.register(
+    "gc_threshold_bytes", GAUGE, "Allocations that trigger an automatic collection"
+)
+GC_LARGEST_FREE = metrics.register(
+    "gc_largest_free_bytes", GAUGE, "Largest free heap block at the last check"
+)
+GC_FRAGMENTATION = metrics.register(
+    "gc_fragmentation_percent",
+    GAUGE,
+    "Free heap not usable for the largest allocation at the last check",
+)
+
+
+class GcManager:
+    """Singleton that schedules garbage collections away from timing critical code.
+
+    Instead of a full ``gc.collect()`` after every measurement or HTTP request,
+    callers :meth:`request` a collection and the main loop runs it with
+    :meth:`collect_if_idle` once the remaining time until its next deadline is
+    long enough for the last measured pause.  Requests in a burst are merged
+    into one collection.
+
+    After each collection ``gc.threshold`` is set to half of the free heap, so
+    the automatic collection of MicroPython only triggers when the scheduled
+    collections do not keep up.  It is disabled while a relay is energized or a
+    sensor conversion is running (see :meth:`enter_critical`).
+
+    The largest allocatable block is measured by :meth:`check_fragmentation`
+    after boot and when ``/metrics`` or ``/api/profile`` is scraped, never in
+    the idle window of the main loop: its probes cost several collections.
+    A scrape measures at most every ``FRAGMENTATION_SPACING_MS`` and never in
+    a critical section, otherwise it gets the last result.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(GcManager, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.pending = False
+            self.critical = 0
+            self.threshold = MIN_THRESHOLD
+            self.free_after_collect = 0
+            self.last_collect_ms = time.ticks_ms()
+            self.pause_us = DEFAULT_PAUSE_US
+            self.collections = 0
+            self.fragmentation_ms = None
+            self.initialized = False
+
+    def initialize(self):
+        """Collect once and set the threshold from the heap left after boot."""
+
+        self.collect()
+        self.check_fragmentation()
+        self.initialized = True
+
+    def request(self):
+        """Ask for a collection in the next idle window."""
+
+        self.pending = True
+
+    def enter_critical(self):
+        """Suspend automatic collections, e.g. while a relay is energized."""
+
+        self.critical += 1
+        if self.critical == 1:
+            gc.threshold(-1)
+
+    def exit_critical(self):
+        """End a section started with :meth:`enter_critical`."""
+
+        if self.critical > 0:
+            self.critical -= 1
+            if self.critical == 0:
+                gc.threshold(self.threshold)
+
+    def due(self):
+        """Return ``True`` if a collection was requested or half the threshold is used."""
+
+        if self.pending:
+            return True
+        return self.free_after_collect - gc.mem_free() >= self.threshold // 2
+
+    def collect_if_idle(self, deadline_ms=None):
+        """Collect if a collection is due and there is time for it.
+
+        Args:
+            deadline_ms (int, optional): ``time.ticks_ms()`` value of the next
+                scheduled work. The collection is skipped if the last measured
+                pause would not end well before it.
+
+        Returns:
+            bool: ``True`` if a collection was run.
+        """
+
+        if self.critical or not self.due():
+            return False
+
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self.last_collect_ms) < MIN_SPACING_MS:
+            return False
+        if (
+            deadline_ms is not None
+            and time.ticks_diff(deadline_ms, now) * 1000 < 2 * self.pause_us
+        ):
+            return False
+
+        self.collect()
+        return True
+
+    def collect(self):
+        """Run a collection now and adapt the automatic threshold."""
+
+        start = time.ticks_us()
+        gc.collect()
+        self.pause_us = time.ticks_diff(time.ticks_us(), start)
+        self.last_collect_ms = time.ticks_ms()
+        self.pending = False
+        self.collections += 1
+
+        self.free_after_collect = gc.mem_free()
+        self.threshold = max(MIN_THRESHOLD, self.free_after_collect // 2)
+        if not self.critical:
+            gc.threshold(self.threshold)
+
+        metrics.inc(GC_COLLECTIONS)
+        metrics.set(GC_PAUSE, self.pause_us)
+        metrics.set(GC_THRESHOLD, self.threshold)
+        if enabled(VERBOSE):
+            log(
+                VERBOSE,
+                "GcManager.collect(): {} us, mem_free = {} Bytes",
+                self.pause_us,
+                self.free_after_collect,
+            )
+
+    def check_fragmentation(self):
+        """Measure the largest allocatable block with a binary search.
+
+        The probes leave garbage behind, so the heap is collected again
+        afterwards. Too slow for the idle window of the main loop, it runs
+        on a scrape of ``/metrics`` or ``/api/profile`` instead.  Within
+        ``FRAGMENTATION_SPACING_MS`` of the last measurement or while a relay
+        is energized or a sensor conversion is running the last result is
+        returned.
+
+        Returns:
+            int: Largest allocatable block in bytes.
+        """
+
+        if self.critical or (
+            self.fragmentation_ms is not None
+            and time.ticks_diff(time.ticks_ms(), self.fragmentation_ms)
+            < FRAGMENTATION_SPACING_MS
+        ):
+            return metrics.get(GC_LARGEST_FREE)
+
+        free = gc.mem_free()
+        low, high = 0, free
+        while high - low > PROBE_STEP:
+            size = (low + high) // 2
+            try:
+                probe = bytearray(size)
+                del probe
+                low = size
+            except MemoryError:
+                high = size
+        gc.collect()
+        self.fragmentation_ms = time.ticks_ms()
+
+        metrics.set(GC_LARGEST_FREE, low)
+        metrics.set(GC_FRAGMENTATION, 100 - low * 100 // free if free else 0)
+        return low
+
+
+gc_manager = GcManager()
@@ -1,32 +1,77 @@
-from utils.log_level import LOG_LEVELS, log_level
+from utils.log_level import (
+    LOG_LEVELS,
+    LOG_PREFIXES,
+    OFF,
+    ERROR,
+    WARN,
+    INFO,
+    VERBOSE,
+    log_level,
+)
+from utils.log_buffer import log_buffer  # LogBuffer() instance
 
 
-def log(level="INFO", message=""):
+def enabled(level):
+    """
+    Check whether messages of the numeric ``level`` would be printed or buffered.
+
+    Use it to skip expensive work that only feeds a log message, e.g.
+    ``if enabled(VERBOSE): log(VERBOSE, "{} Bytes", gc.mem_alloc())``.
+
+    Args:
+        level (int): Numeric log level, e.g. ``VERBOSE``.
+
+    Returns:
+        bool: ``True`` if the message would be printed or buffered.
+    """
+
+    return 0 < level <= log_level.limit
+
+
+def log(level=INFO, message="", *args):
     """
     Output a message on console if the log_level set is equal or higher than the level given.
 
+    Messages up to the buffer level (``log_buffer_level``) are additionally
+    kept in the in-memory log buffer, independent of the console level.  The
+    message is only formatted when the console or the buffer records it, so
+    a message up to ``log_buffer_level`` is formatted even with the console
+    ``OFF``.  It can be a format string for ``args`` (``str.format`` syntax)
+    or a callable returning the message, so disabled messages do not build
+    any strings.
+
     Args:
-        level (str): The log level of the message, e.g. "OFF", "INFO", "VERBOSE", "WARN" or "ERROR".
-        message (str): The message text to be logged.
+        level (int | str): The log level of the message, e.g. ``INFO`` or "INFO".
+        message (str | callable): The message text, format string or callable.
+        *args: Values for the placeholders in ``message``.
 
     Returns:
         None: This function does not return a value.
     """
 
-    # Make level uppercase
-    level = str(level).upper()
-
-    # Exit early if logging is disabled or  log_level is invalid
-    if log_level.get() == "OFF" or level not in LOG_LEVELS:
+    # Exit early if neither the console nor the log buffer record anything
+    limit = log_level.limit
+    if limit == OFF:
         return
 
-    # Exit early if the message's log level is lower than the current log level
-    if LOG_LEVELS.get(level, -1) > LOG_LEVELS[log_level.get()]:
+    # Convert level names to numbers
+    if isinstance(level, str):
+        level = LOG_LEVELS.get(level) or LOG_LEVELS.get(level.upper(), -1)
+
+    # Exit early if the message's log level is invalid or higher than both levels
+    if level < 1 or level > limit:
         return
 
-    # Convert VERBOSE to INFO
-    if level == "VERBOSE":
-        level = "INFO"
+    # Format the message
+    if args:
+        message = message.format(*args)
+    elif callable(message):
+        message = message()
+
+    # Keep the log message in memory for the web interface
+    if level <= log_level.buffer_value:
+        log_buffer.append(level, message)
 
     # Print the log message
-    print(f"{level}: {message}")
+    if level <= log_level.value:
+        print(f"{LOG_PREFIXES[level]}: {message}")
@@ -0,0 +1,65 @@
+import struct  # https://docs.micropython.org/en/latest/library/struct.html
+
+# Slot: sequence, level, message length, message
+SLOT_HEADER_FORMAT = "<IBB"
+SLOT_HEADER_SIZE = 6
+
+
+class LogBuffer:
+    """Singleton ring of the most recent log messages in a preallocated buffer.
+
+    The buffer is split into ``slots`` fixed-size slots.  Each message gets a
+    sequence number and overwrites the slot of the message ``slots`` entries
+    older, so the memory usage never grows.  Messages longer than a slot are
+    truncated.  Clients fetch new messages incrementally with
+    :meth:`records` and the last sequence number they have seen.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(LogBuffer, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, slots=48, slot_size=96):
+        if not hasattr(self, "initialized"):
+            self.slots = slots
+            self.slot_size = slot_size
+            self.buffer = bytearray(slots * slot_size)
+            self.view = memoryview(self.buffer)
+            self.sequence = 0
+            self.initialized = True
+
+    def append(self, level, message):
+        """Store ``message`` with the numeric ``level`` as newest record."""
+
+        self.sequence += 1
+        offset = (self.sequence % self.slots) * self.slot_size
+        data = message.encode("utf-8") if isinstance(message, str) else message
+        length = min(len(data), self.slot_size - SLOT_HEADER_SIZE)
+        struct.pack_into(SLOT_HEADER_FORMAT, self.buffer, offset, self.sequence, level, length)
+        start = offset + SLOT_HEADER_SIZE
+        self.view[start : start + length] = memoryview(data)[:length]
+
+    def records(self, since=0):
+        """Yield the records newer than the sequence number ``since``.
+
+        Yields:
+            tuple: ``(sequence, level, message)`` with ``message`` as bytes.
+        """
+
+        first = max(since + 1, self.sequence - self.slots + 1, 1)
+        for sequence in range(first, self.sequence + 1):
+            offset = (sequence % self.slots) * self.slot_size
+            stored, level, length = struct.unpack_from(
+                SLOT_HEADER_FORMAT, self.buffer, offset
+            )
+            # Skip slots overwritten while streaming
+            if stored != sequence:
+                continue
+            start = offset + SLOT_HEADER_SIZE
+            yield sequence, level, bytes(self.view[start : start + length])
+
+
+log_buffer = LogBuffer()
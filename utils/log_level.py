@@ -1,8 +1,25 @@
-LOG_LEVELS = {"OFF": 0, "ERROR": 1, "WARN": 2, "INFO": 3, "VERBOSE": 4}
+# Numeric log levels, a message is printed if its level <= the current level
+OFF = 0
+ERROR = 1
+WARN = 2
+INFO = 3
+VERBOSE = 4
+
+LOG_LEVELS = {"OFF": OFF, "ERROR": ERROR, "WARN": WARN, "INFO": INFO, "VERBOSE": VERBOSE}
+
+# Prefix printed per numeric level (VERBOSE is printed as INFO)
+LOG_PREFIXES = ("OFF", "ERROR", "WARN", "INFO", "INFO")
 
 
 class LogLevel:
-    """Singleton that stores and updates the current log level."""
+    """Singleton that stores and updates the current log level.
+
+    The level is kept as name (``level``) for the web interface and as number
+    (``value``) so that :func:`utils.log.log` can compare it without string
+    operations.  ``buffer_value`` is the level recorded in the in-memory log
+    buffer and ``limit`` the higher of both, i.e. the highest level that has
+    to be formatted at all.
+    """
 
     _instance = None
 
@@ -14,9 +31,13 @@ class LogLevel:
     def __init__(self):
         if not hasattr(self, "initialized"):
             self.level = "OFF"
+            self.value = OFF
+            self.buffer_level = "WARN"
+            self.buffer_value = WARN
+            self.limit = WARN
             self.initialized = False
 
-    def initialize(self, level):
+    def initialize(self, level, buffer_level=None):
         """Initialize the log level from a configuration value."""
 
         if self.initialized:
@@ -25,14 +46,22 @@ class LogLevel:
         try:
             if str(level).upper() in LOG_LEVELS:
                 self.level = str(level).upper()
+                self.value = LOG_LEVELS[self.level]
                 print(f"INFO: LogLevel.initialize({level}): successful")
                 self.initialized = True
+            if buffer_level is not None:
+                self.set_buffer(buffer_level)
+            self.limit = max(self.value, self.buffer_value)
 
         except (ValueError, TypeError) as e:
             self.level = "OFF"
+            self.value = OFF
+            self.limit = self.buffer_value
             print(f"ERROR: LogLevel.initialize(): failed: {e}")
         except Exception as e:
             self.level = "OFF"
+            self.value = OFF
+            self.limit = self.buffer_value
             print(f"ERROR: LogLevel.initialize({level}): failed: {e}")
 
     def get(self):
@@ -46,9 +75,23 @@ class LogLevel:
         try:
             if str(level).upper() in LOG_LEVELS:
                 self.level = str(level).upper()
+                self.value = LOG_LEVELS[self.level]
+                self.limit = max(self.value, self.buffer_value)
 
         except Exception as e:
             print(f"ERROR: LogLevel.set(): failed: {e}")
 
+    def set_buffer(self, level):
+        """Change the level recorded in the in-memory log buffer if ``level`` is valid."""
+
+        try:
+            if str(level).upper() in LOG_LEVELS:
+                self.buffer_level = str(level).upper()
+                self.buffer_value = LOG_LEVELS[self.buffer_level]
+                self.limit = max(self.value, self.buffer_value)
+
+        except Exception as e:
+            print(f"ERROR: LogLevel.set_buffer(): failed: {e}")
+
 
 log_level = LogLevel()
@@ -0,0 +1,154 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+from array import array  # https://docs.micropython.org/en/latest/library/array.html
+
+# Phases of the main loop
+PHASE_UPDATE_TEMP = 0
+PHASE_CATEGORIZE = 1
+PHASE_UPDATE_TIMER = 2
+PHASE_OPEN_RELAYS = 3
+PHASE_GC = 4
+PHASE_TICK = 5
+PHASE_NAMES = (
+    "update_temp",
+    "categorize_temp_change",
+    "update_timer",
+    "open_relays",
+    "gc.collect",
+    "tick",
+)
+
+# Log-linear buckets: durations below 8 us have one bucket each, every
+# following power of two is split into 8 buckets (12.5 % resolution) up to
+# 2**24 us (16.7 s), the last bucket counts everything above
+SUB_BUCKETS = 8
+BUCKETS = 22 * SUB_BUCKETS
+
+# Nominal duration of one main loop tick
+TICK_MS = 1000
+
+
+def bucket_of(value):
+    """Return the histogram bucket of the duration ``value`` in us."""
+
+    if value < SUB_BUCKETS:
+        return max(value, 0)
+    # Position of the highest set bit (>= 3)
+    high = 3
+    while value >> (high + 1):
+        high += 1
+    bucket = (high - 2) * SUB_BUCKETS + ((value >> (high - 3)) & (SUB_BUCKETS - 1))
+    return min(bucket, BUCKETS - 1)
+
+
+def bucket_limit(bucket):
+    """Return the largest duration in us counted in ``bucket``."""
+
+    if bucket < SUB_BUCKETS:
+        return bucket
+    high = bucket // SUB_BUCKETS + 2
+    return ((SUB_BUCKETS + bucket % SUB_BUCKETS + 1) << (high - 3)) - 1
+
+
+class LoopProfiler:
+    """Singleton that times the phases of the main loop with ``ticks_us``.
+
+    Every phase has a fixed log-linear histogram in a preallocated array, so
+    recording a duration does not allocate.  Percentiles are reported as the
+    upper bound of the bucket they fall in.
+
+    :meth:`tick` is called once per pass through the interval branch of the
+    main loop, which is expected to take one second.  The drift is the
+    difference between the time elapsed since the first tick and the number of
+    ticks in seconds, i.e. how far the countdown shown on the LCD is off.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(LoopProfiler, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            phases = len(PHASE_NAMES)
+            self.histograms = array("L", [0] * (phases * BUCKETS))
+            self.counts = array("L", [0] * phases)
+            self.maximums = array("L", [0] * phases)
+            self.first_tick_ms = None
+            self.last_tick_ms = None
+            self.ticks = 0
+            self.drift_ms = 0
+            self.initialized = True
+
+    def start(self):
+        """Return the start timestamp of a phase for :meth:`stop`."""
+
+        return time.ticks_us()
+
+    def stop(self, phase, start):
+        """Record the duration of ``phase`` started at ``start``."""
+
+        self.record(phase, time.ticks_diff(time.ticks_us(), start))
+
+    def record(self, phase, duration_us):
+        """Add ``duration_us`` to the histogram of ``phase``."""
+
+        self.histograms[phase * BUCKETS + bucket_of(duration_us)] += 1
+        self.counts[phase] += 1
+        if duration_us > self.maximums[phase]:
+            self.maximums[phase] = duration_us
+
+    def tick(self, now_ms):
+        """Record a main loop tick at ``now_ms`` (``time.ticks_ms()``)."""
+
+        if self.first_tick_ms is None:
+            self.first_tick_ms = now_ms
+        else:
+            self.record(PHASE_TICK, time.ticks_diff(now_ms, self.last_tick_ms) * 1000)
+            self.drift_ms = (
+                time.ticks_diff(now_ms, self.first_tick_ms) - self.ticks * TICK_MS
+            )
+        self.last_tick_ms = now_ms
+        self.ticks += 1
+
+    def percentile(self, phase, percent):
+        """Return the upper bucket bound in us below which ``percent`` of ``phase`` lie."""
+
+        count = self.counts[phase]
+        if not count:
+            return 0
+        # Rank of the percentile, rounded up
+        rank = (count * percent + 99) // 100
+        seen = 0
+        offset = phase * BUCKETS
+        for bucket in range(BUCKETS):
+            seen += self.histograms[offset + bucket]
+            if seen >= rank:
+                return bucket_limit(bucket)
+        return bucket_limit(BUCKETS - 1)
+
+    def reset(self):
+        """Clear all histograms and restart the drift measurement."""
+
+        for index in range(len(self.histograms)):
+            self.histograms[index] = 0
+        for phase in range(len(PHASE_NAMES)):
+            self.counts[phase] = 0
+            self.maximums[phase] = 0
+        self.first_tick_ms = None
+        self.last_tick_ms = None
+        self.ticks = 0
+        self.drift_ms = 0
+
+    def lines(self):
+        """Yield a text report, one line per phase plus the tick drift."""
+
+        yield "phase count p50_us p99_us max_us\n"
+        for phase, name in enumerate(PHASE_NAMES):
+            yield f"{name} {self.counts[phase]} {self.percentile(phase, 50)} {self.percentile(phase, 99)} {self.maximums[phase]}\n"
+        yield f"ticks {self.ticks}\n"
+        yield f"tick_drift_ms {self.drift_ms}\n"
+
+
+loop_profiler = LoopProfiler()
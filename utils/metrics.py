@@ -0,0 +1,125 @@
+import gc  # https://docs.micropython.org/en/latest/library/gc.html
+
+# Metric types
+COUNTER = "counter"
+GAUGE = "gauge"
+
+
+class Metrics:
+    """Singleton registry of counters and gauges in Prometheus text format.
+
+    Every series is registered once (at import or device initialization) and
+    gets a fixed index into ``values``.  Updates with :meth:`inc`, :meth:`set`
+    and :meth:`set_max` are a single list assignment of an integer, so they
+    are O(1) and do not allocate on the hot path.  Values are kept in integer
+    base units (milliseconds, microseconds, bytes) to avoid boxed floats.
+
+    Collectors are callables run right before :meth:`lines` renders the
+    registry, e.g. to sample ``gc.mem_free()`` only when metrics are scraped.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(Metrics, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.families = []
+            self.family_indexes = {}
+            self.series = []
+            self.values = []
+            self.collectors = []
+            self.initialized = True
+
+    def register(self, name, type=COUNTER, help="", labels=""):
+        """Register a series and return its index.
+
+        Series with the same ``name`` share one metric family and are told
+        apart by ``labels``.
+
+        Args:
+            name (str): Metric name, e.g. ``"relay_actuations_total"``.
+            type (str): ``COUNTER`` or ``GAUGE``.
+            help (str): Description of the metric family.
+            labels (str): Label list without braces, e.g. ``'pin="14"'``.
+
+        Returns:
+            int: Index used for updates.
+        """
+
+        family = self.family_indexes.get(name)
+        if family is None:
+            family = len(self.families)
+            self.families.append((name, type, help))
+            self.family_indexes[name] = family
+        self.series.append((family, labels))
+        self.values.append(0)
+        return len(self.values) - 1
+
+    def relabel(self, index, labels):
+        """Replace the labels of the series ``index``, the value is kept."""
+
+        self.series[index] = (self.series[index][0], labels)
+
+    def add_collector(self, collector):
+        """Run ``collector()`` before each rendering of the registry."""
+
+        self.collectors.append(collector)
+
+    def inc(self, index, amount=1):
+        """Increase the series ``index`` by ``amount``."""
+
+        self.values[index] += amount
+
+    def set(self, index, value):
+        """Set the series ``index`` to ``value``."""
+
+        self.values[index] = value
+
+    def set_max(self, index, value):
+        """Set the series ``index`` to ``value`` if it is a new maximum."""
+
+        if value > self.values[index]:
+            self.values[index] = value
+
+    def get(self, index):
+        """Return the current value of the series ``index``."""
+
+        return self.values[index]
+
+    def lines(self):
+        """Yield the registry in Prometheus text format, one family at a time."""
+
+        for collector in self.collectors:
+            collector()
+
+        for family, (name, type, help) in enumerate(self.families):
+            lines = [f"# HELP {name} {help}\n# TYPE {name} {type}\n"]
+            for index, (series_family, labels) in enumerate(self.series):
+                if series_family == family:
+                    if labels:
+                        lines.append(f"{name}{{{labels}}} {self.values[index]}\n")
+                    else:
+                        lines.append(f"{name} {self.values[index]}\n")
+            yield "".join(lines)
+
+
+metrics = Metrics()
+
+# Heap, sampled when the metrics are rendered
+GC_COLLECTIONS = metrics.register(
+    "gc_collections_total", COUNTER, "Explicit garbage collections"
+)
+MEM_FREE = metrics.register("gc_mem_free_bytes", GAUGE, "Free heap")
+MEM_ALLOC = metrics.register("gc_mem_alloc_bytes", GAUGE, "Allocated heap")
+
+
+def collect_memory():
+    metrics.set(MEM_FREE, gc.mem_free())
+    metrics.set(MEM_ALLOC, gc.mem_alloc())
+
+
+metrics.add_collector(collect_memory)
@@ -0,0 +1,136 @@
+import time  # https://docs.micropython.org/en/latest/library/time.html
+import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
+from machine import (
+    WDT,
+    reset_cause,
+    WDT_RESET,
+)  # https://docs.micropython.org/en/latest/library/machine.WDT.html
+from utils.log import log, ERROR, WARN  # logging function
+from utils.metrics import metrics, COUNTER  # Metrics() instance
+from utils.error_logger import (
+    error_log,
+    SOURCE_SUPERVISOR,
+    CODE_HEARTBEAT_MISSED,
+    CODE_WATCHDOG_RESET,
+)
+
+SUPERVISOR_MISSED = metrics.register(
+    "supervisor_missed_total", COUNTER, "Tasks that missed their heartbeat deadline"
+)
+
+
+class Supervisor:
+    """Singleton that feeds the hardware watchdog while all tasks are alive.
+
+    Long running tasks :meth:`register` once and call :meth:`beat` on every
+    pass of their loop, a task is watched from its first beat on.
+    :meth:`run` feeds ``machine.WDT`` four times per watchdog timeout, but
+    only as long as every task has beaten within its deadline.  A task that
+    announces a longer wait passes it to :meth:`beat`, it is added to the
+    deadline of that beat.
+
+    When a task misses its deadline the supervisor writes one
+    ``heartbeat_missed`` record per overdue task to the error log and stops
+    feeding, so the watchdog resets the device.  A stall that blocks the
+    whole scheduler (e.g. a hanging I2C call) also stops the feeding; it is
+    recorded as ``watchdog_reset`` after the reboot.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(Supervisor, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, "initialized"):
+            self.names = []
+            self.deadlines = []
+            self.due = []
+            self.wdt = None
+            self.missed = False
+            self.initialized = True
+
+    def register(self, name, deadline_ms):
+        """Register a task and return its index.
+
+        Args:
+            name (str): Name written to the error log, e.g. ``"control"``.
+            deadline_ms (int): Longest time between two beats.
+
+        Returns:
+            int: Index used for :meth:`beat` and :meth:`pause`.
+        """
+
+        self.names.append(name)
+        self.deadlines.append(deadline_ms)
+        self.due.append(None)
+        return len(self.names) - 1
+
+    def beat(self, task, wait_ms=0):
+        """Report that ``task`` is alive and will beat again within its deadline.
+
+        Args:
+            task (int): Index returned by :meth:`register`.
+            wait_ms (int): Announced wait before the next beat.
+        """
+
+        self.due[task] = time.ticks_add(time.ticks_ms(), self.deadlines[task] + wait_ms)
+
+    def pause(self, task):
+        """Stop watching ``task`` until its next :meth:`beat`."""
+
+        self.due[task] = None
+
+    def overdue(self):
+        """Return the indexes of the tasks that missed their deadline."""
+
+        now = time.ticks_ms()
+        return [
+            task
+            for task, due in enumerate(self.due)
+            if due is not None and time.ticks_diff(now, due) > 0
+        ]
+
+    async def run(self, timeout_ms=8000):
+        """Start the watchdog and feed it while all tasks are alive, runs forever.
+
+        Args:
+            timeout_ms (int): Watchdog timeout, ``0`` disables the watchdog.
+                The RP2040 accepts at most 8388 ms.
+        """
+
+        if reset_cause() == WDT_RESET:
+            log(WARN, "Supervisor.run(): reset by watchdog")
+            error_log.append(WARN, SOURCE_SUPERVISOR, CODE_WATCHDOG_RESET)
+
+        if timeout_ms <= 0:
+            log("INFO", "Supervisor.run(): watchdog disabled")
+            return
+
+        try:
+            self.wdt = WDT(timeout=timeout_ms)
+        except Exception as e:
+            log("ERROR", f"Supervisor.run(): failed: {e}")
+            return
+        log("INFO", f"Supervisor.run(timeout={timeout_ms})")
+
+        while True:
+            if not self.missed:
+                overdue = self.overdue()
+                if overdue:
+                    # The watchdog resets the device within timeout_ms
+                    self.missed = True
+                    for task in overdue:
+                        log(ERROR, "Supervisor.run(): {} missed its heartbeat", self.names[task])
+                        metrics.inc(SUPERVISOR_MISSED)
+                        error_log.append(
+                            ERROR, SOURCE_SUPERVISOR, CODE_HEARTBEAT_MISSED, self.names[task]
+                        )
+                else:
+                    self.wdt.feed()
+            await asyncio.sleep_ms(timeout_ms // 4)
+
+
+supervisor = Supervisor()
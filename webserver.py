@@ -1,5 +1,4 @@
-import gc  # https://docs.micropython.org/en/latest/library/gc.html
-import re  # https://docs.micropython.org/en/latest/library/re.html
+import time  # https://docs.micropython.org/en/latest/library/time.html
 import uasyncio as asyncio  # https://docs.micropython.org/en/latest/library/asyncio.html
 from machine import (
     reset,
@@ -7,14 +6,72 @@ from machine import (
 from utils.get_bool import get_bool
 from utils.get_float import get_float
 from utils.get_int import get_int
-from utils.log import log  # logging function
-from utils.log_level import log_level
-from utils.error_logger import append_log
+from utils.log import log, enabled, ERROR, INFO  # logging function
+from utils.log_level import log_level, LOG_PREFIXES
+from utils.log_buffer import log_buffer  # LogBuffer() instance
+from utils.metrics import metrics, COUNTER  # Metrics() instance
+from utils.gc_manager import gc_manager  # GcManager() instance
+from utils.loop_profiler import loop_profiler  # LoopProfiler() instance
+from utils.supervisor import supervisor  # Supervisor() instance
+from utils.error_logger import error_log, format_record, SOURCE_WEBSERVER, CODE_EXCEPTION
 from src.config import config  # Config() instance
 from src.lcd import lcd  # LCD() instance
 from src.wifi import wifi  # WiFi() instance
+from src.mqtt import mqtt  # MQTT() instance
 from src.functions import print_nominal_temp
 from src.relay import relay_open, relay_close
+from src.actuator import actuator, SOURCE_MANUAL, RESULT_MERGED  # Actuator() instance
+from src.schedule import schedule, parse_schedule  # Schedule() instance
+
+# Directory of index.html and styles.css on the device
+WEB_PATH = "/web/"
+
+# Server returned by asyncio.start_server()
+server = None
+
+# Interval of the check that the server is bound
+WEBSERVER_CHECK_MS = 5000
+
+# Heartbeat of the webserver task
+WEBSERVER_TASK = supervisor.register("webserver", 30000)
+
+# Reasons of rejected relay commands shown on the web interface, by result code
+ACTUATOR_MESSAGES = (
+    "",
+    "",
+    "eine Schaltung mit h&ouml;herer Priorit&auml;t l&auml;uft",
+    "maximale Einschaltdauer erreicht",
+    "Relais nicht initialisiert",
+)
+
+# Config keys that may be changed on the MQTT command topic
+MQTT_COMMAND_KEYS = ("nominal_min_temp", "nominal_max_temp")
+
+# Metric indexes per route: path -> (requests, latency), unknown paths share "other"
+HTTP_METRICS = {}
+for route in (
+    "/",
+    "/index.html",
+    "/relay/open",
+    "/relay/close",
+    "/config/save",
+    "/machine/reset",
+    "/styles.css",
+    "/api/logs",
+    "/api/logs/errors",
+    "/metrics",
+    "/api/profile",
+    "/api/schedule",
+    "/wifi",
+    "other",
+):
+    labels = f'route="{route}"'
+    HTTP_METRICS[route] = (
+        metrics.register("http_requests_total", COUNTER, "HTTP requests", labels),
+        metrics.register(
+            "http_request_us_total", COUNTER, "Time spent serving requests", labels
+        ),
+    )
 
 
 def encode_utf8(content=""):
@@ -59,6 +116,32 @@ def is_true(value):
     return "true" if str(value).lower() in ["true", "1", "yes", "on"] else "false"
 
 
+def is_changed(stored, value):
+    """Return ``True`` if the form ``value`` differs from the ``stored`` config value.
+
+    Form values are strings while the loaded config holds numbers and
+    booleans, so both are converted like :func:`get_bool` and
+    :func:`get_float` do before comparing: a checkbox posting ``"on"`` does
+    not change a stored ``1`` or ``True``, ``"45"`` does not change ``45.0``.
+
+    Args:
+        stored: Value of the loaded config.
+        value (str): Submitted form value.
+
+    Returns:
+        bool: ``True`` if the setting changes.
+    """
+
+    if isinstance(stored, bool) or str(value).lower() in [
+        "true", "false", "yes", "no", "on", "off"
+    ]:
+        return get_bool(stored) != get_bool(value)
+    try:
+        return float(stored) != float(value)
+    except (ValueError, TypeError):
+        return str(stored) != value
+
+
 async def replace_placeholder(content="", line_number=0, config_data={}):
     """Replace placeholders in a line of ``index.html``.
 
@@ -219,6 +302,30 @@ async def replace_placeholder(content="", line_number=0, config_data={}):
     return content
 
 
+def url_decode(value):
+    """Decode ``+`` and ``%XX`` escapes of a URL‑encoded form value.
+
+    Args:
+        value (str): Encoded value, e.g. ``"my+wifi%21"``.
+
+    Returns:
+        str: Decoded value, e.g. ``"my wifi!"``.
+    """
+
+    if "%" not in value and "+" not in value:
+        return value
+    value = value.replace("+", " ")
+    parts = value.split("%")
+    decoded = bytearray(parts[0].encode("utf-8"))
+    for part in parts[1:]:
+        try:
+            decoded.append(int(part[:2], 16))
+            decoded.extend(part[2:].encode("utf-8"))
+        except ValueError:
+            decoded.extend(b"%" + part.encode("utf-8"))
+    return decoded.decode("utf-8")
+
+
 def parse_form_data(body):
     """Parse URL‑encoded form data into a dictionary.
 
@@ -234,28 +341,32 @@ def parse_form_data(body):
     for pair in body.split("&"):
         if "=" in pair:
             key, value = pair.split("=", 1)
-            parsed_data[key] = value
+            parsed_data[key] = url_decode(value)
         else:
             parsed_data[pair] = None
     return parsed_data
 
 
-async def manage_wifi_connection():
-    """Continuously manage the WiFi connection.
+async def start_server(host="0.0.0.0", port=80):
+    """Bind the HTTP server, replacing a server started before.
 
-    The coroutine initializes the WiFi module and attempts to keep the device
-    connected.  Every 30 seconds the connection status is checked and a reconnection
-    is attempted if necessary.
+    Registered as WiFi connect callback so the socket is bound again after the
+    link was re-established.
     """
 
-    await wifi.initialize()
-    await wifi.connect()
+    global server
 
-    while True:
-        await asyncio.sleep(30)
+    try:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        log(INFO, "Webserver.start_server({}, {})", host, port)
+        server = await asyncio.start_server(handle_client, host, port)  # type: ignore
 
-        if not wifi.is_connected():
-            await wifi.connect()
+    except Exception as e:
+        server = None
+        log("ERROR", f"Webserver.start_server(): failed: {e}")
+        error_log.append(ERROR, SOURCE_WEBSERVER, CODE_EXCEPTION, str(e))
 
 
 async def stream_file(writer, file_name, chunk_size=1024):
@@ -270,9 +381,8 @@ async def stream_file(writer, file_name, chunk_size=1024):
         None
     """
 
-    file_name_präfix = "../web/"
     try:
-        with open(file_name_präfix + file_name, "rb", encoding="utf-8") as file:
+        with open(WEB_PATH + file_name, "rb") as file:
             while True:
                 chunk = file.read(chunk_size)
                 if not chunk:
@@ -283,6 +393,57 @@ async def stream_file(writer, file_name, chunk_size=1024):
         log("ERROR", f"Webserver.stream_file({file_name}, {chunk_size}): {e}")
 
 
+async def stream_error_log(writer):
+    """Stream the persistent error log, one decoded record per line.
+
+    Records are read one at a time, so the heap usage does not depend on the
+    size of the log.
+
+    Args:
+        writer: ``uasyncio`` stream writer used to send data to the client.
+
+    Returns:
+        None
+    """
+
+    for record in error_log.records():
+        await writer.awrite(encode_utf8(format_record(record)))
+
+
+async def stream_log_buffer(writer, since=0):
+    """Stream the in-memory log messages newer than the sequence number ``since``.
+
+    Each line starts with the sequence number of the message, so a client can
+    poll ``/api/logs?since=<last sequence>`` to receive only new messages.
+
+    Args:
+        writer: ``uasyncio`` stream writer used to send data to the client.
+        since (int): Last sequence number already received by the client.
+
+    Returns:
+        None
+    """
+
+    for sequence, level, message in log_buffer.records(since):
+        await writer.awrite(encode_utf8(f"{sequence} {LOG_PREFIXES[level]} "))
+        await writer.awrite(message)
+        await writer.awrite(b"\n")
+
+
+async def stream_metrics(writer):
+    """Stream the metrics registry in Prometheus text format.
+
+    Args:
+        writer: ``uasyncio`` stream writer used to send data to the client.
+
+    Returns:
+        None
+    """
+
+    for lines in metrics.lines():
+        await writer.awrite(encode_utf8(lines))
+
+
 async def generate_index_html(writer):
     """Generate the ``index.html`` response by streaming and substituting content.
 
@@ -291,8 +452,7 @@ async def generate_index_html(writer):
     before being written to the client.
     """
 
-    web_path = "/web/"
-    file_path = web_path + "index.html"
+    file_path = WEB_PATH + "index.html"
     line_number = 0
 
     # Load complete config
@@ -329,9 +489,18 @@ async def handle_post(body, requested_path="/config/save"):
 
     # Parse form data
     form_data = parse_form_data(body)
-    log("INFO", f"Webserver.handle_post(): form data: {form_data}")
+    if enabled(INFO):
+        log(
+            INFO,
+            "Webserver.handle_post(): form data: {}",
+            {
+                key: "***" if "password" in key else value
+                for key, value in form_data.items()
+            },
+        )
 
     error = False
+    changed_keys = []
 
     # Load complete config
     config_data = await config.get_config()
@@ -341,6 +510,8 @@ async def handle_post(body, requested_path="/config/save"):
         if config_data.get(key) is None:
             error = "key " + key + " not found in config.json"
         else:
+            if is_changed(config_data.get(key), value):
+                changed_keys.append(key)
             if config_data.get(key) != value:
                 config_data[key] = value
 
@@ -355,6 +526,11 @@ async def handle_post(body, requested_path="/config/save"):
 
     # Set log level
     log_level.set(config_data.get("log_level", "OFF"))
+    log_level.set_buffer(config_data.get("log_buffer_level", "WARN"))
+
+    # Re-initialize the components depending on the changed keys
+    if changed_keys:
+        await config.notify(changed_keys)
 
     # /relay/open
     if requested_path == "/relay/open":
@@ -368,24 +544,27 @@ async def handle_post(body, requested_path="/config/save"):
             response_content = f'<span style="color: orange;">WARN: Ventil wurde nicht ge&ouml;ffnet: {error}</span>'
             log(
                 "WARN",
-                f"Relay.toggle(time={manual_relay_time}): manual trigger failed: {error}",
+                f"Webserver.handle_post(time={manual_relay_time}): manual trigger failed: {error}",
             )
         elif timer <= puffer_time:
             response_content = f'<span style="color: orange;">WARN: Ventil wurde nicht ge&ouml;ffnet: der Timer ist zu nahe an 0.</span>'
             log(
                 "ERROR",
-                f"Relay.toggle(time={manual_relay_time}): manual trigger failed: Timer near by 0.",
+                f"Webserver.handle_post(time={manual_relay_time}): manual trigger failed: Timer near by 0.",
             )
         elif not (0 < current_temp <= 120):
             response_content = f'<span style="color: red;">ERROR: Ventil wurde nicht ge&ouml;ffnet: Temp Fehler!</span>'
             log(
                 "ERROR",
-                f"Relay.toggle(time={manual_relay_time}): manual trigger failed: temp error.",
+                f"Webserver.handle_post(time={manual_relay_time}): manual trigger failed: temp error.",
             )
         else:
-            response_content = f'<span style="color: green;">INFO: Ventil wird f&uuml;r {manual_relay_time}ms ge&ouml;ffnet.</span>'
-            log("INFO", f"Relay.toggle(time={manual_relay_time}): manual trigger")
-            await relay_open.toggle(manual_relay_time)
+            # Queued by the arbiter, the response does not wait for the pulse
+            result = actuator.request(relay_open, manual_relay_time, SOURCE_MANUAL)
+            if result <= RESULT_MERGED:
+                response_content = f'<span style="color: green;">INFO: Ventil wird f&uuml;r {manual_relay_time}ms ge&ouml;ffnet.</span>'
+            else:
+                response_content = f'<span style="color: orange;">WARN: Ventil wurde nicht ge&ouml;ffnet: {ACTUATOR_MESSAGES[result]}.</span>'
 
     # /relay/close
     if requested_path == "/relay/close":
@@ -399,24 +578,27 @@ async def handle_post(body, requested_path="/config/save"):
             response_content = f'<span style="color: orange;">WARN: Ventil wurde nicht geschlossen: {error}</span>'
             log(
                 "WARN",
-                f"Relay.toggle(time={manual_relay_time}): manual trigger failed: {error}",
+                f"Webserver.handle_post(time={manual_relay_time}): manual trigger failed: {error}",
             )
         elif timer <= puffer_time:
             response_content = f'<span style="color: orange;">WARN: Ventil wurde nicht geschlossen: der Timer ist zu nahe an 0.</span>'
             log(
                 "ERROR",
-                f"Relay.toggle(time={manual_relay_time}): manual trigger failed: Timer near by 0.",
+                f"Webserver.handle_post(time={manual_relay_time}): manual trigger failed: Timer near by 0.",
             )
         elif not (0 < current_temp <= 120):
             response_content = f'<span style="color: red;">ERROR: Ventil wurde nicht geschlossen: Temp Fehler!</span>'
             log(
                 "ERROR",
-                f"Relay.toggle(time={manual_relay_time}): manual trigger failed: temp error.",
+                f"Webserver.handle_post(time={manual_relay_time}): manual trigger failed: temp error.",
             )
         else:
-            response_content = f'<span style="color: green;">INFO: Ventil wird f&uuml;r {manual_relay_time}ms geschlossen.</span>'
-            log("INFO", f"Relay.toggle(time={manual_relay_time}): manual trigger")
-            await relay_close.toggle(manual_relay_time)
+            # Queued by the arbiter, the response does not wait for the pulse
+            result = actuator.request(relay_close, manual_relay_time, SOURCE_MANUAL)
+            if result <= RESULT_MERGED:
+                response_content = f'<span style="color: green;">INFO: Ventil wird f&uuml;r {manual_relay_time}ms geschlossen.</span>'
+            else:
+                response_content = f'<span style="color: orange;">WARN: Ventil wurde nicht geschlossen: {ACTUATOR_MESSAGES[result]}.</span>'
 
     # /config/save
     elif requested_path == "/config/save":
@@ -456,6 +638,32 @@ async def handle_post(body, requested_path="/config/save"):
     return response_content
 
 
+async def handle_schedule(body):
+    """Replace the setpoint schedule with the ``schedule`` form value.
+
+    Args:
+        body (str): Raw request payload, e.g.
+            ``schedule=1-5 06:00 45 57;1-5 22:00 40 50``.
+
+    Returns:
+        str: ``"OK"`` or the reason why the schedule was rejected.
+    """
+
+    text = parse_form_data(body).get("schedule")
+    if text is None:
+        return "ERROR: schedule missing\n"
+    try:
+        entries, _ = parse_schedule(text)
+    except ValueError as e:
+        log("WARN", f"Webserver.handle_schedule(): rejected: {e}")
+        return f"ERROR: {e}\n"
+
+    await config.set("schedule", ";".join(entries))
+    await config.save()
+    await config.notify(["schedule"])
+    return "OK\n"
+
+
 async def send_response(writer, content_type, content=None):
     """Send an HTTP response header and optional body to the client.
 
@@ -489,6 +697,31 @@ async def handle_post_request(writer, request_body, requested_path):
     await send_response(writer, "text/html", response_content)
 
 
+async def handle_command(body):
+    """Apply a setpoint change received on the MQTT command topic.
+
+    The payload has the form of the web form (``nominal_min_temp=45``) and is
+    applied by :func:`handle_post` like a ``/config/save`` request.  Only the
+    keys in ``MQTT_COMMAND_KEYS`` are accepted.
+
+    Args:
+        body (str): Payload of the MQTT message.
+
+    Returns:
+        None
+    """
+
+    form_data = parse_form_data(body)
+    for key, value in form_data.items():
+        if key not in MQTT_COMMAND_KEYS:
+            log("WARN", f"Webserver.handle_command(): key {key} not allowed")
+            return
+        if not 0 <= get_float(value, -1.0) <= 120:
+            log("WARN", f"Webserver.handle_command(): invalid value {key}={value}")
+            return
+    await handle_post(body, "/config/save")
+
+
 async def handle_client(reader, writer):
     """Serve a single HTTP client connection.
 
@@ -505,6 +738,7 @@ async def handle_client(reader, writer):
     """
 
     reset_pico = False
+    start = time.ticks_us()
 
     # Get request
     request_lines = []
@@ -531,17 +765,19 @@ async def handle_client(reader, writer):
             request_body += chunk.decode("utf-8")
             remaining_length -= len(chunk)
 
-    # Process request
-    match = re.search(
-        r"^(GET|POST|PUT|DELETE|HEAD|OPTIONS|PATCH) /[^ ]*", request_header
-    )
-    if match:
-        result = match.group(0)
-    else:
-        result = ""
-    log("INFO", f"Webserver.handle_client(): {result}")
+    # Log request line (re is imported lazily to keep it out of the boot path)
+    if enabled(INFO):
+        import re  # https://docs.micropython.org/en/latest/library/re.html
+
+        match = re.search(
+            r"^(GET|POST|PUT|DELETE|HEAD|OPTIONS|PATCH) /[^ ]*", request_header
+        )
+        log(INFO, "Webserver.handle_client(): {}", match.group(0) if match else "")
 
-    requested_path = request_header.split(" ")[1]
+    # Split path and query string
+    target = request_header.split(" ")[1].split("?", 1)
+    requested_path = target[0]
+    query = parse_form_data(target[1]) if len(target) > 1 else {}
 
     # /index.html
     if requested_path in ["/", "/index.html"]:
@@ -565,6 +801,50 @@ async def handle_client(reader, writer):
         await send_response(writer, "text/css")
         await stream_file(writer, "styles.css", chunk_size=1024)
 
+    # /api/logs?since=<sequence>
+    elif requested_path == "/api/logs":
+        await send_response(writer, "text/plain")
+        await stream_log_buffer(writer, get_int(query.get("since")))
+
+    # /api/logs/errors
+    elif requested_path == "/api/logs/errors":
+        await send_response(writer, "text/plain")
+        await stream_error_log(writer)
+
+    # /metrics
+    elif requested_path == "/metrics":
+        await send_response(writer, "text/plain; version=0.0.4")
+        gc_manager.check_fragmentation()
+        await stream_metrics(writer)
+
+    # /api/profile, /api/profile?reset=1 starts a new measurement after the output
+    elif requested_path == "/api/profile":
+        await send_response(writer, "text/plain")
+        largest_free = gc_manager.check_fragmentation()
+        for line in loop_profiler.lines():
+            await writer.awrite(encode_utf8(line))
+        await writer.awrite(encode_utf8(f"gc_largest_free_bytes {largest_free}\n"))
+        if get_bool(query.get("reset")):
+            loop_profiler.reset()
+
+    # /api/schedule, POST schedule=<entries> replaces the schedule
+    elif requested_path == "/api/schedule":
+        await send_response(writer, "text/plain")
+        if "POST" in request_header.split(" ")[0]:
+            await writer.awrite(encode_utf8(await handle_schedule(request_body)))
+        for line in schedule.lines():
+            await writer.awrite(encode_utf8(line))
+
+    # /wifi
+    elif requested_path == "/wifi":
+        await send_response(writer, "text/html")
+        await stream_file(writer, "wifi.html", chunk_size=1024)
+
+    # Captive portal: send every unknown page to the WiFi setup page
+    elif wifi.ap_active:
+        response = f"HTTP/1.1 302 Found\nLocation: http://{wifi.ap.ifconfig()[0]}/wifi\n\n"
+        await writer.awrite(encode_utf8(response))
+
     # 404 Not Found
     else:
         response = "HTTP/1.1 404 Not Found\n\n"
@@ -574,9 +854,15 @@ async def handle_client(reader, writer):
     await writer.drain()
     await writer.wait_closed()
 
-    # Release memory
-    log("VERBOSE", "Webserver.gc.collect()")
-    gc.collect()
+    # Count request and its duration per route
+    requests_metric, latency_metric = HTTP_METRICS.get(
+        requested_path, HTTP_METRICS["other"]
+    )
+    metrics.inc(requests_metric)
+    metrics.inc(latency_metric, time.ticks_diff(time.ticks_us(), start))
+
+    # Release memory in the next idle window of the main loop
+    gc_manager.request()
 
     # Reset pico
     if reset_pico:
@@ -587,8 +873,10 @@ async def webserver():
     """Start the asynchronous webserver on ``0.0.0.0:80``.
 
     The server listens for HTTP requests, delegates work to
-    :func:`handle_client` and launches a background task to maintain the WiFi
-    connection.
+    :func:`handle_client` and launches the WiFi state machine
+    (:meth:`WiFi.run`) and the MQTT publisher (:meth:`MQTT.run`) as background
+    tasks.  Afterwards it beats as long as the server is bound, so a server
+    that could not be bound again after a reconnect resets the device.
     """
 
     try:
@@ -596,19 +884,27 @@ async def webserver():
         print("INFO: Webserver()")
         print("INFO: --------------------------")
 
-        host = "0.0.0.0"
-        port = 80
-        asyncio.create_task(manage_wifi_connection())
-        print(f"INFO: Webserver.start_server({host}, {port})")
-        server = await asyncio.start_server(handle_client, host, port)  # type: ignore
+        # Keep WiFi connected in the background and bind again after reconnects
+        wifi.on_connect(start_server)
+        asyncio.create_task(wifi.run())
+
+        # Publish telemetry and accept setpoint changes over MQTT
+        mqtt.on_command(handle_command)
+        asyncio.create_task(mqtt.run())
+        await start_server()
+
+        while True:
+            if server is not None or not wifi.is_connected():
+                supervisor.beat(WEBSERVER_TASK, WEBSERVER_CHECK_MS)
+            await asyncio.sleep_ms(WEBSERVER_CHECK_MS)
 
     except Exception as e:
         # Print error message
         message = f"Webserver(): {str(e)}\n"
         print(f"ERROR: {message}")
 
-        # Append error message to log file
-        append_log(message, "/web_error.log")
+        # Append error to the error log
+        error_log.append(ERROR, SOURCE_WEBSERVER, CODE_EXCEPTION, str(e))
 
 
 if __name__ == "__main__":